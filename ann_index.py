@@ -0,0 +1,183 @@
+import math
+import time
+import logging
+from typing import Optional
+import numpy as np
+import faiss
+
+INDEX_TYPES = ('ivf', 'hnsw')
+QUANTIZATIONS = ('none', 'sq8', 'pq')
+
+logger = logging.getLogger(__name__)
+
+
+def describe_index(index: faiss.Index) -> str:
+    """Short name of an index structure, e.g. 'flat', 'ivf-sq8' or 'hnsw'"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexFlat):
+        return 'flat'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivf-pq'
+    if isinstance(index, faiss.IndexIVFScalarQuantizer):
+        return 'ivf-sq8'
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivf'
+    if isinstance(index, faiss.IndexHNSW):
+        storage = faiss.downcast_index(index.storage)
+        if isinstance(storage, faiss.IndexPQ):
+            return 'hnsw-pq'
+        if isinstance(storage, faiss.IndexScalarQuantizer):
+            return 'hnsw-sq8'
+        return 'hnsw'
+    return type(index).__name__
+
+
+def is_flat(index: faiss.Index) -> bool:
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def is_quantized(index: faiss.Index) -> bool:
+    """Whether an index stores lossy codes (SQ8 or PQ) instead of the vectors themselves"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    return isinstance(index, (faiss.IndexIVFPQ, faiss.IndexIVFScalarQuantizer,
+                              faiss.IndexPQ, faiss.IndexScalarQuantizer))
+
+
+def estimate_index_bytes(index: faiss.Index) -> int:
+    """Approximate resident size of an index's vectors and graph or list structures"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        # Codes plus 8-byte ids per vector, and the coarse centroids
+        return index.ntotal * (index.code_size + 8) + index.nlist * index.d * 4
+    if isinstance(index, faiss.IndexHNSW):
+        storage = faiss.downcast_index(index.storage)
+        code_size = getattr(storage, 'code_size', index.d * 4)
+        # Level-0 links dominate the graph: 2 * M neighbours of 4 bytes each
+        return index.ntotal * (code_size + index.hnsw.nb_neighbors(0) * 4)
+    return index.ntotal * index.d * 4
+
+
+def read_vectors(index: faiss.Index, start: int = 0) -> np.ndarray:
+    """Vectors of an index from a position on, in order (approximate for quantized indexes)"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(start, index.ntotal - start)
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """About 8 dimensions per sub-quantizer, with a count that divides the dimension"""
+    target = max(1, dimension // 8)
+    for count in range(target, 0, -1):
+        if dimension % count == 0:
+            return count
+    return 1
+
+
+def build_index(vectors: np.ndarray, index_type: str = 'ivf', quantization: str = 'none',
+                hnsw_m: int = 32, train_size: int = 100000) -> faiss.Index:
+    """
+    Build an approximate index over vectors, keeping their order as index positions
+
+    Args:
+        vectors: (n, d) float32 vectors
+        index_type: 'ivf' (inverted lists) or 'hnsw' (graph)
+        quantization: 'none', 'sq8' (8-bit scalar) or 'pq' (product quantization)
+        hnsw_m: Graph neighbours per node for HNSW
+        train_size: Maximum number of vectors used for training
+
+    Returns:
+        Trained index containing every vector
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown ANN index type: {index_type}")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown ANN quantization: {quantization}")
+
+    count, dimension = vectors.shape
+    if index_type == 'ivf':
+        # Roughly 4 * sqrt(n) lists, with enough training points per list
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if quantization == 'pq':
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_subquantizers(dimension), 8)
+        elif quantization == 'sq8':
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, faiss.ScalarQuantizer.QT_8bit)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+    else:
+        if quantization == 'pq':
+            index = faiss.IndexHNSWPQ(dimension, _pq_subquantizers(dimension), hnsw_m)
+        elif quantization == 'sq8':
+            index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_8bit, hnsw_m)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+
+    if not index.is_trained:
+        sample = vectors
+        if count > train_size:
+            rows = np.random.default_rng(0).choice(count, train_size, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def configure_search(index: faiss.Index, nprobe: int, ef_search: int):
+    """Apply search-time parameters: lists probed for IVF, candidate list size for HNSW"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(nprobe, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def measure_recall(exact: np.ndarray, index: faiss.Index, k: int, sample_size: int) -> Optional[float]:
+    """
+    Recall@k of an index against exact search, using stored vectors as queries
+
+    Args:
+        exact: The indexed vectors at full precision, in position order
+        index: Approximate index over the same vectors
+        k: Neighbours compared per query
+        sample_size: Number of query vectors
+
+    Returns:
+        Mean fraction of the exact top-k found by the index, or None without vectors
+    """
+    count = exact.shape[0]
+    if not count:
+        return None
+    k = min(k, count)
+    rows = np.random.default_rng(1).choice(count, min(sample_size, count), replace=False)
+    queries = exact[rows]
+
+    _, truth = faiss.knn(queries, exact, k)
+    _, found = index.search(queries, k)
+    hits = sum(len(set(expected) & set(actual)) for expected, actual in zip(truth, found))
+    return hits / (len(rows) * k)
+
+
+def rebuild_with_recall(vectors: np.ndarray, index_type: str, quantization: str, hnsw_m: int,
+                        nprobe: int, ef_search: int, recall_k: int, recall_sample: int):
+    """Build, configure and evaluate an approximate index from full-precision vectors; returns (index, report)"""
+    started = time.monotonic()
+    index = build_index(vectors, index_type, quantization, hnsw_m)
+    configure_search(index, nprobe, ef_search)
+    build_seconds = time.monotonic() - started
+    recall = measure_recall(vectors, index, recall_k, recall_sample)
+    report = {
+        'type': describe_index(index),
+        'vectors': int(vectors.shape[0]),
+        'build_seconds': round(build_seconds, 3),
+        f'recall_at_{recall_k}': round(recall, 4) if recall is not None else None,
+        'bytes': estimate_index_bytes(index),
+        'flat_bytes': int(vectors.nbytes),
+        'nprobe': nprobe if index_type == 'ivf' else None,
+        'ef_search': ef_search if index_type == 'hnsw' else None
+    }
+    logger.info(f"Built {report['type']} index over {report['vectors']} vectors in {build_seconds:.2f}s "
+                f"(recall@{recall_k} {report[f'recall_at_{recall_k}']})")
+    return index, report
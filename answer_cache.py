@@ -0,0 +1,141 @@
+import re
+import time
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?.!]+$')
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of generated answers keyed by (document-set fingerprint, normalized question)
+    With a similarity threshold set, a question whose embedding is within that cosine
+    similarity of a cached question over the same document set reuses its answer
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600,
+                 similarity_threshold: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self._by_fingerprint: dict = {}
+        self._lock = threading.Lock()
+
+    @property
+    def near_duplicate_enabled(self) -> bool:
+        return bool(self.similarity_threshold)
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        question = _WHITESPACE.sub(' ', question.strip().lower())
+        return _TRAILING_PUNCTUATION.sub('', question)
+
+    def get(self, fingerprint: str, question: str,
+            question_vector: Optional[List[float]] = None) -> Optional[str]:
+        """
+        Look up a cached answer
+
+        Args:
+            fingerprint: Fingerprint of the session's document set
+            question: User's question
+            question_vector: Question embedding, used for near-duplicate matching
+
+        Returns:
+            Cached answer or None
+        """
+        key = (fingerprint, self.normalize_question(question))
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry['answer']
+
+            if self.near_duplicate_enabled and question_vector is not None:
+                entry = self._nearest(fingerprint, question_vector)
+                if entry is not None:
+                    self.near_hits += 1
+                    return entry['answer']
+
+            self.misses += 1
+            return None
+
+    def put(self, fingerprint: str, question: str, answer: str,
+            question_vector: Optional[List[float]] = None):
+        key = (fingerprint, self.normalize_question(question))
+        vector = None
+        if question_vector is not None:
+            vector = np.asarray(question_vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else vector
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {'answer': answer, 'vector': vector, 'created': time.monotonic()}
+            self._by_fingerprint.setdefault(fingerprint, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, fingerprint: str):
+        """Drop every cached answer for a document set"""
+        with self._lock:
+            keys = self._by_fingerprint.pop(fingerprint, set())
+            for key in keys:
+                self._entries.pop(key, None)
+        if keys:
+            self.logger.info(f"Invalidated {len(keys)} cached answers")
+
+    def _lookup(self, key) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl and time.monotonic() - entry['created'] > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _nearest(self, fingerprint: str, question_vector: List[float]) -> Optional[dict]:
+        query = np.asarray(question_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return None
+        query = query / norm
+
+        best_key, best_score = None, self.similarity_threshold
+        for key in list(self._by_fingerprint.get(fingerprint, ())):
+            entry = self._entries.get(key)
+            if entry is None or entry['vector'] is None:
+                continue
+            score = float(np.dot(query, entry['vector']))
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        return self._lookup(best_key) if best_key is not None else None
+
+    def _remove(self, key):
+        if self._entries.pop(key, None) is not None:
+            keys = self._by_fingerprint.get(key[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_fingerprint[key[0]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'near_duplicate_hits': self.near_hits,
+                'misses': self.misses,
+                'hit_rate': ((self.hits + self.near_hits) / lookups) if lookups else 0.0
+            }
@@ -1,14 +1,19 @@
 import os
 import logging
-from flask import Flask, render_template, request, jsonify, session, flash, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, flash, redirect, url_for, Response, stream_with_context
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
 import uuid
 import json
-from document_processor import DocumentProcessor
-from rag_system import RAGSystem
-from translation_service import TranslationService
+import time
+import threading
+from ingestion_queue import describe_processing_error
+from shared_corpora import corpus_key
+from lazy_service import LazyService
+from upload_spool import SpoolingRequest, spool_upload
+from upload_store import UploadStore
+from storage_janitor import StorageJanitor
+import metrics
 from dotenv import load_dotenv
 load_dotenv() 
 
@@ -28,8 +33,41 @@ UPLOAD_FOLDER = 'uploads'
 VECTOR_STORE_FOLDER = 'vector_store'
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx'}
 MAX_FILE_SIZE = 200 * 1024 * 1024  # 200MB
+MAX_SUMMARY_WORDS = 8000
+INGEST_MAX_CONCURRENT_FILES = int(os.environ.get('INGEST_MAX_CONCURRENT_FILES', 4))
+# Required in the X-Admin-Token header to manage shared corpora; unset disables those routes
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+# Chat history is kept server-side ('sqlite' or 'memory'); the cookie only holds the session id
+CHAT_HISTORY_BACKEND = os.environ.get('CHAT_HISTORY_BACKEND', 'sqlite')
+CHAT_HISTORY_MAX_ENTRIES = int(os.environ.get('CHAT_HISTORY_MAX_ENTRIES', 200))
+CHAT_HISTORY_TTL = float(os.environ.get('CHAT_HISTORY_TTL', 30 * 24 * 3600))
+CHAT_HISTORY_PAGE_SIZE = 50
+# Services built in the background once the app is imported ('all' or comma-separated names);
+# by default each service is built on first use
+WARMUP_SERVICES = os.environ.get('WARMUP_SERVICES', '')
+# Abandoned sessions' uploads and indexes are expired after UPLOAD_RETENTION seconds without
+# activity, and the least recently active ones as well while all sessions exceed STORAGE_QUOTA_BYTES
+UPLOAD_RETENTION = float(os.environ.get('UPLOAD_RETENTION', 7 * 24 * 3600))
+STORAGE_QUOTA_BYTES = int(os.environ.get('STORAGE_QUOTA_BYTES', 0))
+STORAGE_JANITOR_INTERVAL = float(os.environ.get('STORAGE_JANITOR_INTERVAL', 3600))
+STORAGE_JANITOR_MIN_IDLE = float(os.environ.get('STORAGE_JANITOR_MIN_IDLE', 3600))
+# Deleted indexes leave a tombstone so other workers drop their copies; kept for longer than an ingest can run
+INDEX_TOMBSTONE_TTL = float(os.environ.get('INDEX_TOMBSTONE_TTL', 24 * 3600))
+# Requests sent with an X-Profile: 1 header get their stage timings back in a Server-Timing
+# header; set to 0 to ignore the header
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', '1') == '1'
+
+SUMMARY_SIZE_PROMPTS = {
+    "Short (1-2 lines)": "Write a very short 1-2 line summary.",
+    "Medium (1 paragraph)": "Write a concise summary in one paragraph.",
+    "Detailed (multi-paragraph)": "Write a detailed multi-paragraph summary covering all important points."
+}
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Uploaded files are hashed and sized while the request is parsed; small ones stay in memory
+# and larger ones are written once, into the upload folder (see UPLOAD_MEMORY_LIMIT)
+SpoolingRequest.spool_dir = UPLOAD_FOLDER
+app.request_class = SpoolingRequest
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
 # Ensure upload directories exist
@@ -39,10 +77,154 @@ os.makedirs('static/css', exist_ok=True)
 os.makedirs('static/js', exist_ok=True)
 os.makedirs('templates', exist_ok=True)
 
-# Initialize services
-document_processor = DocumentProcessor()
-rag_system = RAGSystem()
-translation_service = TranslationService()
+# Services are built on first use, and their heavy libraries (LangChain, Groq, Gemini,
+# FAISS, PyPDF2, python-docx, deep-translator) imported with them, so a worker can
+# serve its first requests without paying for all of them up front
+def build_document_processor():
+    from document_processor import DocumentProcessor
+    return DocumentProcessor()
+
+def build_rag_system():
+    from rag_system import RAGSystem
+    return RAGSystem(VECTOR_STORE_FOLDER)
+
+def build_translation_service():
+    from translation_service import TranslationService
+    return TranslationService()
+
+def build_content_registry():
+    from content_registry import ContentRegistry
+    return ContentRegistry(VECTOR_STORE_FOLDER, rag_system.ingest_profile)
+
+def build_chat_history():
+    from chat_history import create_history_store
+    return create_history_store(CHAT_HISTORY_BACKEND, VECTOR_STORE_FOLDER,
+                                max_entries=CHAT_HISTORY_MAX_ENTRIES, ttl=CHAT_HISTORY_TTL)
+
+def build_ingestion_queue():
+    from ingestion_queue import IngestionQueue
+    return IngestionQueue(
+        document_processor,
+        rag_system,
+        os.path.join(VECTOR_STORE_FOLDER, 'jobs'),
+        max_workers=INGEST_MAX_CONCURRENT_FILES,
+        content_registry=content_registry
+    )
+
+document_processor = LazyService('document_processor', build_document_processor)
+rag_system = LazyService('rag_system', build_rag_system)
+translation_service = LazyService('translation_service', build_translation_service)
+content_registry = LazyService('content_registry', build_content_registry)
+chat_history = LazyService('chat_history', build_chat_history)
+ingestion_queue = LazyService('ingestion_queue', build_ingestion_queue)
+
+SERVICES = {
+    'document_processor': document_processor,
+    'rag_system': rag_system,
+    'translation_service': translation_service,
+    'content_registry': content_registry,
+    'chat_history': chat_history,
+    'ingestion_queue': ingestion_queue
+}
+
+def warm_up(names=None):
+    """
+    Build services ahead of their first request
+    
+    Can be called from a gunicorn post_worker_init hook, or is started in the
+    background at import when WARMUP_SERVICES is set
+    
+    Args:
+        names: Service names to build (all when None)
+    """
+    for name in names or SERVICES:
+        try:
+            SERVICES[name].get()
+        except Exception as e:
+            logging.error(f"Error warming up {name}: {str(e)}")
+
+def service_status():
+    return {name: {'ready': service.ready, 'build_seconds': service.build_seconds}
+            for name, service in SERVICES.items()}
+
+def delete_session_storage(session_id):
+    """Delete a session's index, references to shared artifacts and uploaded files"""
+    # Clear RAG system data for this session
+    rag_system.clear_session(session_id)
+    
+    # Release shared artifacts of deduplicated uploads
+    content_registry.release_session(session_id)
+    
+    # Clean up uploaded files; only the session's own directory is touched
+    upload_store.clear(session_id)
+
+def purge_deleted_index(session_id, min_age):
+    """Remove the tombstone of a session's deleted index once it is older than min_age seconds"""
+    return rag_system.persistence.purge(session_id, min_age)
+
+upload_store = UploadStore(UPLOAD_FOLDER)
+storage_janitor = StorageJanitor(
+    upload_store,
+    os.path.join(VECTOR_STORE_FOLDER, 'sessions'),
+    delete_session_storage,
+    max_age=UPLOAD_RETENTION,
+    quota_bytes=STORAGE_QUOTA_BYTES,
+    min_idle=STORAGE_JANITOR_MIN_IDLE,
+    interval=STORAGE_JANITOR_INTERVAL,
+    purge=purge_deleted_index,
+    tombstone_ttl=INDEX_TOMBSTONE_TTL
+)
+
+def collect_service_metrics():
+    """Scrape-time metrics of the services built so far; unused services are not built for a scrape"""
+    samples = [('service_ready', 'gauge', 'Whether a lazily built service has been constructed',
+                [({'service': name}, int(service.ready)) for name, service in SERVICES.items()])]
+    if rag_system.ready:
+        samples.extend(rag_system.metric_samples())
+    if translation_service.ready:
+        samples.extend(translation_service.metric_samples())
+    samples.append(('janitor_reclaimed_bytes_total', 'counter', 'Bytes of expired session files deleted by the janitor',
+                    [({'reason': reason}, size) for reason, size in storage_janitor.reclaimed.items()]))
+    return samples
+
+metrics.REGISTRY.register_collector(collect_service_metrics)
+metrics.REGISTRY.describe('http_request_seconds', 'Time to handle a request, up to the first byte of streamed bodies')
+
+@app.before_request
+def start_request_timing():
+    request.environ['insightgenie.started'] = time.perf_counter()
+    if REQUEST_PROFILING and request.headers.get('X-Profile') == '1':
+        request.environ['insightgenie.profile'] = metrics.start_profile()
+
+@app.after_request
+def finish_request_timing(response):
+    started = request.environ.get('insightgenie.started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    metrics.observe('http_request_seconds', elapsed, endpoint=request.endpoint or 'unknown',
+                    method=request.method, status=response.status_code)
+    
+    token = request.environ.pop('insightgenie.profile', None)
+    if token is not None:
+        # Stages of streamed bodies run after the headers are sent and are not included
+        totals = {}
+        for stage, seconds in metrics.current_profile() or []:
+            count, total = totals.get(stage, (0, 0.0))
+            totals[stage] = (count + 1, total + seconds)
+        metrics.stop_profile(token)
+        timings = [f'{stage.replace(".", "-")};dur={total * 1000:.2f};desc="{stage} x{count}"'
+                   for stage, (count, total) in totals.items()]
+        timings.append(f'total;dur={elapsed * 1000:.2f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+@app.teardown_request
+def stop_request_profile(error=None):
+    # Requests that failed before after_request must not leave profiling on for the thread
+    token = request.environ.pop('insightgenie.profile', None)
+    if token is not None:
+        metrics.stop_profile(token)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -50,8 +232,177 @@ def allowed_file(filename):
 def get_session_id():
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
+    else:
+        # Keeps the janitor from expiring the files of a session that is still in use
+        upload_store.touch(session['session_id'])
+    # Cookies from before history moved server-side still carry it
+    if 'chat_history' in session:
+        session.pop('chat_history')
     return session['session_id']
 
+def is_admin_request():
+    return bool(ADMIN_TOKEN) and request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+def save_uploads(files, owner_id):
+    """
+    Validate and save uploaded files for background ingestion
+    
+    Returns:
+        Upload records for the ingestion queue; rejected files carry an error status
+    """
+    uploaded_files = []
+    
+    for file in files:
+        if file.filename == '':
+            continue
+            
+        # Check file extension
+        if not allowed_file(file.filename):
+            uploaded_files.append({
+                'filename': file.filename,
+                'status': 'error',
+                'message': f'File type not supported. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+            })
+            continue
+        
+        try:
+            # Uploads go to the owner's (session or corpus) directory under a unique name
+            filepath = upload_store.new_path(owner_id, file.filename)
+            
+            # Size and hash were computed while the request was parsed; only uploads
+            # too large to keep in memory are on disk, moved to filepath
+            upload = spool_upload(file, filepath)
+            
+            # Check file size
+            if upload.size > MAX_FILE_SIZE:
+                upload.discard()
+                uploaded_files.append({
+                    'filename': file.filename,
+                    'status': 'error',
+                    'message': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB'
+                })
+                continue
+            
+            if upload.size == 0:
+                upload.discard()
+                uploaded_files.append({
+                    'filename': file.filename,
+                    'status': 'error',
+                    'message': 'File is empty'
+                })
+                continue
+            
+            upload_store.record(owner_id, upload)
+            storage = 'memory' if upload.in_memory else 'disk'
+            metrics.inc('uploads_total', storage=storage)
+            metrics.inc('upload_bytes_total', upload.size, storage=storage)
+            logging.info(f"File received: {file.filename} ({upload.size} bytes, {'in memory' if upload.in_memory else filepath})")
+            
+            # Extraction and embedding happen in the background
+            uploaded_files.append({
+                'filename': file.filename,
+                'size': upload.size,
+                'upload': upload
+            })
+                    
+        except Exception as e:
+            logging.error(f"Error saving file {file.filename}: {str(e)}")
+            uploaded_files.append({
+                'filename': file.filename,
+                'status': 'error',
+                'message': f'Processing error: {describe_processing_error(e)}'
+            })
+    
+    return uploaded_files
+
+def upload_job_response(job):
+    """Shape an ingestion job's status like the upload results the client displays"""
+    if not job['done']:
+        message = f"Processing {job['total_count']} files"
+    elif job['success_count'] == 0:
+        message = 'No files were successfully processed'
+    else:
+        message = f"Successfully processed {job['success_count']} out of {job['total_count']} files"
+    
+    return {
+        'job_id': job['job_id'],
+        'done': job['done'],
+        'message': message,
+        'files': job['files'],
+        'success_count': job['success_count'],
+        'total_count': job['total_count']
+    }
+
+def sse_event(data, event=None):
+    payload = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+def stream_tokens(tokens, result_key, on_complete=None):
+    """Wrap a token iterator in a Server-Sent Events response"""
+    def generate():
+        parts = []
+        try:
+            for token in tokens:
+                parts.append(token)
+                yield sse_event({'token': token})
+        except Exception as e:
+            # A failed stream's partial result is neither recorded nor reported as done
+            logging.error(f"Streaming error: {str(e)}")
+            yield sse_event({'error': str(e)}, 'error')
+            return
+        
+        result = ''.join(parts)
+        if on_complete:
+            on_complete(result)
+        yield sse_event({result_key: result}, 'done')
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def join_units(first_unit, units):
+    """Join extracted document units with blank lines, as DocumentProcessor does"""
+    yield first_unit
+    for unit in units:
+        yield '\n\n' + unit
+
+def stream_translation(documents, source_language, target_language, cleanup=None):
+    """
+    Stream document translations as Server-Sent Events
+    
+    documents yields (source name, text pieces, total characters or None); each
+    translated piece is sent as soon as it and everything before it are done
+    """
+    def generate():
+        segments = 0
+        try:
+            for source, pieces, total_chars in documents:
+                yield sse_event({'source': source, 'total_chars': total_chars}, 'document')
+                update = {'segments': 0}
+                for update in translation_service.translate_stream(pieces, source_language, target_language):
+                    update['source'] = source
+                    update['progress'] = min(1.0, update['chars'] / total_chars) if total_chars else None
+                    yield sse_event(update)
+                segments += update['segments']
+        except Exception as e:
+            logging.error(f"Document translation error: {str(e)}")
+            yield sse_event({'error': str(e)}, 'error')
+            return
+        finally:
+            if cleanup:
+                cleanup()
+        
+        yield sse_event({'segments': segments, 'source_language': source_language,
+                         'target_language': target_language}, 'done')
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def append_chat_history(session_id, question, answer):
+    try:
+        chat_history.append(session_id, question, answer)
+    except Exception as e:
+        logging.error(f"Error saving chat history: {str(e)}")
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -69,119 +420,31 @@ def upload_files():
         if not files or all(file.filename == '' for file in files):
             return jsonify({'error': 'No files selected'}), 400
         
-        uploaded_files = []
-        success_count = 0
+        uploaded_files = save_uploads(files, session_id)
         
-        for file in files:
-            if file.filename == '':
-                continue
-                
-            # Check file extension
-            if not allowed_file(file.filename):
-                uploaded_files.append({
-                    'filename': file.filename,
-                    'status': 'error',
-                    'message': f'File type not supported. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
-                })
-                continue
-            
-            # Check file size
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            file.seek(0)
-            
-            if file_size > MAX_FILE_SIZE:
-                uploaded_files.append({
-                    'filename': file.filename,
-                    'status': 'error',
-                    'message': f'File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB'
-                })
-                continue
-            
-            if file_size == 0:
-                uploaded_files.append({
-                    'filename': file.filename,
-                    'status': 'error',
-                    'message': 'File is empty'
-                })
-                continue
-            
-            try:
-                # Secure filename and add session ID
-                filename = secure_filename(file.filename)
-                # Ensure unique filename to prevent conflicts
-                import time
-                timestamp = str(int(time.time() * 1000))
-                filename = f"{session_id}_{timestamp}_{filename}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                
-                # Save file
-                file.save(filepath)
-                logging.info(f"File saved: {filepath}")
-                
-                # Process the document
-                content = document_processor.process_document(filepath)
-                
-                if content and content.strip():
-                    # Add to RAG system with original filename for user reference
-                    rag_system.add_document(session_id, content, file.filename)
-                    uploaded_files.append({
-                        'filename': file.filename,
-                        'size': file_size,
-                        'status': 'processed',
-                        'message': f'Successfully processed - {len(content.split())} words extracted'
-                    })
-                    success_count += 1
-                    logging.info(f"Successfully processed: {file.filename} - Content length: {len(content)}")
-                else:
-                    uploaded_files.append({
-                        'filename': file.filename,
-                        'status': 'error',
-                        'message': 'Could not extract text content. File may be corrupted, password-protected, or unsupported format.'
-                    })
-                    # Clean up failed file
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
-                        
-            except Exception as e:
-                error_msg = str(e)
-                # Provide more specific error messages
-                if "corrupted" in error_msg.lower() or "invalid" in error_msg.lower():
-                    error_msg = "File appears to be corrupted or in an unsupported format"
-                elif "permission" in error_msg.lower():
-                    error_msg = "Permission denied accessing the file"
-                elif "memory" in error_msg.lower():
-                    error_msg = "File too large to process in memory"
-                
-                logging.error(f"Error processing file {file.filename}: {str(e)}")
-                uploaded_files.append({
-                    'filename': file.filename,
-                    'status': 'error',
-                    'message': f'Processing error: {error_msg}'
-                })
-                # Clean up failed file
-                if 'filepath' in locals() and os.path.exists(filepath):
-                    try:
-                        os.remove(filepath)
-                    except:
-                        pass  # Ignore cleanup errors
-        
-        # Prepare response
-        response_message = f'Successfully processed {success_count} out of {len(files)} files'
-        if success_count == 0:
-            response_message = 'No files were successfully processed'
+        job = ingestion_queue.submit(session_id, uploaded_files)
         
-        return jsonify({
-            'message': response_message,
-            'files': uploaded_files,
-            'success_count': success_count,
-            'total_count': len(files)
-        })
+        return jsonify(upload_job_response(job)), 202
         
     except Exception as e:
         logging.error(f"Upload error: {str(e)}")
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+@app.route('/upload_status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    try:
+        session_id = get_session_id()
+        job = ingestion_queue.get_job(job_id)
+        
+        if not job or job['session_id'] != session_id:
+            return jsonify({'error': 'Upload job not found'}), 404
+        
+        return jsonify(upload_job_response(job))
+        
+    except Exception as e:
+        logging.error(f"Upload status error: {str(e)}")
+        return jsonify({'error': f'Error getting upload status: {str(e)}'}), 500
+
 @app.route('/ask', methods=['POST'])
 def ask_question():
     try:
@@ -203,14 +466,7 @@ def ask_question():
             return jsonify({'error': 'No documents found. Please upload documents first.'}), 400
         
         # Store in session history
-        if 'chat_history' not in session:
-            session['chat_history'] = []
-        
-        session['chat_history'].append({
-            'question': question,
-            'answer': answer,
-            'timestamp': str(uuid.uuid4())  # Simple timestamp replacement
-        })
+        append_chat_history(session_id, question, answer)
         
         return jsonify({
             'question': question,
@@ -221,32 +477,75 @@ def ask_question():
         logging.error(f"Question answering error: {str(e)}")
         return jsonify({'error': f'Error processing question: {str(e)}'}), 500
 
+@app.route('/ask_stream', methods=['POST'])
+def ask_question_stream():
+    try:
+        session_id = get_session_id()
+        data = request.get_json()
+        question = data.get('question', '').strip()
+        
+        if not question:
+            return jsonify({'error': 'Question cannot be empty'}), 400
+        
+        logging.info(f"Ask question (stream) - Session ID: {session_id}")
+        
+        tokens = rag_system.ask_question_stream(session_id, question)
+        
+        if tokens is None:
+            return jsonify({'error': 'No documents found. Please upload documents first.'}), 400
+        
+        # History is written once the full answer has been streamed
+        return stream_tokens(tokens, 'answer',
+                             on_complete=lambda answer: append_chat_history(session_id, question, answer))
+        
+    except Exception as e:
+        logging.error(f"Question answering error: {str(e)}")
+        return jsonify({'error': f'Error processing question: {str(e)}'}), 500
+
 @app.route('/summarize', methods=['POST'])
 def summarize_documents():
     try:
         session_id = get_session_id()
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename')
         
-        # Get all documents for this session
-        documents = rag_system.get_documents(session_id)
+        # Get all chunks for this session in document order
+        documents = list(rag_system.iter_chunks(session_id, filename))
         
         if not documents:
             return jsonify({'error': 'No documents found. Please upload documents first.'}), 400
         
-        # Combine all document content
-        combined_content = "\n\n".join(documents)
-        
-        # Generate summary
-        summary = rag_system.summarize_text(combined_content)
+        # Generate summary over every chunk (map-reduce for long documents)
+        summary = rag_system.summarize_chunks(documents)
         
         return jsonify({
             'summary': summary,
-            'document_count': len(documents)
+            'document_count': 1 if filename else len(rag_system.get_sources(session_id)),
+            'chunk_count': len(documents)
         })
         
     except Exception as e:
         logging.error(f"Summarization error: {str(e)}")
         return jsonify({'error': f'Error generating summary: {str(e)}'}), 500
 
+@app.route('/summarize_stream', methods=['POST'])
+def summarize_documents_stream():
+    try:
+        session_id = get_session_id()
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename')
+        
+        documents = list(rag_system.iter_chunks(session_id, filename))
+        
+        if not documents:
+            return jsonify({'error': 'No documents found. Please upload documents first.'}), 400
+        
+        return stream_tokens(rag_system.summarize_chunks_stream(documents), 'summary')
+        
+    except Exception as e:
+        logging.error(f"Summarization error: {str(e)}")
+        return jsonify({'error': f'Error generating summary: {str(e)}'}), 500
+
 @app.route('/translate', methods=['POST'])
 def translate_text():
     try:
@@ -272,6 +571,57 @@ def translate_text():
         logging.error(f"Translation error: {str(e)}")
         return jsonify({'error': f'Error translating text: {str(e)}'}), 500
 
+@app.route('/translate_document', methods=['POST'])
+def translate_document():
+    try:
+        session_id = get_session_id()
+        upload = request.files.get('file')
+        data = request.form if upload else (request.get_json(silent=True) or {})
+        source_language = data.get('source_language', 'English')
+        target_language = data.get('target_language', 'Spanish')
+        
+        try:
+            translation_service.resolve_languages(source_language, target_language)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if upload is None:
+            # Translate documents already uploaded in this session from their stored chunks
+            filename = data.get('filename')
+            sources = rag_system.get_sources(session_id)
+            if filename:
+                sources = [source for source in sources if source == filename]
+            
+            if not sources:
+                return jsonify({'error': 'No documents found. Please upload documents first.'}), 400
+            
+            def documents():
+                for source in sources:
+                    total_chars = sum(len(piece) for _, piece in rag_system.iter_document_text(session_id, source))
+                    yield source, (piece for _, piece in rag_system.iter_document_text(session_id, source)), total_chars
+            
+            return stream_translation(documents(), source_language, target_language)
+        
+        if upload.filename == '' or not allowed_file(upload.filename):
+            return jsonify({'error': f'File type not supported. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+        
+        document = spool_upload(upload, upload_store.new_path(session_id, f"translate_{upload.filename}"))
+        cleanup = document.discard
+        
+        # Text is extracted unit by unit while the translation streams
+        units = document_processor.iter_document(document.path or document.filename, data=document.data)
+        first_unit = next(units, None)
+        if first_unit is None:
+            cleanup()
+            return jsonify({'error': 'Could not extract text content. File may be corrupted, password-protected, or unsupported format.'}), 400
+        
+        documents = [(upload.filename, join_units(first_unit, units), None)]
+        return stream_translation(documents, source_language, target_language, cleanup=cleanup)
+        
+    except Exception as e:
+        logging.error(f"Document translation error: {str(e)}")
+        return jsonify({'error': f'Error translating document: {str(e)}'}), 500
+
 @app.route('/summarize_text', methods=['POST'])
 def summarize_text_input():
     try:
@@ -283,19 +633,12 @@ def summarize_text_input():
             return jsonify({'error': 'Text cannot be empty'}), 400
         
         word_count = len(text.split())
-        max_words = 8000
         
-        if word_count > max_words:
-            return jsonify({'error': f'Text exceeds {max_words} word limit. Currently: {word_count} words.'}), 400
+        if word_count > MAX_SUMMARY_WORDS:
+            return jsonify({'error': f'Text exceeds {MAX_SUMMARY_WORDS} word limit. Currently: {word_count} words.'}), 400
         
         # Create prompt based on summary size
-        size_prompts = {
-            "Short (1-2 lines)": "Write a very short 1-2 line summary.",
-            "Medium (1 paragraph)": "Write a concise summary in one paragraph.",
-            "Detailed (multi-paragraph)": "Write a detailed multi-paragraph summary covering all important points."
-        }
-        
-        prompt_instruction = size_prompts.get(summary_size, size_prompts["Medium (1 paragraph)"])
+        prompt_instruction = SUMMARY_SIZE_PROMPTS.get(summary_size, SUMMARY_SIZE_PROMPTS["Medium (1 paragraph)"])
         
         # Generate summary using RAG system
         summary = rag_system.summarize_text_with_instruction(text, prompt_instruction)
@@ -310,6 +653,29 @@ def summarize_text_input():
         logging.error(f"Text summarization error: {str(e)}")
         return jsonify({'error': f'Error summarizing text: {str(e)}'}), 500
 
+@app.route('/summarize_text_stream', methods=['POST'])
+def summarize_text_input_stream():
+    try:
+        data = request.get_json()
+        text = data.get('text', '').strip()
+        summary_size = data.get('summary_size', 'Medium (1 paragraph)')
+        
+        if not text:
+            return jsonify({'error': 'Text cannot be empty'}), 400
+        
+        word_count = len(text.split())
+        
+        if word_count > MAX_SUMMARY_WORDS:
+            return jsonify({'error': f'Text exceeds {MAX_SUMMARY_WORDS} word limit. Currently: {word_count} words.'}), 400
+        
+        prompt_instruction = SUMMARY_SIZE_PROMPTS.get(summary_size, SUMMARY_SIZE_PROMPTS["Medium (1 paragraph)"])
+        
+        return stream_tokens(rag_system.summarize_text_stream(text, prompt_instruction), 'summary')
+        
+    except Exception as e:
+        logging.error(f"Text summarization error: {str(e)}")
+        return jsonify({'error': f'Error summarizing text: {str(e)}'}), 500
+
 @app.route('/get_languages', methods=['GET'])
 def get_languages():
     try:
@@ -325,18 +691,9 @@ def clear_history():
         session_id = get_session_id()
         
         # Clear chat history
-        session['chat_history'] = []
-        
-        # Clear RAG system data for this session
-        rag_system.clear_session(session_id)
+        chat_history.clear(session_id)
         
-        # Clean up uploaded files
-        for filename in os.listdir(app.config['UPLOAD_FOLDER']):
-            if filename.startswith(session_id):
-                try:
-                    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                except Exception as e:
-                    logging.warning(f"Could not remove file {filename}: {e}")
+        delete_session_storage(session_id)
         
         return jsonify({'message': 'History cleared successfully'})
         
@@ -344,11 +701,154 @@ def clear_history():
         logging.error(f"Clear history error: {str(e)}")
         return jsonify({'error': f'Error clearing history: {str(e)}'}), 500
 
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    try:
+        # Services that have not been used yet are reported as such instead of being built
+        stats = rag_system.get_stats() if rag_system.ready else {}
+        if content_registry.ready:
+            stats['content_registry'] = content_registry.stats()
+        if translation_service.ready:
+            stats['translation'] = translation_service.get_stats()
+        if chat_history.ready:
+            stats['chat_history'] = chat_history.stats()
+        stats['storage_janitor'] = storage_janitor.stats()
+        stats['services'] = service_status()
+        return jsonify(stats)
+    except Exception as e:
+        logging.error(f"Get stats error: {str(e)}")
+        return jsonify({'error': f'Error getting stats: {str(e)}'}), 500
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint; each worker process reports its own metrics"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/corpora', methods=['GET'])
+def list_corpora():
+    try:
+        session_id = get_session_id()
+        return jsonify({'corpora': rag_system.list_corpora(session_id)})
+    except Exception as e:
+        logging.error(f"List corpora error: {str(e)}")
+        return jsonify({'error': f'Error listing corpora: {str(e)}'}), 500
+
+@app.route('/corpora/<name>/attach', methods=['POST'])
+def attach_corpus(name):
+    try:
+        session_id = get_session_id()
+        rag_system.attach_corpus(session_id, name)
+        return jsonify({'message': f'Attached corpus {name}', 'corpora': rag_system.corpora.attached(session_id)})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logging.error(f"Attach corpus error: {str(e)}")
+        return jsonify({'error': f'Error attaching corpus: {str(e)}'}), 500
+
+@app.route('/corpora/<name>/detach', methods=['POST'])
+def detach_corpus(name):
+    try:
+        session_id = get_session_id()
+        rag_system.detach_corpus(session_id, name)
+        return jsonify({'message': f'Detached corpus {name}', 'corpora': rag_system.corpora.attached(session_id)})
+    except Exception as e:
+        logging.error(f"Detach corpus error: {str(e)}")
+        return jsonify({'error': f'Error detaching corpus: {str(e)}'}), 500
+
+@app.route('/admin/corpora/<name>', methods=['POST'])
+def load_corpus(name):
+    """Create a shared corpus if needed and ingest the uploaded files into it"""
+    if not is_admin_request():
+        return jsonify({'error': 'Admin token required'}), 403
+    try:
+        files = request.files.getlist('files')
+        if not files or all(file.filename == '' for file in files):
+            return jsonify({'error': 'No files selected'}), 400
+        
+        key = rag_system.create_corpus(name, request.form.get('description', ''))
+        job = ingestion_queue.submit(key, save_uploads(files, key))
+        return jsonify(upload_job_response(job)), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Load corpus error: {str(e)}")
+        return jsonify({'error': f'Error loading corpus: {str(e)}'}), 500
+
+@app.route('/admin/corpora/<name>/status/<job_id>', methods=['GET'])
+def load_corpus_status(name, job_id):
+    if not is_admin_request():
+        return jsonify({'error': 'Admin token required'}), 403
+    try:
+        job = ingestion_queue.get_job(job_id)
+        if not job or job['session_id'] != corpus_key(name):
+            return jsonify({'error': 'Upload job not found'}), 404
+        return jsonify(upload_job_response(job))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Corpus status error: {str(e)}")
+        return jsonify({'error': f'Error getting upload status: {str(e)}'}), 500
+
+@app.route('/admin/storage/sweep', methods=['POST'])
+def sweep_storage():
+    """Run the storage janitor now and report what it reclaimed"""
+    if not is_admin_request():
+        return jsonify({'error': 'Admin token required'}), 403
+    try:
+        return jsonify(storage_janitor.run())
+    except Exception as e:
+        logging.error(f"Storage sweep error: {str(e)}")
+        return jsonify({'error': f'Error sweeping storage: {str(e)}'}), 500
+
+@app.route('/admin/corpora/<name>', methods=['DELETE'])
+def delete_corpus(name):
+    if not is_admin_request():
+        return jsonify({'error': 'Admin token required'}), 403
+    try:
+        key = corpus_key(name)
+        rag_system.delete_corpus(name)
+        content_registry.release_session(key)
+        upload_store.clear(key)
+        return jsonify({'message': f'Deleted corpus {name}'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Delete corpus error: {str(e)}")
+        return jsonify({'error': f'Error deleting corpus: {str(e)}'}), 500
+
 @app.route('/get_chat_history')
 def get_chat_history():
-    return jsonify({
-        'history': session.get('chat_history', [])
-    })
+    """
+    Page through the session's chat history, newest page first
+    
+    Query parameters: limit (entries per page) and before (the next_before cursor
+    of the previous page); entries within a page are oldest first
+    """
+    try:
+        session_id = get_session_id()
+        limit = min(request.args.get('limit', CHAT_HISTORY_PAGE_SIZE, type=int), CHAT_HISTORY_MAX_ENTRIES)
+        before = request.args.get('before', type=int)
+        
+        entries, next_before = chat_history.get_page(session_id, max(limit, 0), before)
+        return jsonify({
+            'history': entries,
+            'total': chat_history.count(session_id),
+            'next_before': next_before
+        })
+    except Exception as e:
+        logging.error(f"Get chat history error: {str(e)}")
+        return jsonify({'error': f'Error getting chat history: {str(e)}'}), 500
+
+storage_janitor.start()
+
+if WARMUP_SERVICES:
+    threading.Thread(
+        target=warm_up,
+        args=(None if WARMUP_SERVICES == 'all' else [name.strip() for name in WARMUP_SERVICES.split(',')],),
+        name='warm-up',
+        daemon=True
+    ).start()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
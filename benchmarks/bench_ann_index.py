@@ -0,0 +1,64 @@
+"""
+Compare the flat index with approximate (IVF / HNSW, optionally quantized) indexes
+
+Usage: python -m benchmarks.bench_ann_index [--vectors 20000 100000] [--dimension 256]
+"""
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+from ann_index import INDEX_TYPES, QUANTIZATIONS, rebuild_with_recall, estimate_index_bytes
+
+
+def make_vectors(count: int, dimension: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def query_latency_ms(index: faiss.Index, queries: np.ndarray, k: int) -> float:
+    """Median latency of single-query searches, as issued per question"""
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query[None, :], k)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vectors', type=int, nargs='+', default=[20000, 100000])
+    parser.add_argument('--dimension', type=int, default=256)
+    parser.add_argument('--nprobe', type=int, default=16)
+    parser.add_argument('--ef-search', type=int, default=64)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    for count in args.vectors:
+        vectors = make_vectors(count, args.dimension)
+        queries = vectors[np.random.default_rng(1).choice(count, args.queries, replace=False)]
+
+        flat = faiss.IndexFlatL2(args.dimension)
+        flat.add(vectors)
+        print(json.dumps({
+            'vectors': count, 'type': 'flat', f'recall_at_{args.k}': 1.0,
+            'bytes': estimate_index_bytes(flat),
+            'query_ms': round(query_latency_ms(flat, queries, args.k), 3)
+        }))
+
+        for index_type in INDEX_TYPES:
+            for quantization in QUANTIZATIONS:
+                index, report = rebuild_with_recall(vectors, index_type, quantization, 32, args.nprobe,
+                                                    args.ef_search, args.k, args.queries)
+                report['query_ms'] = round(query_latency_ms(index, queries, args.k), 3)
+                print(json.dumps(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Measure app import time, first-request latency and service build time in fresh interpreters
+
+Usage: python -m benchmarks.bench_cold_start [--runs 3] [--max-import-seconds 1.0]
+
+Exits non-zero when importing app.py loads a heavy library or takes longer than the limit.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+# Libraries that must only be imported once a service needs them
+HEAVY_MODULES = ('langchain', 'langchain_groq', 'langchain_google_genai', 'langchain_community',
+                 'faiss', 'PyPDF2', 'docx', 'deep_translator')
+
+PROBE = r'''
+import sys, json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/')
+first_page = time.perf_counter()
+client.get('/get_languages')
+languages = time.perf_counter()
+loaded = sorted(name for name in HEAVY_MODULES if name in sys.modules)
+app.warm_up()
+warmed = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - started,
+    'first_page_seconds': first_page - imported,
+    'get_languages_seconds': languages - first_page,
+    'warm_up_seconds': warmed - languages,
+    'heavy_modules_at_import': loaded,
+    'services': {name: status['build_seconds'] for name, status in app.service_status().items()}
+}))
+'''
+
+
+def run_probe(root: str) -> dict:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = root + os.pathsep + env.get('PYTHONPATH', '')
+    env.setdefault('GROQ_API_KEY', 'benchmark')
+    env.setdefault('EMBEDDING_BACKEND', 'local')
+    env.pop('WARMUP_SERVICES', None)
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{PROBE}"
+    # A scratch working directory keeps the app's upload and index folders out of the tree
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env,
+                                capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-import-seconds', type=float, default=1.0)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = [run_probe(root) for _ in range(args.runs)]
+    best = {key: round(min(result[key] for result in results), 3)
+            for key in ('import_seconds', 'first_page_seconds', 'get_languages_seconds', 'warm_up_seconds')}
+    best['heavy_modules_at_import'] = results[-1]['heavy_modules_at_import']
+    best['services'] = {name: round(seconds, 3) if seconds is not None else None
+                        for name, seconds in results[-1]['services'].items()}
+    print(json.dumps(best))
+
+    if best['heavy_modules_at_import']:
+        print(f"Heavy modules imported by app.py: {', '.join(best['heavy_modules_at_import'])}", file=sys.stderr)
+        sys.exit(1)
+    if best['import_seconds'] > args.max_import_seconds:
+        print(f"Import took {best['import_seconds']}s (limit {args.max_import_seconds}s)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare serial and parallel PDF text extraction on synthetic PDFs
+
+Usage: python -m benchmarks.bench_pdf_extraction [--pages 100 500 1000] [--workers 4]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+from document_processor import DocumentProcessor
+from benchmarks.synthetic_docs import make_pdf
+
+
+def time_extraction(processor: DocumentProcessor, path: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        content = processor.process_document(path)
+        best = min(best, time.perf_counter() - started)
+        assert content, f"No text extracted from {path}"
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    serial = DocumentProcessor(pdf_workers=1)
+    parallel = DocumentProcessor(pdf_workers=args.workers, pdf_parallel_min_pages=1)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in args.pages:
+            path = os.path.join(directory, f"synthetic_{pages}.pdf")
+            make_pdf(path, pages)
+
+            # Warm up the process pool so worker start-up is not charged to the first run
+            parallel.process_document(path)
+
+            serial_seconds = time_extraction(serial, path, args.repeat)
+            parallel_seconds = time_extraction(parallel, path, args.repeat)
+            results.append({
+                'pages': pages,
+                'workers': args.workers,
+                'serial_seconds': round(serial_seconds, 4),
+                'parallel_seconds': round(parallel_seconds, 4),
+                'speedup': round(serial_seconds / parallel_seconds, 2)
+            })
+            print(json.dumps(results[-1]))
+
+
+if __name__ == '__main__':
+    main()
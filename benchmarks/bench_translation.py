@@ -0,0 +1,75 @@
+"""
+Measure translation segmentation throughput and end-to-end translation with a fake translator
+
+Usage: python -m benchmarks.bench_translation [--paragraphs 1000 10000] [--latency 0.05]
+"""
+import json
+import time
+import argparse
+from fake_backends import FakeTranslator
+from text_segmenter import iter_segments
+from translation_service import TranslationService, TRANSLATION_MAX_BYTES
+from benchmarks.synthetic_docs import make_paragraphs
+
+
+def legacy_split(text: str, max_length: int) -> list:
+    """The original '. ' splitter, kept as the baseline"""
+    sentences = text.split('. ')
+    chunks = []
+    current_chunk = ""
+    for sentence in sentences:
+        if len(current_chunk + sentence) <= max_length:
+            current_chunk += sentence + ". "
+        else:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+            current_chunk = sentence + ". "
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+def best_of(function, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paragraphs', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated seconds per translation request')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for paragraphs in args.paragraphs:
+        text = '\n\n'.join(make_paragraphs(paragraphs))
+        megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+
+        legacy_seconds = best_of(lambda: legacy_split(text, TRANSLATION_MAX_BYTES), args.repeat)
+        segment_seconds = best_of(lambda: list(iter_segments(text, TRANSLATION_MAX_BYTES)), args.repeat)
+
+        service = TranslationService(translator_factory=lambda **kwargs: FakeTranslator(latency=args.latency, **kwargs))
+        started = time.perf_counter()
+        service.translate(text, 'English', 'French')
+        cold_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        service.translate(text, 'English', 'French')
+        warm_seconds = time.perf_counter() - started
+
+        print(json.dumps({
+            'paragraphs': paragraphs,
+            'megabytes': round(megabytes, 2),
+            'legacy_split_mb_per_s': round(megabytes / legacy_seconds, 1),
+            'segmenter_mb_per_s': round(megabytes / segment_seconds, 1),
+            'translate_cold_seconds': round(cold_seconds, 3),
+            'translate_warm_seconds': round(warm_seconds, 3),
+            'requests_sent': service.get_stats()['requests_sent']
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Compare bytes written and read per upload: save-then-reopen vs spooled uploads
+
+Usage: python -m benchmarks.bench_upload [--sizes-kb 64 1024 16384] [--memory-limit-kb 8192] [--repeat 3]
+
+The saved path parses the request with the stock Flask request, saves the file,
+hashes it from disk and extracts it from disk. The spooled path parses it with
+SpoolingRequest, which hashes and sizes while parsing, and extracts from the
+in-memory bytes or the single copy on disk. Byte counts come from /proc/self/io
+(rchar/wchar, all read/write system calls of the process), so Linux only; reads of
+the request body are included, page-ins of memory-mapped files are not.
+"""
+import io
+import os
+import json
+import time
+import argparse
+import tempfile
+from flask import Request
+from werkzeug.test import EnvironBuilder
+from document_processor import DocumentProcessor
+from content_registry import ContentRegistry
+from upload_spool import SpoolingRequest, spool_upload
+from benchmarks.synthetic_docs import make_paragraphs
+
+
+def io_counters() -> dict:
+    with open('/proc/self/io', 'r') as file:
+        counters = dict(line.split(': ') for line in file.read().splitlines())
+    return {'read': int(counters['rchar']), 'written': int(counters['wchar'])}
+
+
+def make_payload(size: int) -> bytes:
+    paragraphs = make_paragraphs(max(1, size // 600) + 1, seed=size)
+    return '\n\n'.join(paragraphs).encode('utf-8')[:size]
+
+
+def upload_environ(payload: bytes) -> dict:
+    return EnvironBuilder(method='POST', data={'files': (io.BytesIO(payload), 'upload.txt')}).get_environ()
+
+
+def saved_path(processor: DocumentProcessor, environ: dict, directory: str) -> int:
+    """How uploads were handled before: save, hash from disk, extract from disk"""
+    request = Request(environ)
+    file = request.files['files']
+    path = os.path.join(directory, 'saved_upload.txt')
+    file.save(path)
+    ContentRegistry.hash_file(path)
+    units = sum(1 for _ in processor.iter_document(path))
+    request.close()
+    os.remove(path)
+    return units
+
+
+def spooled_path(processor: DocumentProcessor, environ: dict, directory: str) -> int:
+    request = SpoolingRequest(environ)
+    upload = spool_upload(request.files['files'], os.path.join(directory, 'spooled_upload.txt'))
+    units = sum(1 for _ in processor.iter_document(upload.path or upload.filename, data=upload.data))
+    request.close()
+    upload.discard()
+    return units
+
+
+def measure(handler, processor: DocumentProcessor, payload: bytes, directory: str, repeat: int) -> dict:
+    best = float('inf')
+    for _ in range(repeat):
+        # Building the request body is the client's work and may spool to disk itself
+        environ = upload_environ(payload)
+        before = io_counters()
+        started = time.perf_counter()
+        units = handler(processor, environ, directory)
+        best = min(best, time.perf_counter() - started)
+        after = io_counters()
+        assert units, 'No text extracted'
+    return {
+        'seconds': round(best, 4),
+        'bytes_read': after['read'] - before['read'],
+        'bytes_written': after['written'] - before['written']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes-kb', type=int, nargs='+', default=[64, 1024, 16384])
+    parser.add_argument('--memory-limit-kb', type=int, default=8192)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    processor = DocumentProcessor()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        SpoolingRequest.spool_dir = directory
+        SpoolingRequest.memory_limit = args.memory_limit_kb * 1024
+        for size_kb in args.sizes_kb:
+            payload = make_payload(size_kb * 1024)
+            results.append({
+                'size_kb': size_kb,
+                'in_memory': len(payload) <= args.memory_limit_kb * 1024,
+                'saved': measure(saved_path, processor, payload, directory, args.repeat),
+                'spooled': measure(spooled_path, processor, payload, directory, args.repeat)
+            })
+            print(json.dumps(results[-1]))
+
+
+if __name__ == '__main__':
+    main()
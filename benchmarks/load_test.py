@@ -0,0 +1,262 @@
+"""
+End-to-end load test of the Flask app with local fakes for Groq, Gemini and Google Translate
+
+Usage: python -m benchmarks.load_test [--clients 8] [--requests 40] [--formats txt pdf docx]
+       [--sizes 20 200] [--llm-latency 0.2] [--embedding-latency 0.05] [--output results.json]
+
+Each client has its own session: it uploads the synthetic corpus, then the endpoints
+are driven one after another by all clients concurrently. Latency percentiles,
+requests/sec and peak RSS are reported per endpoint as JSON.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from benchmarks.synthetic_docs import WORDS, make_paragraphs, make_txt, make_pdf, make_docx
+
+ENDPOINTS = ('upload', 'ask', 'summarize', 'summarize_text', 'translate')
+LANGUAGES = ('French', 'German', 'Spanish', 'Japanese')
+MAKERS = {'txt': make_txt, 'pdf': make_pdf, 'docx': make_docx}
+
+
+class RSSSampler:
+    """Samples the resident set size in the background and tracks the peak since the last reset"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+
+    @staticmethod
+    def current() -> int:
+        try:
+            with open('/proc/self/statm', 'r') as file:
+                return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            # Only the lifetime peak is available without procfs
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def start(self):
+        self._thread.start()
+
+    def reset(self):
+        self.peak = self.current()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def summarize_latencies(latencies: list, errors: int, seconds: float, peak_rss: int) -> dict:
+    values = np.asarray(latencies) * 1000
+    percentiles = np.percentile(values, [50, 95, 99]) if len(values) else [None] * 3
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(float(percentiles[0]), 2) if len(values) else None,
+        'p95_ms': round(float(percentiles[1]), 2) if len(values) else None,
+        'p99_ms': round(float(percentiles[2]), 2) if len(values) else None,
+        'mean_ms': round(float(values.mean()), 2) if len(values) else None,
+        'rps': round(len(latencies) / seconds, 2) if seconds else None,
+        'seconds': round(seconds, 3),
+        'peak_rss_mb': round(peak_rss / (1024 * 1024), 1)
+    }
+
+
+def make_corpus(directory: str, formats: list, sizes: list) -> list:
+    """Write one synthetic document per format and size (paragraphs, or pages for PDF)"""
+    corpus = []
+    for file_format in formats:
+        for size in sizes:
+            path = os.path.join(directory, f"synthetic_{size}.{file_format}")
+            MAKERS[file_format](path, size)
+            corpus.append({'format': file_format, 'size': size, 'path': path, 'bytes': os.path.getsize(path)})
+    return corpus
+
+
+def install_fakes(app_module, args) -> dict:
+    """Swap the remote services of the app's (lazily built) services for local fakes"""
+    from fake_backends import FakeChatModel, FakeEmbeddings, FakeTranslator
+
+    embeddings = FakeEmbeddings(latency=args.embedding_latency, calls_per_second=args.embedding_rps)
+    llm = FakeChatModel(latency=args.llm_latency, token_latency=args.token_latency,
+                        calls_per_second=args.llm_rps, output_tokens=args.output_tokens)
+    translators = []
+
+    def translator_factory(**kwargs):
+        translator = FakeTranslator(latency=args.translate_latency, calls_per_second=args.translate_rps, **kwargs)
+        translators.append(translator)
+        return translator
+
+    rag_system = app_module.rag_system
+    rag_system.embedding_scheduler.embeddings = embeddings
+    rag_system.llm = llm
+    rag_system.summarizer.llm = llm
+    app_module.translation_service.translator_factory = translator_factory
+    return {'embeddings': embeddings, 'llm': llm, 'translators': translators}
+
+
+def run_phase(clients: list, requests_per_client: int, request) -> tuple:
+    """Run request(client, number) from every client concurrently; returns (latencies, errors, seconds)"""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def worker(index: int):
+        nonlocal errors
+        client = clients[index]
+        for number in range(requests_per_client):
+            started = time.perf_counter()
+            try:
+                ok = request(client, index, number)
+            except Exception as e:
+                logging.warning(f"Request failed: {str(e)}")
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors += 0 if ok else 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        list(executor.map(worker, range(len(clients))))
+    return latencies, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients, each with its own session')
+    parser.add_argument('--requests', type=int, default=40, help='Requests per endpoint (split across clients)')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--formats', nargs='+', choices=sorted(MAKERS), default=['txt', 'pdf', 'docx'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 200],
+                        help='Document sizes in paragraphs (pages for PDF)')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='Simulated seconds to first token')
+    parser.add_argument('--token-latency', type=float, default=0.005, help='Simulated seconds per output token')
+    parser.add_argument('--output-tokens', type=int, default=64)
+    parser.add_argument('--embedding-latency', type=float, default=0.05, help='Simulated seconds per embedding call')
+    parser.add_argument('--translate-latency', type=float, default=0.05, help='Simulated seconds per translation call')
+    parser.add_argument('--llm-rps', type=float, default=0.0, help='Simulated LLM rate limit (0 for none)')
+    parser.add_argument('--embedding-rps', type=float, default=0.0, help='Simulated embedding rate limit (0 for none)')
+    parser.add_argument('--translate-rps', type=float, default=0.0, help='Simulated translation rate limit (0 for none)')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    original_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='load-test-')
+    # The app keeps uploads and indexes relative to the working directory
+    os.chdir(workdir)
+    os.environ.setdefault('GROQ_API_KEY', 'load-test')
+    os.environ.setdefault('GOOGLE_API_KEY', 'load-test')
+    os.environ['EMBEDDING_BACKEND'] = 'google'
+
+    import app as app_module
+    logging.getLogger().setLevel(logging.WARNING)
+    fakes = install_fakes(app_module, args)
+
+    corpus = make_corpus(workdir, args.formats, args.sizes)
+    clients = [app_module.app.test_client() for _ in range(max(1, args.clients))]
+    per_client = max(1, args.requests // len(clients))
+    sampler = RSSSampler()
+    sampler.start()
+    results = {}
+
+    def record(name: str, latencies: list, errors: int, seconds: float):
+        results[name] = summarize_latencies(latencies, errors, seconds, sampler.peak)
+        print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+
+    # Every client uploads the whole corpus, so later endpoints have documents to work on
+    if 'upload' in args.endpoints or {'ask', 'summarize'} & set(args.endpoints):
+        # The POST alone is the upload latency; ingestion is timed until the job is done
+        upload_latencies, ingest_latencies, ingest_errors = [], [], 0
+        lock = threading.Lock()
+
+        def upload(client, index, number):
+            nonlocal ingest_errors
+            document = corpus[number]
+            started = time.perf_counter()
+            with open(document['path'], 'rb') as file:
+                response = client.post('/upload', data={'files': (file, os.path.basename(document['path']))},
+                                       content_type='multipart/form-data')
+            with lock:
+                upload_latencies.append(time.perf_counter() - started)
+            if response.status_code != 202:
+                return False
+            job_id = response.get_json()['job_id']
+            while True:
+                job = client.get(f'/upload_status/{job_id}').get_json()
+                if job['done']:
+                    break
+                time.sleep(0.02)
+            with lock:
+                ingest_latencies.append(time.perf_counter() - started)
+                ingest_errors += 0 if job['success_count'] == job['total_count'] else 1
+            return True
+
+        sampler.reset()
+        _, errors, seconds = run_phase(clients, len(corpus), upload)
+        record('upload', upload_latencies, errors, seconds)
+        record('ingest', ingest_latencies, ingest_errors, seconds)
+
+    def ask(client, index, number):
+        rng = random.Random(index * 100003 + number)
+        question = f"What does the {rng.choice(WORDS)} {rng.choice(WORDS)} section say about {rng.choice(WORDS)}?"
+        return client.post('/ask', json={'question': question}).status_code == 200
+
+    def summarize(client, index, number):
+        return client.post('/summarize', json={}).status_code == 200
+
+    def summarize_text(client, index, number):
+        text = '\n\n'.join(make_paragraphs(8, seed=index * 100003 + number))
+        return client.post('/summarize_text', json={'text': text}).status_code == 200
+
+    def translate(client, index, number):
+        text = '\n\n'.join(make_paragraphs(3, seed=index * 100003 + number))
+        target = LANGUAGES[number % len(LANGUAGES)]
+        return client.post('/translate', json={'text': text, 'source_language': 'English',
+                                               'target_language': target}).status_code == 200
+
+    for name, request in (('ask', ask), ('summarize', summarize),
+                          ('summarize_text', summarize_text), ('translate', translate)):
+        if name not in args.endpoints:
+            continue
+        sampler.reset()
+        record(name, *run_phase(clients, per_client, request))
+
+    sampler.stop()
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'corpus': [{key: document[key] for key in ('format', 'size', 'bytes')} for document in corpus],
+        'endpoints': results,
+        'backend_calls': {
+            'llm': fakes['llm'].calls,
+            'embedding': fakes['embeddings'].calls,
+            'texts_embedded': fakes['embeddings'].texts_embedded,
+            'translation': sum(translator.calls for translator in fakes['translators'])
+        }
+    }
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    os.chdir(original_dir)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Generators for synthetic TXT, PDF and DOCX documents used by the benchmarks
+"""
+import random
+
+WORDS = (
+    "agreement policy employee deadline quarterly revenue contract section clause party "
+    "report analysis market customer product service delivery invoice payment schedule "
+    "compliance review approval budget forecast project milestone risk security access "
+    "training handbook benefit leave request manager department office region support"
+).split()
+
+
+def make_paragraphs(paragraph_count: int, words_per_paragraph: int = 120, seed: int = 0):
+    """Yield deterministic pseudo-English paragraphs"""
+    rng = random.Random(seed)
+    for number in range(paragraph_count):
+        words = [rng.choice(WORDS) for _ in range(words_per_paragraph)]
+        sentences = []
+        for start in range(0, len(words), 12):
+            sentence = ' '.join(words[start:start + 12])
+            sentences.append(sentence[0].upper() + sentence[1:] + '.')
+        yield f"{number + 1}. " + ' '.join(sentences)
+
+
+def make_txt(path: str, paragraph_count: int, seed: int = 0):
+    with open(path, 'w', encoding='utf-8') as file:
+        for paragraph in make_paragraphs(paragraph_count, seed=seed):
+            file.write(paragraph + "\n\n")
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(path: str, page_count: int, lines_per_page: int = 40, seed: int = 0):
+    """Write a minimal text-only PDF with one Helvetica content stream per page"""
+    rng = random.Random(seed)
+    objects = []  # object bodies; object number = index + 1
+
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(None)  # page tree, filled in once page object numbers are known
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_numbers = []
+    for page in range(page_count):
+        lines = [f"Page {page + 1}"]
+        for _ in range(lines_per_page):
+            lines.append(' '.join(rng.choice(WORDS) for _ in range(12)))
+        stream = ["BT /F1 10 Tf 12 TL 50 780 Td"]
+        for line in lines:
+            stream.append(f"({_pdf_escape(line)}) Tj T*")
+        stream.append("ET")
+        data = "\n".join(stream).encode('latin-1')
+
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        content_number = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_number
+        )
+        page_numbers.append(len(objects))
+
+    kids = ' '.join(f"{number} 0 R" for number in page_numbers)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode('latin-1')
+
+    with open(path, 'wb') as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(file.tell())
+            file.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref_offset = file.tell()
+        file.write(b"xref\n0 %d\n" % (len(objects) + 1))
+        file.write(b"0000000000 65535 f \n")
+        for offset in offsets:
+            file.write(b"%010d 00000 n \n" % offset)
+        file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+
+
+def make_docx(path: str, paragraph_count: int, seed: int = 0):
+    import docx
+
+    document = docx.Document()
+    for paragraph in make_paragraphs(paragraph_count, seed=seed):
+        document.add_paragraph(paragraph)
+    document.save(path)
@@ -0,0 +1,260 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import List, Optional, Tuple
+
+
+class ChatHistoryStore(ABC):
+    """
+    Server-side store of each session's question/answer history
+    Only the session id travels in the cookie; histories live here, capped to the
+    newest max_entries per session. Entries are dicts with id, question, answer
+    and timestamp (seconds since the epoch); ids increase within a session.
+    """
+
+    @abstractmethod
+    def append(self, session_id: str, question: str, answer: str) -> dict:
+        """Add a question and its answer; returns the stored entry"""
+
+    @abstractmethod
+    def get_page(self, session_id: str, limit: int, before: Optional[int] = None) -> Tuple[List[dict], Optional[int]]:
+        """
+        Get a page of a session's history, walking back from the newest entry
+
+        Args:
+            session_id: Session identifier
+            limit: Maximum number of entries
+            before: Only entries with a smaller id (the cursor returned for the previous page)
+
+        Returns:
+            (entries oldest first, cursor for the next older page or None at the start)
+        """
+
+    @abstractmethod
+    def count(self, session_id: str) -> int:
+        """Number of entries kept for a session"""
+
+    @abstractmethod
+    def clear(self, session_id: str):
+        """Delete a session's history"""
+
+    def compact(self) -> int:
+        """Drop histories of sessions idle past the TTL; returns the number of entries removed"""
+        return 0
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryChatHistoryStore(ChatHistoryStore):
+    """
+    Per-process history store, for a single worker or tests
+    Every compact_every appends, histories idle past the TTL are dropped.
+    """
+
+    def __init__(self, max_entries: int = 200, ttl: float = 30 * 24 * 3600, compact_every: int = 1000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.compact_every = compact_every
+        self.appends = 0
+        self.compacted = 0
+        self._histories = {}  # session_id -> deque of entries
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def append(self, session_id: str, question: str, answer: str) -> dict:
+        with self._lock:
+            entry = {'id': self._next_id, 'question': question, 'answer': answer, 'timestamp': time.time()}
+            self._next_id += 1
+            self._histories.setdefault(session_id, deque(maxlen=self.max_entries)).append(entry)
+            self.appends += 1
+            due = self.compact_every and self.appends % self.compact_every == 0
+
+        if due:
+            self.compact()
+        return entry
+
+    def get_page(self, session_id: str, limit: int, before: Optional[int] = None) -> Tuple[List[dict], Optional[int]]:
+        with self._lock:
+            entries = [entry for entry in self._histories.get(session_id, ())
+                       if before is None or entry['id'] < before]
+        page = entries[-limit:] if limit > 0 else []
+        cursor = page[0]['id'] if page and len(entries) > len(page) else None
+        return [dict(entry) for entry in page], cursor
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            return len(self._histories.get(session_id, ()))
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._histories.pop(session_id, None)
+
+    def compact(self) -> int:
+        cutoff = time.time() - self.ttl
+        removed = 0
+        with self._lock:
+            for session_id in list(self._histories):
+                history = self._histories[session_id]
+                if not history or history[-1]['timestamp'] < cutoff:
+                    removed += len(history)
+                    del self._histories[session_id]
+            self.compacted += removed
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'sessions': len(self._histories),
+                'entries': sum(len(history) for history in self._histories.values()),
+                'compacted': self.compacted
+            }
+
+
+class SQLiteChatHistoryStore(ChatHistoryStore):
+    """
+    History store in a local SQLite database shared by all worker processes
+    Each append trims the session to its newest max_entries. Every compact_every
+    appends, histories idle past the TTL are dropped and freed pages are returned
+    to the filesystem.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200, ttl: float = 30 * 24 * 3600,
+                 compact_every: int = 1000):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.compact_every = compact_every
+        self.appends = 0
+        self.trimmed = 0
+        self.compacted = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Must be set before the first table is created to take effect
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_history_session ON history(session_id, id)")
+        self._conn.commit()
+
+    def append(self, session_id: str, question: str, answer: str) -> dict:
+        timestamp = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO history (session_id, question, answer, timestamp) VALUES (?, ?, ?, ?)",
+                (session_id, question, answer, timestamp)
+            )
+            entry_id = cursor.lastrowid
+            # Keep the newest max_entries; ids below the cutoff are the oldest ones
+            trimmed = self._conn.execute(
+                """DELETE FROM history WHERE session_id = ? AND id <= (
+                       SELECT id FROM history WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)""",
+                (session_id, session_id, self.max_entries)
+            ).rowcount
+            self._conn.commit()
+            self.trimmed += trimmed
+            self.appends += 1
+            due = self.compact_every and self.appends % self.compact_every == 0
+
+        if due:
+            self.compact()
+        return {'id': entry_id, 'question': question, 'answer': answer, 'timestamp': timestamp}
+
+    def get_page(self, session_id: str, limit: int, before: Optional[int] = None) -> Tuple[List[dict], Optional[int]]:
+        if limit <= 0:
+            return [], None
+        with self._lock:
+            # One extra row tells whether an older page exists
+            rows = self._conn.execute(
+                """SELECT id, question, answer, timestamp FROM history
+                   WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?""",
+                (session_id, before if before is not None else 2 ** 63 - 1, limit + 1)
+            ).fetchall()
+        page = rows[:limit]
+        cursor = page[-1][0] if len(rows) > limit else None
+        entries = [{'id': row[0], 'question': row[1], 'answer': row[2], 'timestamp': row[3]}
+                   for row in reversed(page)]
+        return entries, cursor
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history WHERE session_id = ?",
+                                      (session_id,)).fetchone()[0]
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def compact(self) -> int:
+        cutoff = time.time() - self.ttl
+        try:
+            with self._lock:
+                removed = self._conn.execute(
+                    """DELETE FROM history WHERE session_id IN (
+                           SELECT session_id FROM history GROUP BY session_id HAVING MAX(timestamp) < ?)""",
+                    (cutoff,)
+                ).rowcount
+                self._conn.commit()
+                # Frees one page per step; execute() steps a statement without result columns
+                # only once, while executescript() runs it to completion
+                self._conn.executescript("PRAGMA incremental_vacuum")
+                self.compacted += removed
+        except Exception as e:
+            self.logger.error(f"Error compacting chat history: {str(e)}")
+            return 0
+
+        if removed:
+            self.logger.info(f"Compacted chat history: removed {removed} entries of idle sessions")
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, sessions = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT session_id) FROM history"
+            ).fetchone()
+            return {
+                'backend': 'sqlite',
+                'sessions': sessions,
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'trimmed': self.trimmed,
+                'compacted': self.compacted
+            }
+
+
+def create_history_store(backend: str, root: str, max_entries: int = 200,
+                         ttl: float = 30 * 24 * 3600) -> ChatHistoryStore:
+    """
+    Build the configured chat history store
+
+    Args:
+        backend: 'sqlite' (shared by workers, survives restarts) or 'memory'
+        root: Folder holding the SQLite database
+        max_entries: Entries kept per session
+        ttl: Seconds of inactivity after which a session's history is dropped
+
+    Returns:
+        ChatHistoryStore
+    """
+    if backend == 'sqlite':
+        return SQLiteChatHistoryStore(os.path.join(root, 'chat_history.sqlite3'), max_entries=max_entries, ttl=ttl)
+    if backend == 'memory':
+        return MemoryChatHistoryStore(max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown chat history backend: {backend}")
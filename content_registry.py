@@ -0,0 +1,241 @@
+import os
+import json
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+import time
+import uuid
+import numpy as np
+from typing import List, Optional, Iterator, Tuple
+
+CHUNKS_FILE = 'chunks.jsonl'
+VECTORS_FILE = 'vectors.f32'
+META_FILE = 'meta.json'
+
+
+class ArtifactWriter:
+    """Writes a document's chunks and vectors to a temporary directory, batch by batch"""
+
+    def __init__(self, registry: "ContentRegistry", artifact_key: str):
+        self.registry = registry
+        self.artifact_key = artifact_key
+        self.temp_dir = os.path.join(registry.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(self.temp_dir)
+        self.chunk_count = 0
+        self.dimension = None
+        self._chunks_file = open(os.path.join(self.temp_dir, CHUNKS_FILE), 'w', encoding='utf-8')
+        self._vectors_file = open(os.path.join(self.temp_dir, VECTORS_FILE), 'wb')
+
+    def add(self, chunks: List[str], vectors: List[List[float]], placements: Optional[List[dict]] = None):
+        array = np.asarray(vectors, dtype=np.float32)
+        self.dimension = array.shape[1]
+        for chunk, placement in zip(chunks, placements or [{}] * len(chunks)):
+            # Chunks with overlap metadata are stored as objects, plain strings otherwise
+            record = {'text': chunk, **placement} if placement else chunk
+            self._chunks_file.write(json.dumps(record) + '\n')
+        self._vectors_file.write(array.tobytes())
+        self.chunk_count += len(chunks)
+
+    def commit(self, words: int, size: int):
+        self._close()
+        with open(os.path.join(self.temp_dir, META_FILE), 'w', encoding='utf-8') as file:
+            json.dump({'chunks': self.chunk_count, 'dimension': self.dimension,
+                       'words': words, 'size': size}, file)
+        self.registry._publish(self)
+
+    def abort(self):
+        self._close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _close(self):
+        if not self._chunks_file.closed:
+            self._chunks_file.close()
+            self._vectors_file.close()
+
+
+class ContentRegistry:
+    """
+    Registry of ingested file contents keyed by content hash
+    A re-upload of a file whose content was ingested before reuses its chunks and
+    vectors instead of being extracted and embedded again. Artifacts are reference
+    counted per session and deleted once no session uses them.
+    """
+
+    def __init__(self, root: str, profile: str):
+        self.logger = logging.getLogger(__name__)
+        self.root = os.path.join(root, 'content')
+        self.profile = profile
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(self.root, 'registry.sqlite3'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY,
+                chunks INTEGER NOT NULL,
+                words INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS refs (
+                key TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                PRIMARY KEY (key, session_id)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_refs_session ON refs(session_id)")
+        self._conn.commit()
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def artifact_key(self, content_hash: str) -> str:
+        """Artifacts are only reusable with the same embedding model and chunking settings"""
+        return hashlib.sha256(f"{self.profile}\x00{content_hash}".encode('utf-8')).hexdigest()
+
+    def acquire(self, content_hash: str, session_id: str) -> Optional[dict]:
+        """
+        Find a previously ingested file and reference it for a session before it is read,
+        so that another session releasing it cannot delete it mid-read
+        
+        Returns:
+            Artifact metadata (chunks, words, size, and whether the reference is new) or None
+        """
+        key = self.artifact_key(content_hash)
+        with self._lock:
+            # Check and reference in one write transaction, also against other worker processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT chunks, words, size FROM artifacts WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or not os.path.exists(os.path.join(self.root, key, META_FILE)):
+                    self._conn.rollback()
+                    self.misses += 1
+                    return None
+                new_ref = self._conn.execute("INSERT OR IGNORE INTO refs (key, session_id) VALUES (?, ?)",
+                                             (key, session_id)).rowcount == 1
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            self.hits += 1
+        return {'key': key, 'chunks': row[0], 'words': row[1], 'size': row[2], 'new_ref': new_ref}
+
+    def iter_batches(self, content_hash: str, batch_size: int) -> Iterator[Tuple[List[str], List[List[float]], List[dict]]]:
+        """Stream a stored artifact's chunks, vectors and chunk placements in document order"""
+        directory = os.path.join(self.root, self.artifact_key(content_hash))
+        with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as file:
+            meta = json.load(file)
+        if not meta['chunks']:
+            return
+
+        vectors = np.memmap(os.path.join(directory, VECTORS_FILE), dtype=np.float32, mode='r',
+                            shape=(meta['chunks'], meta['dimension']))
+        with open(os.path.join(directory, CHUNKS_FILE), 'r', encoding='utf-8') as file:
+            chunks, placements = [], []
+            position = 0
+            for line in file:
+                record = json.loads(line)
+                # Artifacts stored before placements were recorded hold plain strings
+                if isinstance(record, str):
+                    chunks.append(record)
+                    placements.append({})
+                else:
+                    chunks.append(record.pop('text'))
+                    placements.append(record)
+                if len(chunks) == batch_size:
+                    yield chunks, vectors[position:position + len(chunks)].tolist(), placements
+                    position += len(chunks)
+                    chunks, placements = [], []
+            if chunks:
+                yield chunks, vectors[position:position + len(chunks)].tolist(), placements
+
+    def writer(self, content_hash: str) -> ArtifactWriter:
+        return ArtifactWriter(self, self.artifact_key(content_hash))
+
+    def _publish(self, writer: ArtifactWriter):
+        """Move a completed artifact into place; a concurrent ingest of the same content keeps the first"""
+        target = os.path.join(self.root, writer.artifact_key)
+        with open(os.path.join(writer.temp_dir, META_FILE), 'r', encoding='utf-8') as file:
+            meta = json.load(file)
+
+        with self._lock:
+            if os.path.exists(target):
+                shutil.rmtree(writer.temp_dir, ignore_errors=True)
+                return
+            os.replace(writer.temp_dir, target)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts (key, chunks, words, size, created) VALUES (?, ?, ?, ?, ?)",
+                (writer.artifact_key, meta['chunks'], meta['words'], meta['size'], time.time())
+            )
+            self._conn.commit()
+        self.logger.info(f"Registered content artifact {writer.artifact_key[:12]} ({meta['chunks']} chunks)")
+
+    def add_ref(self, content_hash: str, session_id: str):
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO refs (key, session_id) VALUES (?, ?)",
+                               (self.artifact_key(content_hash), session_id))
+            self._conn.commit()
+
+    def release(self, content_hash: str, session_id: str) -> int:
+        """Drop one session's reference to a file, deleting its artifact if no other session uses it"""
+        return self._release(session_id, [self.artifact_key(content_hash)])
+
+    def release_session(self, session_id: str) -> int:
+        """
+        Drop a session's references and delete artifacts no other session uses
+
+        Returns:
+            Number of artifacts deleted
+        """
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute(
+                "SELECT key FROM refs WHERE session_id = ?", (session_id,)
+            ).fetchall()]
+        return self._release(session_id, keys)
+
+    def _release(self, session_id: str, keys: List[str]) -> int:
+        with self._lock:
+            self._conn.executemany("DELETE FROM refs WHERE key = ? AND session_id = ?",
+                                   [(key, session_id) for key in keys])
+
+            orphaned = []
+            for key in keys:
+                remaining = self._conn.execute("SELECT COUNT(*) FROM refs WHERE key = ?", (key,)).fetchone()[0]
+                if remaining == 0:
+                    orphaned.append(key)
+                    self._conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+            self._conn.commit()
+
+        for key in orphaned:
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+        if orphaned:
+            self.logger.info(f"Deleted {len(orphaned)} unreferenced content artifacts")
+        return len(orphaned)
+
+    def stats(self) -> dict:
+        with self._lock:
+            artifacts, chunks = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunks), 0) FROM artifacts"
+            ).fetchone()
+            refs = self._conn.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+            return {
+                'artifacts': artifacts,
+                'chunks': chunks,
+                'references': refs,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -1,129 +1,391 @@
+import io
 import os
+import mmap
+import codecs
 import logging
-import PyPDF2
-import docx
-from typing import Optional
+import tempfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, List, Tuple, Iterator
+import metrics
+
+PDF_PARALLEL_WORKERS = int(os.environ.get('PDF_PARALLEL_WORKERS', os.cpu_count() or 1))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 64))
+TXT_READ_BLOCK_SIZE = 1024 * 1024
+
+# PyPDF2 and python-docx are imported by the extractors that use them, so
+# processing one format does not load the libraries of the others
+
+
+def _extract_page_texts(pdf_reader, page_numbers) -> List[Tuple[int, Optional[str], Optional[str]]]:
+    """Extract text from the given pages, isolating errors per page as (page_num, text, error)"""
+    results = []
+    for page_num in page_numbers:
+        try:
+            text = pdf_reader.pages[page_num].extract_text()
+            results.append((page_num, text, None))
+        except Exception as e:
+            results.append((page_num, None, str(e)))
+    return results
+
+
+def _extract_pdf_page_range(file_path: str, start: int, end: int) -> List[Tuple[int, Optional[str], Optional[str]]]:
+    """Process pool worker: open the PDF independently and extract pages [start, end)"""
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return _extract_page_texts(pdf_reader, range(start, end))
+
+
+class _BufferReader(io.RawIOBase):
+    """Read-only raw file over a bytes-like buffer, so it can be decoded without a copy"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._position:self._position + len(buffer)]
+        size = len(chunk)
+        buffer[:size] = chunk
+        self._position += size
+        return size
+
 
 class DocumentProcessor:
     """Handles processing of different document types (TXT, PDF, DOCX)"""
     
-    def __init__(self):
+    def __init__(self, pdf_workers: int = PDF_PARALLEL_WORKERS, pdf_parallel_min_pages: int = PDF_PARALLEL_MIN_PAGES):
         self.logger = logging.getLogger(__name__)
+        self.pdf_workers = pdf_workers
+        self.pdf_parallel_min_pages = pdf_parallel_min_pages
+        self._pdf_pool = None
+        self._pdf_pool_lock = threading.Lock()
     
-    def process_document(self, file_path: str) -> Optional[str]:
+    def process_document(self, file_path: str, data: Optional[bytes] = None) -> Optional[str]:
         """
         Process a document and extract its text content
         
         Args:
-            file_path: Path to the document file
+            file_path: Path to the document file (only its name is used when data is given)
+            data: The file's bytes, when it is already in memory
             
         Returns:
             Extracted text content or None if processing fails
         """
         try:
-            if not os.path.exists(file_path):
-                self.logger.error(f"File not found: {file_path}")
-                return None
-            
-            # Check if file is empty
-            if os.path.getsize(file_path) == 0:
-                self.logger.error(f"File is empty: {file_path}")
+            if not self._check_file(file_path, data):
                 return None
             
             file_extension = file_path.lower().split('.')[-1]
             
-            if file_extension == 'txt':
-                return self._process_txt(file_path)
-            elif file_extension == 'pdf':
-                return self._process_pdf(file_path)
-            elif file_extension == 'docx':
-                return self._process_docx(file_path)
-            else:
+            processors = {'txt': self._process_txt, 'pdf': self._process_pdf, 'docx': self._process_docx}
+            if file_extension not in processors:
                 self.logger.error(f"Unsupported file type: {file_extension}")
                 return None
+            
+            with metrics.span('document_processor', f'extract_{file_extension}'):
+                content = processors[file_extension](file_path, data)
+            if content:
+                metrics.inc('extracted_bytes_total', len(content.encode('utf-8')), format=file_extension)
+            return content
                 
         except Exception as e:
             self.logger.error(f"Error processing document {file_path}: {str(e)}")
             return None
     
-    def _process_txt(self, file_path: str) -> Optional[str]:
-        """Process TXT files with better encoding handling"""
-        encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
+    def iter_document(self, file_path: str, data: Optional[bytes] = None) -> Iterator[str]:
+        """
+        Stream a document's text one unit (paragraph or page) at a time
         
-        for encoding in encodings:
+        Joining the yielded units with blank lines gives the same text as
+        process_document, without ever holding the whole document as one string
+        
+        Args:
+            file_path: Path to the document file (only its name is used when data is given)
+            data: The file's bytes, when it is already in memory
+            
+        Yields:
+            Non-empty text units in document order
+        """
+        try:
+            if not self._check_file(file_path, data):
+                return
+            
+            file_extension = file_path.lower().split('.')[-1]
+            
+            iterators = {'txt': self._iter_txt, 'pdf': self._iter_pdf, 'docx': self._iter_docx}
+            if file_extension not in iterators:
+                self.logger.error(f"Unsupported file type: {file_extension}")
+                return
+            
+            # Only time spent extracting counts; the consumer's work between units does not
+            extracted = 0
             try:
-                with open(file_path, 'r', encoding=encoding) as file:
-                    content = file.read()
-                if content.strip():
-                    self.logger.info(f"Successfully read TXT file with {encoding} encoding")
-                    return content.strip()
-            except UnicodeDecodeError:
-                continue
-            except Exception as e:
-                self.logger.error(f"Error reading TXT file with {encoding}: {str(e)}")
-                continue
+                for text in metrics.timed_iter(iterators[file_extension](file_path, data),
+                                               'document_processor', f'extract_{file_extension}'):
+                    extracted += len(text.encode('utf-8'))
+                    yield text
+            finally:
+                metrics.inc('extracted_bytes_total', extracted, format=file_extension)
+                
+        except Exception as e:
+            self.logger.error(f"Error processing document {file_path}: {str(e)}")
+    
+    def _check_file(self, file_path: str, data: Optional[bytes] = None) -> bool:
+        if data is not None:
+            if not data:
+                self.logger.error(f"File is empty: {file_path}")
+                return False
+            return True
+        
+        if not os.path.exists(file_path):
+            self.logger.error(f"File not found: {file_path}")
+            return False
+        
+        # Check if file is empty
+        if os.path.getsize(file_path) == 0:
+            self.logger.error(f"File is empty: {file_path}")
+            return False
         
-        self.logger.error(f"Could not read TXT file {file_path} with any encoding")
-        return None
+        return True
     
-    def _process_pdf(self, file_path: str) -> Optional[str]:
+    def _process_txt(self, file_path: str, data: Optional[bytes] = None) -> Optional[str]:
+        """Process TXT files with better encoding handling"""
+        content = '\n\n'.join(self._iter_txt(file_path, data)).strip()
+        return content or None
+    
+    @contextmanager
+    def _open_buffer(self, file_path: str, data: Optional[bytes] = None) -> Iterator[memoryview]:
+        """View of the file's bytes: the in-memory data, or the file memory-mapped"""
+        if data is not None:
+            with memoryview(data) as view:
+                yield view
+            return
+        with open(file_path, 'rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                memoryview(mapped) as view:
+            yield view
+    
+    @staticmethod
+    def _detect_txt_encoding(view: memoryview) -> str:
+        """
+        Validate the raw bytes as UTF-8 in one pass, falling back to latin-1 (which accepts any bytes)
+        
+        ASCII blocks are skipped with a fast byte check; only blocks with other
+        bytes (or that finish a sequence split across blocks) go through the decoder
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            for start in range(0, len(view), TXT_READ_BLOCK_SIZE):
+                block = view[start:start + TXT_READ_BLOCK_SIZE].tobytes()
+                if not block.isascii() or decoder.getstate()[0]:
+                    decoder.decode(block)
+            decoder.decode(b'', final=True)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            return 'latin-1'
+    
+    def _iter_txt(self, file_path: str, data: Optional[bytes] = None) -> Iterator[str]:
+        """Stream TXT files paragraph by paragraph"""
+        try:
+            paragraph = []
+            paragraph_size = 0
+            count = 0
+            
+            with self._open_buffer(file_path, data) as view:
+                encoding = self._detect_txt_encoding(view)
+                reader = io.BufferedReader(_BufferReader(view), TXT_READ_BLOCK_SIZE)
+                with io.TextIOWrapper(reader, encoding=encoding) as file:
+                    # Bounded reads keep memory flat even for files without line breaks
+                    for line in iter(lambda: file.readline(TXT_READ_BLOCK_SIZE), ''):
+                        if line.strip():
+                            paragraph.append(line.rstrip('\r\n'))
+                            paragraph_size += len(line)
+                            if paragraph_size < TXT_READ_BLOCK_SIZE:
+                                continue
+                        if paragraph:
+                            text = '\n'.join(paragraph).strip()
+                            paragraph, paragraph_size = [], 0
+                            if text:
+                                count += 1
+                                yield text
+            
+            if paragraph:
+                text = '\n'.join(paragraph).strip()
+                if text:
+                    count += 1
+                    yield text
+            
+            if count:
+                self.logger.info(f"Successfully read TXT file with {encoding} encoding")
+            else:
+                self.logger.error(f"Could not read TXT file {file_path} with any encoding")
+                
+        except Exception as e:
+            self.logger.error(f"Error reading TXT file {file_path}: {str(e)}")
+    
+    def _process_pdf(self, file_path: str, data: Optional[bytes] = None) -> Optional[str]:
         """Process PDF files with improved error handling"""
+        content = '\n\n'.join(self._iter_pdf(file_path, data)).strip()
+        return content or None
+    
+    def _iter_pdf(self, file_path: str, data: Optional[bytes] = None) -> Iterator[str]:
+        """Stream PDF text page by page"""
+        import PyPDF2
         try:
-            content = []
+            count = 0
             
-            with open(file_path, 'rb') as file:
+            with (io.BytesIO(data) if data is not None else open(file_path, 'rb')) as file:
                 try:
                     pdf_reader = PyPDF2.PdfReader(file)
                     
-                    if len(pdf_reader.pages) == 0:
+                    page_count = len(pdf_reader.pages)
+                    if page_count == 0:
                         self.logger.warning(f"PDF has no pages: {file_path}")
-                        return None
+                        return
+                    
+                    if self._use_parallel_pdf(page_count):
+                        page_results = self._extract_pdf_parallel(file_path, page_count, data)
+                    else:
+                        page_results = (result for page_num in range(page_count)
+                                        for result in _extract_page_texts(pdf_reader, [page_num]))
                     
-                    for page_num in range(len(pdf_reader.pages)):
-                        try:
-                            page = pdf_reader.pages[page_num]
-                            text = page.extract_text()
-                            if text and text.strip():
-                                content.append(text.strip())
-                        except Exception as e:
-                            self.logger.warning(f"Error extracting text from page {page_num}: {str(e)}")
+                    for page_num, text, error in page_results:
+                        if error is not None:
+                            self.logger.warning(f"Error extracting text from page {page_num}: {error}")
                             continue
+                        if text and text.strip():
+                            count += 1
+                            yield text.strip()
                     
-                except PyPDF2.PdfReadError as e:
+                except PyPDF2.errors.PdfReadError as e:
                     self.logger.error(f"PDF read error: {str(e)}")
-                    return None
-                except Exception as e:
-                    self.logger.error(f"Unexpected PDF error: {str(e)}")
-                    return None
+                    return
             
-            if content:
-                combined_content = '\n\n'.join(content).strip()
-                if combined_content:
-                    self.logger.info(f"Successfully extracted text from PDF with {len(content)} pages")
-                    return combined_content
-            
-            self.logger.warning(f"No text content extracted from PDF: {file_path}")
-            return None
+            if count:
+                self.logger.info(f"Successfully extracted text from PDF with {count} pages")
+            else:
+                self.logger.warning(f"No text content extracted from PDF: {file_path}")
                 
         except Exception as e:
             self.logger.error(f"Error processing PDF file {file_path}: {str(e)}")
-            return None
     
-    def _process_docx(self, file_path: str) -> Optional[str]:
+    def _use_parallel_pdf(self, page_count: int) -> bool:
+        return self.pdf_workers > 1 and page_count >= self.pdf_parallel_min_pages
+    
+    def _get_pdf_pool(self) -> ProcessPoolExecutor:
+        # Ingest threads extract concurrently; only one of them may create the pool
+        with self._pdf_pool_lock:
+            if self._pdf_pool is None:
+                # Spawned workers avoid inheriting locks held by the web server's threads
+                self._pdf_pool = ProcessPoolExecutor(
+                    max_workers=self.pdf_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pdf_pool
+    
+    def _discard_pdf_pool(self, pool: ProcessPoolExecutor):
+        """Drop a broken pool (a worker died) so the next large PDF starts a new one"""
+        with self._pdf_pool_lock:
+            if self._pdf_pool is pool:
+                self._pdf_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    def _extract_pdf_parallel(self, file_path: str, page_count: int,
+                              data: Optional[bytes] = None) -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Extract PDF pages on a process pool, each worker opening the file independently
+        
+        An in-memory PDF is written to a temporary file for the workers, which is
+        cheaper than sending its bytes to each of them
+        
+        Yields:
+            (page_num, text, error) for every page, in page order, as each range completes
+        """
+        if data is not None:
+            descriptor, temp_path = tempfile.mkstemp(suffix='.pdf')
+            try:
+                with os.fdopen(descriptor, 'wb') as file:
+                    file.write(data)
+                yield from self._extract_pdf_parallel(temp_path, page_count)
+            finally:
+                os.remove(temp_path)
+            return
+        
+        # Several ranges per worker keeps the pool busy when some pages are slower than others
+        range_count = min(page_count, self.pdf_workers * 2)
+        step = -(-page_count // range_count)
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        
+        pool = self._get_pdf_pool()
+        futures = []
+        broken = False
+        try:
+            futures = [pool.submit(_extract_pdf_page_range, file_path, start, end) for start, end in ranges]
+        except BrokenProcessPool as e:
+            self.logger.warning(f"PDF process pool is broken, extracting serially: {str(e)}")
+            self._discard_pdf_pool(pool)
+            broken = True
+        
+        try:
+            for index, (start, end) in enumerate(ranges):
+                if not broken:
+                    try:
+                        page_results = futures[index].result()
+                    except BrokenProcessPool as e:
+                        # A dead worker breaks the whole pool; the remaining ranges are extracted here
+                        self.logger.warning(f"PDF process pool broke at pages {start}-{end - 1}, "
+                                            f"extracting the rest serially: {str(e)}")
+                        self._discard_pdf_pool(pool)
+                        broken = True
+                    except Exception as e:
+                        # A failed worker only loses its own pages
+                        self.logger.warning(f"Error extracting pages {start}-{end - 1}: {str(e)}")
+                        page_results = [(page_num, None, str(e)) for page_num in range(start, end)]
+                if broken:
+                    page_results = self._extract_pdf_range_serial(file_path, start, end)
+                yield from page_results
+            self.logger.info(f"Extracted {page_count} PDF pages in parallel across {len(ranges)} ranges"
+                             f"{' (the rest serially after the pool broke)' if broken else ''}")
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    def _extract_pdf_range_serial(self, file_path: str, start: int, end: int) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        try:
+            return _extract_pdf_page_range(file_path, start, end)
+        except Exception as e:
+            self.logger.warning(f"Error extracting pages {start}-{end - 1}: {str(e)}")
+            return [(page_num, None, str(e)) for page_num in range(start, end)]
+    
+    def _process_docx(self, file_path: str, data: Optional[bytes] = None) -> Optional[str]:
         """Process DOCX files with comprehensive content extraction"""
+        content = '\n\n'.join(self._iter_docx(file_path, data)).strip()
+        return content or None
+    
+    def _iter_docx(self, file_path: str, data: Optional[bytes] = None) -> Iterator[str]:
+        """Stream DOCX paragraphs, table rows, headers and footers"""
+        import docx
         try:
-            doc = docx.Document(file_path)
-            content = []
+            doc = docx.Document(io.BytesIO(data) if data is not None else file_path)
+            count = 0
             
             # Extract text from paragraphs
             for paragraph in doc.paragraphs:
                 text = paragraph.text.strip()
                 if text:
-                    content.append(text)
+                    count += 1
+                    yield text
             
             # Extract text from tables
             for table in doc.tables:
-                table_content = []
                 for row in table.rows:
                     row_text = []
                     for cell in row.cells:
@@ -131,10 +393,8 @@ class DocumentProcessor:
                         if cell_text:
                             row_text.append(cell_text)
                     if row_text:
-                        table_content.append(' | '.join(row_text))
-                
-                if table_content:
-                    content.extend(table_content)
+                        count += 1
+                        yield ' | '.join(row_text)
             
             # Extract text from headers and footers
             for section in doc.sections:
@@ -142,23 +402,20 @@ class DocumentProcessor:
                     for paragraph in section.header.paragraphs:
                         text = paragraph.text.strip()
                         if text:
-                            content.append(f"[Header: {text}]")
+                            count += 1
+                            yield f"[Header: {text}]"
                 
                 if section.footer:
                     for paragraph in section.footer.paragraphs:
                         text = paragraph.text.strip()
                         if text:
-                            content.append(f"[Footer: {text}]")
+                            count += 1
+                            yield f"[Footer: {text}]"
             
-            if content:
-                combined_content = '\n\n'.join(content).strip()
-                if combined_content:
-                    self.logger.info(f"Successfully extracted text from DOCX with {len(content)} elements")
-                    return combined_content
-            
-            self.logger.warning(f"No text content extracted from DOCX: {file_path}")
-            return None
+            if count:
+                self.logger.info(f"Successfully extracted text from DOCX with {count} elements")
+            else:
+                self.logger.warning(f"No text content extracted from DOCX: {file_path}")
                 
         except Exception as e:
             self.logger.error(f"Error processing DOCX file {file_path}: {str(e)}")
-            return None
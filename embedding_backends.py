@@ -0,0 +1,103 @@
+import os
+from collections import namedtuple
+from typing import List, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+GOOGLE_EMBEDDING_MODEL = 'models/embedding-001'
+
+# embeddings: the Embeddings implementation; model_id: identifies the vector space, so
+# vectors (cached, stored or indexed) are only compared within one model_id;
+# remote: whether calls go over the network and need batching, rate limiting and caching
+EmbeddingBackend = namedtuple('EmbeddingBackend', ['name', 'model_id', 'embeddings', 'remote'])
+
+_HASH_PRIME = np.uint64(1099511628211)
+_HASH_MIX = np.uint64(0xff51afd7ed558ccd)
+_SIGN_BIT = np.uint64(1 << 63)
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """
+    CPU-local embeddings from hashed character n-grams
+    Each text is lowercased and its character n-grams are hashed into a fixed number of
+    signed buckets (the hashing trick), then log-scaled and L2-normalised. A whole batch
+    is hashed in one pass of NumPy array operations. No model files or network access
+    are needed and vectors are identical across processes and restarts.
+    """
+
+    def __init__(self, dimension: int = 768, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dimension = dimension
+        self.ngram_range = ngram_range
+
+    @property
+    def model_id(self) -> str:
+        return f"local-hashed-ngram-v1:{self.dimension}:{self.ngram_range[0]}-{self.ngram_range[1]}"
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts into a (len(texts), dimension) float32 array"""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        # Concatenate every padded text into one code-point array; row -1 marks separators
+        padded = [f" {text.lower()} " for text in texts]
+        codes = np.frombuffer('\x00'.join(padded).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        lengths = np.array([len(text) for text in padded])
+        rows = np.repeat(np.arange(len(texts)), lengths + 1)[:len(codes)]
+        rows[np.cumsum(lengths + 1)[:-1] - 1] = -1
+
+        counts = np.zeros(len(texts) * self.dimension, dtype=np.float64)
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            starts = len(codes) - n + 1
+            if starts <= 0:
+                continue
+            hashes = np.full(starts, n, dtype=np.uint64)
+            for offset in range(n):
+                hashes = hashes * _HASH_PRIME + codes[offset:offset + starts]
+            hashes ^= hashes >> np.uint64(33)
+            hashes *= _HASH_MIX
+            hashes ^= hashes >> np.uint64(33)
+
+            # Keep n-grams that lie within a single text
+            valid = (rows[:starts] == rows[n - 1:n - 1 + starts]) & (rows[:starts] >= 0)
+            hashes = hashes[valid]
+            buckets = rows[:starts][valid] * self.dimension + (hashes % np.uint64(self.dimension)).astype(np.int64)
+            signs = np.where(hashes & _SIGN_BIT, -1.0, 1.0)
+            counts += np.bincount(buckets, weights=signs, minlength=counts.size)
+
+        vectors = counts.reshape(len(texts), self.dimension)
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+def create_embedding_backend(name: str, local_dimension: int = 768) -> EmbeddingBackend:
+    """
+    Build the configured embedding backend
+
+    Args:
+        name: 'google' for Gemini embeddings or 'local' for hashed n-gram embeddings
+        local_dimension: Vector size of the local backend
+
+    Returns:
+        EmbeddingBackend
+    """
+    if name == 'local':
+        embeddings = HashedNgramEmbeddings(dimension=local_dimension)
+        return EmbeddingBackend(name, embeddings.model_id, embeddings, False)
+
+    if name == 'google':
+        if not os.environ.get('GOOGLE_API_KEY'):
+            raise ValueError("GOOGLE_API_KEY environment variable is required for the google embedding backend")
+        # Imported here so the local backend works without the Google client installed
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        embeddings = GoogleGenerativeAIEmbeddings(model=GOOGLE_EMBEDDING_MODEL)
+        return EmbeddingBackend(name, GOOGLE_EMBEDDING_MODEL, embeddings, True)
+
+    raise ValueError(f"Unknown embedding backend: {name}")
@@ -0,0 +1,217 @@
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import List, Dict, Iterable
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of embedding vectors
+    Vectors are stored in a local SQLite file keyed by a hash of (model name, text)
+    and evicted least-recently-used once the cache grows past its size cap. The
+    total size is kept in the database, so worker processes sharing the file
+    enforce the cap together.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)"
+        )
+        # Caches created before the total was stored start from the size of their entries
+        self._conn.execute(
+            "INSERT OR IGNORE INTO cache_size (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM embeddings"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        """Build the cache key for a chunk embedded by a given model"""
+        digest = hashlib.sha256()
+        digest.update(model_name.encode('utf-8'))
+        digest.update(b'\x00')
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """
+        Look up cached vectors
+
+        Args:
+            keys: Cache keys to look up
+
+        Returns:
+            Mapping of key -> vector for every key that was found
+        """
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Store vectors in the cache, evicting old entries if over the size cap"""
+        if not items:
+            return
+
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+
+        with self._lock:
+            # One write transaction, so other worker processes never see a stale total
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._existing_sizes([row[0] for row in rows])
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("UPDATE cache_size SET bytes = bytes + ? WHERE id = 0",
+                                   (sum(row[2] for row in rows) - sum(existing.values()),))
+                self._evict()
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    @property
+    def total_bytes(self) -> int:
+        """Size of all cached vectors, across worker processes"""
+        return self._conn.execute("SELECT bytes FROM cache_size WHERE id = 0").fetchone()[0]
+
+    def _existing_sizes(self, keys: List[str]) -> Dict[str, int]:
+        sizes: Dict[str, int] = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, size FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            sizes.update(rows)
+        return sizes
+
+    def _evict(self):
+        """Drop least-recently-used entries until the cache fits its size cap (inside the write transaction)"""
+        total_bytes = self.total_bytes
+        while total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_access ASC LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self._conn.execute("UPDATE cache_size SET bytes = 0 WHERE id = 0")
+                break
+            freed = 0
+            victims = []
+            for key, size in rows:
+                victims.append((key,))
+                freed += size
+                if total_bytes - freed <= self.max_bytes:
+                    break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+            self._conn.execute("UPDATE cache_size SET bytes = bytes - ? WHERE id = 0", (freed,))
+            total_bytes -= freed
+            self.evictions += len(victims)
+            self.logger.debug(f"Evicted {len(victims)} embeddings from cache ({freed} bytes)")
+
+    def stats(self) -> dict:
+        """Get hit/miss counters and occupancy of the cache"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults an EmbeddingCache before calling the wrapped model
+    Only texts that miss the cache are sent to the embedding API
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.logger = logging.getLogger(__name__)
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.make_key(self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, even if it repeats in the batch
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), embedded))
+            self.cache.put_many(fresh)
+            vectors.update(fresh)
+
+        self.logger.info(f"Embedding cache: {len(texts) - len(missing)} of {len(texts)} chunks reused")
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
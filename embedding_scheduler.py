@@ -0,0 +1,106 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to keep embedding calls under the provider's rate limit; a rate of 0 or less is unlimited"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until the requested number of tokens is available"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an exception raised by an embedding backend is a 429 / quota error"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if status == 429:
+        return True
+    message = str(error).lower()
+    return '429' in message or 'rate limit' in message or 'resource exhausted' in message or 'quota' in message
+
+
+class EmbeddingScheduler(Embeddings):
+    """
+    Embeddings wrapper that splits large chunk lists into batches and embeds them
+    concurrently on a bounded thread pool, with token-bucket rate limiting and
+    exponential backoff on rate-limit errors. Results are returned in input order.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = 64, max_workers: int = 4,
+                 requests_per_second: float = 5.0, burst: int = 5, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.logger = logging.getLogger(__name__)
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='embed')
+        self.retries = 0
+        self._stats_lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+
+        started = time.monotonic()
+        vectors: List[List[float]] = []
+        # executor.map yields results in submission order, so chunk order is preserved
+        for batch_vectors in self.executor.map(self._embed_batch, batches):
+            vectors.extend(batch_vectors)
+
+        self.logger.info(f"Embedded {len(texts)} chunks in {len(batches)} batches "
+                         f"in {time.monotonic() - started:.2f}s")
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._with_retry(lambda: self.embeddings.embed_query(text))
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        return self._with_retry(lambda: self.embeddings.embed_documents(batch))
+
+    def _with_retry(self, call):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                return call()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                delay *= 0.5 + random.random() / 2
+                attempt += 1
+                with self._stats_lock:
+                    self.retries += 1
+                self.logger.warning(f"Embedding rate limited, retry {attempt}/{self.max_retries} "
+                                    f"in {delay:.2f}s: {str(e)}")
+                time.sleep(delay)
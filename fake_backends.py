@@ -0,0 +1,187 @@
+"""
+Deterministic local stand-ins for the remote AI services
+Used to exercise the pipeline without network access or API quota
+"""
+import hashlib
+import math
+import threading
+import time
+from typing import List, Optional, Iterator, Any
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+ANSWER_WORDS = (
+    "the document states that this section covers the policy terms and the related "
+    "schedule for each party according to the agreement and its review process"
+).split()
+
+
+class FakeRateLimitError(Exception):
+    """Raised by fake backends when their simulated rate limit is exceeded"""
+
+    status_code = 429
+
+    def __init__(self, message: str = "429 Resource exhausted: simulated rate limit"):
+        super().__init__(message)
+
+
+class _RateWindow:
+    """Counts calls in one-second windows and rejects those past the limit; callers hold their own lock"""
+
+    def __init__(self, calls_per_second: float = 0.0):
+        self.calls_per_second = calls_per_second
+        self._window_start = time.monotonic()
+        self._window_calls = 0
+
+    def check(self):
+        if not self.calls_per_second:
+            return
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start = now
+            self._window_calls = 0
+        self._window_calls += 1
+        if self._window_calls > self.calls_per_second:
+            raise FakeRateLimitError()
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Local embedding backend producing deterministic vectors from a hash of the text
+    Supports simulated per-call latency and a calls-per-second rate limit
+    """
+
+    def __init__(self, size: int = 768, latency: float = 0.0, calls_per_second: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.calls_per_second = calls_per_second
+        self.calls = 0
+        self.texts_embedded = 0
+        self._rate = _RateWindow(calls_per_second)
+        self._lock = threading.Lock()
+
+    def _check_rate_limit(self):
+        with self._lock:
+            self.calls += 1
+            self._rate.check()
+
+    def _vector(self, text: str) -> List[float]:
+        values = []
+        counter = 0
+        while len(values) < self.size:
+            digest = hashlib.sha256(f"{counter}:{text}".encode('utf-8')).digest()
+            values.extend(byte / 127.5 - 1.0 for byte in digest)
+            counter += 1
+        values = values[:self.size]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._check_rate_limit()
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.texts_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeTranslator:
+    """
+    Local stand-in for deep_translator.GoogleTranslator
+    Returns the text tagged with the target language, line by line, so line structure
+    survives the round trip like it does with the real service. Like the real client it
+    keeps the request text on the instance for the duration of the call, so sharing one
+    instance between threads returns other calls' translations just as it would there
+    """
+
+    def __init__(self, source: str = 'auto', target: str = 'en', latency: float = 0.0,
+                 calls_per_second: float = 0.0):
+        self.source = source
+        self.target = target
+        self.latency = latency
+        self.calls_per_second = calls_per_second
+        self.calls = 0
+        self.chars_translated = 0
+        self._rate = _RateWindow(calls_per_second)
+        self._lock = threading.Lock()
+        self._url_params = {'sl': source, 'tl': target}
+
+    def translate(self, text: str, **kwargs) -> str:
+        with self._lock:
+            self.calls += 1
+            self.chars_translated += len(text)
+            self._rate.check()
+        self._url_params['q'] = text
+        if self.latency:
+            time.sleep(self.latency)
+        # The request is built from the instance state, as GoogleTranslator.translate does
+        text = self._url_params['q']
+        return '\n'.join(f"[{self.target}] {line}" if line.strip() else line for line in text.split('\n'))
+
+    def translate_batch(self, batch: List[str], **kwargs) -> List[str]:
+        return [self.translate(text) for text in batch]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Local stand-in for ChatGroq
+    Answers with output_tokens words chosen from a hash of the prompt, after a
+    simulated time to first token and per-token delay, and supports streaming
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    calls_per_second: float = 0.0
+    output_tokens: int = 64
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _rate: Any = PrivateAttr(default=None)
+    _calls: int = PrivateAttr(default=0)
+    _prompt_chars: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat'
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    @property
+    def prompt_chars(self) -> int:
+        return self._prompt_chars
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = '\n'.join(str(message.content) for message in messages)
+        with self._lock:
+            if self._rate is None:
+                self._rate = _RateWindow(self.calls_per_second)
+            self._calls += 1
+            self._prompt_chars += len(prompt)
+            self._rate.check()
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        words = [ANSWER_WORDS[digest[i % len(digest)] % len(ANSWER_WORDS)] for i in range(self.output_tokens)]
+        return [word + ' ' for word in words[:-1]] + words[-1:]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        tokens = self._tokens(messages)
+        if self.latency or self.token_latency:
+            time.sleep(self.latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=''.join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        tokens = self._tokens(messages)
+        if self.latency:
+            time.sleep(self.latency)
+        for token in tokens:
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
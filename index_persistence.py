@@ -0,0 +1,331 @@
+import os
+import re
+import json
+import time
+import pickle
+import uuid
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from typing import Optional
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from ann_index import is_quantized
+from index_tombstone import TOMBSTONE_FILE, write_tombstone, read_tombstone, remove_tombstone
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; saves are then only serialized within a process
+    fcntl = None
+
+INDEX_FILE = 'index.faiss'
+DOCSTORE_FILE = 'index.pkl'
+META_FILE = 'meta.json'
+RAW_VECTORS_FILE = 'vectors.f32'
+LOCK_FILE = '.lock'
+
+# Maps the stored vectors straight from the file; older faiss builds only offer IO_FLAG_MMAP
+MMAP_FLAG = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP)
+
+_SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+class IndexPersistence:
+    """
+    Saves per-session FAISS indexes under a folder and loads them back on demand
+    Indexes larger than mmap_threshold are loaded memory-mapped so that several
+    worker processes share the same page cache instead of each holding a copy.
+    Each index records the embedding model that built it; loaded vectorstores carry
+    it as `embedding_model` (None for indexes saved before it was recorded), and
+    the fingerprint of its document set as `fingerprint`.
+    Every save writes a new version token, carried by loaded vectorstores as
+    `version`, so workers holding a copy in memory can tell when another worker
+    has saved or deleted the index. A lock file serializes saves across processes.
+    Deleting an index leaves a tombstone with its own version token in the session's
+    folder, so copies and ingests in other workers are dropped instead of saved back.
+    Quantized indexes only hold approximations of their vectors, so the original
+    float32 vectors are kept next to them for rebuilding and recall measurement.
+    """
+
+    def __init__(self, root: str, mmap_threshold: int = 16 * 1024 * 1024, embedding_model: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.root = os.path.join(root, 'sessions')
+        self.mmap_threshold = mmap_threshold
+        self.embedding_model = embedding_model
+        self._held = threading.local()  # session_id -> (lock file, depth) held by the current thread
+        os.makedirs(self.root, exist_ok=True)
+
+    def session_dir(self, session_id: str) -> str:
+        if not _SESSION_ID_PATTERN.match(session_id) or session_id in ('.', '..'):
+            raise ValueError(f"Invalid session id: {session_id}")
+        return os.path.join(self.root, session_id)
+
+    def exists(self, session_id: str) -> bool:
+        directory = self.session_dir(session_id)
+        return (os.path.exists(os.path.join(directory, INDEX_FILE)) and
+                os.path.exists(os.path.join(directory, DOCSTORE_FILE)))
+
+    def version(self, session_id: str) -> Optional[str]:
+        """
+        Version token of a session's saved index ('' if saved before versions were recorded),
+        of its deletion if it was deleted, None if there never was one
+        """
+        directory = self.session_dir(session_id)
+        meta = self._read_meta(directory)
+        if 'version' in meta:
+            return meta['version']
+        tombstone = read_tombstone(directory)
+        if tombstone is not None:
+            return tombstone['version']
+        return '' if self.exists(session_id) else None
+
+    def deleted_since(self, session_id: str, version: Optional[str]) -> bool:
+        """Whether a session's index was deleted after the given version of it was current"""
+        tombstone = read_tombstone(self.session_dir(session_id))
+        return tombstone is not None and tombstone['version'] != version
+
+    @contextmanager
+    def lock(self, session_id: str, shared: bool = False):
+        """
+        Hold a session's index lock across worker processes
+
+        Saves and deletes take it exclusively and loads shared, so a load never mixes
+        the files of two saves. Callers hold it exclusively around load, add and save
+        to make them atomic. The lock is reentrant within a thread.
+        """
+        held = self._held.__dict__
+        if session_id in held:
+            file, depth = held[session_id]
+            held[session_id] = (file, depth + 1)
+            try:
+                yield
+            finally:
+                held[session_id] = (file, depth)
+            return
+
+        file = self._acquire(session_id, shared)
+        held[session_id] = (file, 1)
+        try:
+            yield
+        finally:
+            del held[session_id]
+            if file is not None:
+                file.close()
+
+    def _acquire(self, session_id: str, shared: bool):
+        if fcntl is None:
+            return None
+        directory = self.session_dir(session_id)
+        path = os.path.join(directory, LOCK_FILE)
+        while True:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                file = open(path, 'a')
+            except FileNotFoundError:
+                continue  # the directory was deleted in between
+            fcntl.flock(file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                if os.fstat(file.fileno()).st_ino == os.stat(path).st_ino:
+                    return file
+            except OSError:
+                pass
+            # The index was deleted while this process waited; lock its successor instead
+            file.close()
+
+    def save(self, session_id: str, vectorstore: FAISS):
+        """
+        Write a session's index and docstore to disk
+
+        Files are written to temporary names and renamed into place, the metadata
+        with the new version last, under the session's exclusive lock so that
+        readers in other workers never see a partially written index
+        """
+        directory = self.session_dir(session_id)
+        index_path = os.path.join(directory, INDEX_FILE)
+        docstore_path = os.path.join(directory, DOCSTORE_FILE)
+        meta_path = os.path.join(directory, META_FILE)
+        pid = os.getpid()
+        version = uuid.uuid4().hex
+
+        with self.lock(session_id):
+            faiss.write_index(vectorstore.index, f"{index_path}.{pid}.tmp")
+            with open(f"{docstore_path}.{pid}.tmp", 'wb') as file:
+                pickle.dump((vectorstore.docstore, vectorstore.index_to_docstore_id), file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            with open(f"{meta_path}.{pid}.tmp", 'w', encoding='utf-8') as file:
+                json.dump({'embedding_model': self.embedding_model, 'dimension': vectorstore.index.d,
+                           'version': version, 'fingerprint': getattr(vectorstore, 'fingerprint', None)}, file)
+            self._save_raw_vectors(session_id, directory, vectorstore)
+
+            os.replace(f"{docstore_path}.{pid}.tmp", docstore_path)
+            os.replace(f"{index_path}.{pid}.tmp", index_path)
+            os.replace(f"{meta_path}.{pid}.tmp", meta_path)
+            remove_tombstone(directory)
+        vectorstore.version = version
+        self.logger.info(f"Saved vectorstore for session {session_id} ({vectorstore.index.ntotal} vectors)")
+
+    def _save_raw_vectors(self, session_id: str, directory: str, vectorstore: FAISS):
+        """
+        Keep the full-precision vectors of a quantized index up to date
+
+        A vectorstore whose index was just rebuilt carries all of them as `raw_vectors`;
+        otherwise the chunks added since the last save are appended to the file
+        """
+        path = os.path.join(directory, RAW_VECTORS_FILE)
+        if not is_quantized(vectorstore.index):
+            # Exact indexes reconstruct their own vectors
+            if os.path.exists(path):
+                os.remove(path)
+            return
+
+        raw_vectors = getattr(vectorstore, 'raw_vectors', None)
+        if raw_vectors is not None:
+            np.ascontiguousarray(raw_vectors, dtype=np.float32).tofile(f"{path}.{os.getpid()}.tmp")
+            os.replace(f"{path}.{os.getpid()}.tmp", path)
+            vectorstore.raw_vectors = None
+        elif not os.path.exists(path):
+            return  # quantized before full-precision vectors were kept
+
+        row_bytes = vectorstore.index.d * 4
+        with open(path, 'r+b') as file:
+            # Whole rows only, in case an earlier append was cut short
+            rows = os.fstat(file.fileno()).st_size // row_bytes
+            file.seek(rows * row_bytes)
+            file.truncate()
+            for start, vectors in sorted(getattr(vectorstore, 'unsaved', None) or [], key=lambda change: change[0]):
+                if start > rows:
+                    break
+                if start + len(vectors) > rows:
+                    file.write(np.ascontiguousarray(vectors[rows - start:], dtype=np.float32).tobytes())
+                    rows = start + len(vectors)
+        if rows < vectorstore.index.ntotal:
+            self.logger.warning(f"Full-precision vectors of session {session_id} are incomplete; "
+                                f"dropping them, rebuilds will use the quantized ones")
+            os.remove(path)
+
+    def read_raw_vectors(self, session_id: str, dimension: int, start: int = 0) -> Optional[np.ndarray]:
+        """
+        Full-precision vectors saved alongside a quantized index, from a position on
+
+        Returns:
+            (n, dimension) float32 array in position order, or None if none are kept
+        """
+        path = os.path.join(self.session_dir(session_id), RAW_VECTORS_FILE)
+        row_bytes = dimension * 4
+        with self.lock(session_id, shared=True):
+            try:
+                rows = os.path.getsize(path) // row_bytes - start
+            except FileNotFoundError:
+                return None
+            if rows <= 0:
+                return np.empty((0, dimension), dtype=np.float32)
+            vectors = np.fromfile(path, dtype=np.float32, count=rows * dimension, offset=start * row_bytes)
+        return vectors.reshape(rows, dimension)
+
+    def load(self, session_id: str, embeddings: Embeddings, writable: bool = False) -> Optional[FAISS]:
+        """
+        Load a session's index from disk
+
+        Args:
+            session_id: Session identifier
+            embeddings: Embedding function used for queries against the index
+            writable: Force a private in-memory copy that can be added to
+
+        Returns:
+            FAISS vectorstore or None if the session has no saved index
+        """
+        if not self.exists(session_id):
+            return None
+
+        directory = self.session_dir(session_id)
+        try:
+            with self.lock(session_id, shared=True):
+                if not self.exists(session_id):
+                    return None
+                index, docstore, index_to_docstore_id, meta, mapped = self._read(session_id, directory, writable)
+        except Exception as e:
+            self.logger.error(f"Error loading vectorstore for session {session_id}: {str(e)}")
+            return None
+
+        self.logger.info(f"Loaded vectorstore for session {session_id} "
+                         f"({index.ntotal} vectors, {'mmap' if mapped else 'in-memory'})")
+        vectorstore = FAISS(embeddings, index, docstore, index_to_docstore_id)
+        vectorstore.is_mmap_backed = mapped
+        vectorstore.version = meta.get('version', '')
+        vectorstore.fingerprint = meta.get('fingerprint')
+        vectorstore.embedding_model = meta.get('embedding_model')
+        if vectorstore.embedding_model not in (None, self.embedding_model):
+            self.logger.warning(f"Index of session {session_id} was built with {vectorstore.embedding_model}, "
+                                f"not {self.embedding_model}")
+        return vectorstore
+
+    def _read(self, session_id: str, directory: str, writable: bool):
+        """Index, docstore, id mapping, metadata and whether the index is memory-mapped"""
+        index_path = os.path.join(directory, INDEX_FILE)
+        mapped = not writable and os.path.getsize(index_path) >= self.mmap_threshold
+        index = None
+        if mapped:
+            try:
+                index = faiss.read_index(index_path, MMAP_FLAG)
+            except RuntimeError as e:
+                # Not every index structure can be memory-mapped
+                self.logger.warning(f"Cannot mmap index of session {session_id}, reading it instead: {str(e)}")
+                mapped = False
+        if index is None:
+            index = faiss.read_index(index_path)
+
+        with open(os.path.join(directory, DOCSTORE_FILE), 'rb') as file:
+            docstore, index_to_docstore_id = pickle.load(file)
+        return index, docstore, index_to_docstore_id, self._read_meta(directory), mapped
+
+    def _read_meta(self, directory: str) -> dict:
+        try:
+            with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def delete(self, session_id: str):
+        """
+        Remove a session's saved index, leaving a tombstone in its place
+
+        The tombstone is written even without a saved index, since another worker
+        may be about to save one from an ingest that started before the deletion
+        """
+        directory = self.session_dir(session_id)
+        with self.lock(session_id):
+            # Saves remove the tombstone after writing their metadata, so whichever came last is current
+            write_tombstone(directory)
+            for name in os.listdir(directory):
+                if name in (LOCK_FILE, TOMBSTONE_FILE):
+                    continue
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+        self.logger.info(f"Deleted saved vectorstore for session {session_id}")
+
+    def purge(self, session_id: str, min_age: float = 0) -> bool:
+        """
+        Remove the folder of a deleted index once its tombstone is older than min_age
+
+        Without the tombstone, an ingest that started before the deletion in a session
+        that had no saved index yet would save its chunks, so it is kept for longer
+        than an ingest can last.
+
+        Returns:
+            Whether the folder was removed
+        """
+        directory = self.session_dir(session_id)
+        if read_tombstone(directory) is None:
+            return False
+        with self.lock(session_id):
+            tombstone = read_tombstone(directory)
+            if tombstone is None or time.time() - tombstone['time'] < min_age or self.exists(session_id):
+                return False
+            shutil.rmtree(directory, ignore_errors=True)
+        self.logger.info(f"Purged tombstone of session {session_id}")
+        return True
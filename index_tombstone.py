@@ -0,0 +1,42 @@
+import os
+import json
+import time
+import uuid
+from typing import Optional
+
+TOMBSTONE_FILE = 'deleted.json'
+
+
+def write_tombstone(directory: str) -> str:
+    """
+    Mark a session's index folder as deleted
+
+    The marker carries a new version token, so every worker still holding a copy of
+    the index, or an ingest that started before the deletion, sees that it is gone.
+
+    Returns:
+        Version token of the deletion
+    """
+    version = uuid.uuid4().hex
+    path = os.path.join(directory, TOMBSTONE_FILE)
+    os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.{os.getpid()}.tmp", 'w', encoding='utf-8') as file:
+        json.dump({'version': version, 'time': time.time()}, file)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+    return version
+
+
+def read_tombstone(directory: str) -> Optional[dict]:
+    """Version and time of a session's index deletion, None if the index was not deleted"""
+    try:
+        with open(os.path.join(directory, TOMBSTONE_FILE), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def remove_tombstone(directory: str):
+    try:
+        os.remove(os.path.join(directory, TOMBSTONE_FILE))
+    except FileNotFoundError:
+        pass
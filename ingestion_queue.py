@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+# Coarse progress reached at each per-file stage
+STAGE_PROGRESS = {'queued': 0.0, 'saved': 0.05, 'extracted': 0.4, 'chunked': 0.5, 'embedded': 1.0}
+
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Chunks per batch when attaching a previously ingested file to a session
+REUSE_BATCH_SIZE = 256
+
+
+def describe_processing_error(error: Exception) -> str:
+    """Turn an ingestion exception into a user-facing message"""
+    error_msg = str(error)
+    # Provide more specific error messages
+    if "corrupted" in error_msg.lower() or "invalid" in error_msg.lower():
+        error_msg = "File appears to be corrupted or in an unsupported format"
+    elif "permission" in error_msg.lower():
+        error_msg = "Permission denied accessing the file"
+    elif "memory" in error_msg.lower():
+        error_msg = "File too large to process in memory"
+    return error_msg
+
+
+class IngestionQueue:
+    """
+    Background ingestion of uploaded files
+    Each upload becomes a job whose files are extracted, chunked and embedded on a
+    bounded worker pool. Job status is written to disk so any worker process can
+    answer status polls, and a session can query each document as soon as it finishes.
+    With a content registry, files whose content was ingested before are attached
+    from the stored chunks and vectors without being extracted or embedded again.
+    """
+
+    def __init__(self, document_processor, rag_system, jobs_dir: str, max_workers: int = 4,
+                 retention: float = 3600, content_registry=None):
+        self.logger = logging.getLogger(__name__)
+        self.document_processor = document_processor
+        self.rag_system = rag_system
+        self.content_registry = content_registry
+        self.jobs_dir = jobs_dir
+        self.retention = retention
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='ingest')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def submit(self, session_id: str, files: List[dict]) -> dict:
+        """
+        Queue uploaded files for ingestion
+
+        Args:
+            session_id: Session identifier
+            files: One dict per uploaded file with 'filename' and 'size', plus 'upload'
+                   (a SpooledUpload) for accepted files or 'status'/'message' for files
+                   rejected up front
+
+        Returns:
+            Initial job status
+        """
+        self._cleanup()
+
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'session_id': session_id,
+            'created': time.time(),
+            'done': False,
+            'files': [],
+            'success_count': 0,
+            'total_count': len(files),
+            # Held from snapshot to rename, so an older status never replaces a newer one
+            'save_lock': threading.Lock()
+        }
+        pending = []
+        for file_info in files:
+            record = {
+                'filename': file_info['filename'],
+                'size': file_info.get('size'),
+                'status': file_info.get('status', 'queued'),
+                'stage': 'saved' if 'upload' in file_info else None,
+                'progress': STAGE_PROGRESS['saved'] if 'upload' in file_info else 1.0,
+                'segments': 0,
+                'words': 0,
+                'chunks': 0,
+                'chunks_embedded': 0,
+                'message': file_info.get('message', 'Queued for processing')
+            }
+            job['files'].append(record)
+            if 'upload' in file_info:
+                pending.append((record, file_info['upload']))
+
+        job['remaining'] = len(pending)
+        job['done'] = not pending
+        with self._lock:
+            self._jobs[job['job_id']] = job
+        self._save(job)
+
+        for record, upload in pending:
+            self.executor.submit(self._process_file, job, record, upload)
+
+        self.logger.info(f"Queued ingestion job {job['job_id']} with {len(pending)} files for session {session_id}")
+        return self.get_job(job['job_id'])
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """Get a job's status, from memory or from another worker's status file"""
+        if not _JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._snapshot(job)
+        try:
+            with open(os.path.join(self.jobs_dir, f"{job_id}.json"), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _process_file(self, job: dict, record: dict, upload):
+        session_id = job['session_id']
+        filename = record['filename']
+        self._update(job, record, status='processing', message='Processing')
+
+        def segments():
+            # Small uploads are read from memory, larger ones from their single copy on disk
+            for segment in self.document_processor.iter_document(upload.path or upload.filename, data=upload.data):
+                with self._lock:
+                    record['segments'] += 1
+                    record['words'] += len(segment.split())
+                yield segment
+            self._update(job, record, stage='extracted')
+
+        def progress(created: int, embedded: int, chunking_done: bool):
+            with self._lock:
+                record['chunks'] = created
+                record['chunks_embedded'] = embedded
+                if chunking_done and record['stage'] != 'embedded':
+                    record['stage'] = 'chunked'
+                if record['stage'] == 'chunked' and created:
+                    record['progress'] = STAGE_PROGRESS['chunked'] + (1 - STAGE_PROGRESS['chunked']) * embedded / created
+            self._save(job)
+
+        writer = None
+        try:
+            content_hash = None
+            if self.content_registry is not None:
+                # Hashed while the upload was spooled
+                content_hash = upload.sha256
+                if self._attach_existing(job, record, upload, content_hash, progress):
+                    return
+                writer = self.content_registry.writer(content_hash)
+
+            chunk_count = self.rag_system.add_document_stream(
+                session_id, segments(), filename, progress=progress,
+                on_embedded=writer.add if writer is not None else None
+            )
+
+            if chunk_count:
+                if writer is not None:
+                    writer.commit(record['words'], record['size'] or 0)
+                    writer = None
+                    self.content_registry.add_ref(content_hash, session_id)
+                self._update(job, record, status='processed', stage='embedded',
+                             message=f"Successfully processed - {record['words']} words extracted")
+                with self._lock:
+                    job['success_count'] += 1
+                self.logger.info(f"Successfully processed: {filename} - {chunk_count} chunks")
+            else:
+                self._update(job, record, status='error', progress=1.0,
+                             message='Could not extract text content. File may be corrupted, password-protected, or unsupported format.')
+                upload.discard()
+
+        except Exception as e:
+            self.logger.error(f"Error processing file {filename}: {str(e)}")
+            self._update(job, record, status='error', progress=1.0,
+                         message=f'Processing error: {describe_processing_error(e)}')
+            upload.discard()
+
+        finally:
+            if writer is not None:
+                writer.abort()
+            upload.release()
+            with self._lock:
+                job['remaining'] -= 1
+                job['done'] = job['remaining'] == 0
+            self._save(job)
+
+    def _attach_existing(self, job: dict, record: dict, upload, content_hash: str, progress) -> bool:
+        """Attach a previously ingested copy of this file to the session, if there is one"""
+        session_id = job['session_id']
+        # Referenced before reading, so releasing another session cannot delete it mid-attach
+        artifact = self.content_registry.acquire(content_hash, session_id)
+        if artifact is None:
+            return False
+
+        try:
+            batches = self.content_registry.iter_batches(content_hash, REUSE_BATCH_SIZE)
+            chunk_count = self.rag_system.add_embedded_document(session_id, batches, record['filename'], progress=progress)
+        except Exception:
+            # Only a reference this attach added; an earlier upload of the same file keeps its own
+            if artifact['new_ref']:
+                self.content_registry.release(content_hash, session_id)
+            raise
+
+        # The stored chunks replace the upload, so the duplicate copy is not kept
+        upload.discard()
+
+        with self._lock:
+            record['words'] = artifact['words']
+            job['success_count'] += 1
+        self._update(job, record, status='processed', stage='embedded',
+                     message=f"Successfully processed - {artifact['words']} words extracted (reused earlier upload)")
+        self.logger.info(f"Reused ingested content for {record['filename']} - {chunk_count} chunks")
+        return True
+
+    def _update(self, job: dict, record: dict, **changes):
+        with self._lock:
+            record.update(changes)
+            if 'stage' in changes and 'progress' not in changes:
+                record['progress'] = max(record['progress'], STAGE_PROGRESS[changes['stage']])
+        self._save(job)
+
+    def _snapshot(self, job: dict) -> dict:
+        snapshot = {key: value for key, value in job.items() if key not in ('remaining', 'save_lock')}
+        snapshot['files'] = [dict(record) for record in job['files']]
+        return snapshot
+
+    def _save(self, job: dict):
+        """Write the job status atomically so other worker processes can serve polls"""
+        path = os.path.join(self.jobs_dir, f"{job['job_id']}.json")
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with job['save_lock']:
+            with self._lock:
+                snapshot = self._snapshot(job)
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as file:
+                    json.dump(snapshot, file)
+                os.replace(temp_path, path)
+            except OSError as e:
+                self.logger.warning(f"Could not write status of job {job['job_id']}: {str(e)}")
+
+    def _cleanup(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job['done'] and job['created'] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        for job_id in expired:
+            try:
+                os.remove(os.path.join(self.jobs_dir, f"{job_id}.json"))
+            except OSError:
+                pass
@@ -0,0 +1,49 @@
+import time
+import logging
+import threading
+from typing import Callable, Any
+
+
+class LazyService:
+    """
+    Stand-in for a service that is only constructed on first use
+    Attribute reads and writes are forwarded to the service, so module-level code
+    can refer to it as if it had been built at import time. Construction runs
+    once, under a lock; concurrent first users wait for the same instance.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_build_seconds', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+        object.__setattr__(self, 'logger', logging.getLogger(__name__))
+
+    @property
+    def ready(self) -> bool:
+        return self._instance is not None
+
+    @property
+    def build_seconds(self):
+        return self._build_seconds
+
+    def get(self):
+        """Get the service, building it on the first call"""
+        instance = self._instance
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._instance is None:
+                started = time.monotonic()
+                instance = self._factory()
+                object.__setattr__(self, '_build_seconds', time.monotonic() - started)
+                object.__setattr__(self, '_instance', instance)
+                self.logger.info(f"Initialized {self._name} in {self._build_seconds:.2f}s")
+            return self._instance
+
+    def __getattr__(self, attribute: str):
+        return getattr(self.get(), attribute)
+
+    def __setattr__(self, attribute: str, value):
+        setattr(self.get(), attribute, value)
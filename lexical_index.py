@@ -0,0 +1,108 @@
+import re
+import math
+import heapq
+import threading
+from typing import List, Tuple, Dict, Iterable
+
+# Words, plus identifiers such as INV-2024-001 or v1.2.3 kept whole as an extra term
+TOKEN_PATTERN = re.compile(r'\w+(?:[-./:]\w+)*')
+WORD_PATTERN = re.compile(r'\w+')
+COMPOUND_SEPARATORS = re.compile(r'[-./:]')
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its of on or "
+    "that the their this to was were what when where which who why will with you your".split()
+)
+
+# Rough per-posting and per-term overhead of the Python structures
+POSTING_BYTES = 100
+TERM_BYTES = 120
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word terms; compound identifiers also yield their parts"""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        terms.append(token)
+        if COMPOUND_SEPARATORS.search(token):
+            terms.extend(WORD_PATTERN.findall(token))
+    return terms
+
+
+def query_terms(text: str) -> List[str]:
+    """Distinct terms of a query, without stopwords"""
+    return [term for term in dict.fromkeys(tokenize(text)) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over a session's chunks
+    Documents are identified by their docstore ids and can only be added, matching
+    how session indexes grow.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}  # term -> {document number: term frequency}
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        self.posting_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, doc_ids: Iterable[str], texts: Iterable[str]):
+        with self._lock:
+            for doc_id, text in zip(doc_ids, texts):
+                number = len(self.doc_ids)
+                terms = tokenize(text)
+                self.doc_ids.append(doc_id)
+                self.doc_lengths.append(len(terms))
+                self.total_length += len(terms)
+
+                frequencies: Dict[str, int] = {}
+                for term in terms:
+                    frequencies[term] = frequencies.get(term, 0) + 1
+                for term, frequency in frequencies.items():
+                    self.postings.setdefault(term, {})[number] = frequency
+                self.posting_count += len(frequencies)
+
+    def search(self, query: str, k: int) -> Tuple[List[Tuple[str, float]], float]:
+        """
+        Rank documents for a query
+
+        Returns:
+            ([(doc_id, score)] best first, fraction of the query terms that the best
+            document contains)
+        """
+        terms = query_terms(query)
+        with self._lock:
+            if not terms or not self.doc_ids:
+                return [], 0.0
+
+            count = len(self.doc_ids)
+            average_length = self.total_length / count or 1.0
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for number, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[number] / average_length)
+                    scores[number] = scores.get(number, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            coverage = 0.0
+            if best:
+                # Terms absent from the corpus count as missing: the question may be a paraphrase
+                top = best[0][0]
+                coverage = sum(1 for term in terms if top in self.postings.get(term, ())) / len(terms)
+            return [(self.doc_ids[number], score) for number, score in best], coverage
+
+    def estimated_bytes(self) -> int:
+        return self.posting_count * POSTING_BYTES + len(self.postings) * TERM_BYTES + len(self.doc_ids) * 80
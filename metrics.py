@@ -0,0 +1,191 @@
+import time
+import logging
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+PREFIX = 'insightgenie_'
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (name, type, help, [(labels, value)]) produced by collectors at scrape time
+Sample = Tuple[str, str, str, List[Tuple[dict, float]]]
+
+# Stages recorded for the current request when it opted into profiling
+_profile: contextvars.ContextVar = contextvars.ContextVar('profile', default=None)
+
+
+def _label_key(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ''
+    escaped = (key + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and histograms rendered in the Prometheus text format
+    Code paths wrap their stages in span(component, stage); durations feed the
+    stage_seconds histogram and, when the current request asked for profiling,
+    its per-request breakdown. Each worker process keeps its own registry.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[str, dict] = {}
+        self._gauges: Dict[str, dict] = {}
+        self._histograms: Dict[str, dict] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram['buckets'][index] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """Add a callable polled at scrape time for values owned elsewhere (cache and index sizes)"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+
+        def header(name: str, metric_type: str, help_text: Optional[str] = None):
+            help_text = help_text or self._help.get(name)
+            if help_text:
+                lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {metric_type}")
+
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+            histograms = {name: {key: {'buckets': list(value['buckets']), 'count': value['count'],
+                                       'sum': value['sum']} for key, value in series.items()}
+                          for name, series in self._histograms.items()}
+
+        for name, series in sorted(counters.items()):
+            header(name, 'counter')
+            for key, value in sorted(series.items()):
+                lines.append(f"{PREFIX}{name}{_format_labels(key)} {value}")
+        for name, series in sorted(gauges.items()):
+            header(name, 'gauge')
+            for key, value in sorted(series.items()):
+                lines.append(f"{PREFIX}{name}{_format_labels(key)} {value}")
+        for name, series in sorted(histograms.items()):
+            header(name, 'histogram')
+            for key, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram['buckets']):
+                    cumulative += count
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(key + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {histogram['sum']}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {histogram['count']}")
+
+        # Several collectors may report series of the same metric, which must share one header
+        collected = {}
+        for collector in self._collectors:
+            try:
+                samples_by_metric = list(collector())
+            except Exception as e:
+                self.logger.error(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, metric_type, help_text, samples in samples_by_metric:
+                collected.setdefault(name, (metric_type, help_text, []))[2].extend(samples)
+        for name, (metric_type, help_text, samples) in collected.items():
+            header(name, metric_type, help_text)
+            for labels, value in samples:
+                lines.append(f"{PREFIX}{name}{_format_labels(_label_key(labels))} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe('stage_seconds', 'Time spent in each processing stage')
+
+
+def inc(name: str, value: float = 1, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+
+def record_stage(component: str, stage: str, seconds: float):
+    REGISTRY.observe('stage_seconds', seconds, component=component, stage=stage)
+    profile = _profile.get()
+    if profile is not None:
+        profile.append((f"{component}.{stage}", seconds))
+
+
+@contextmanager
+def span(component: str, stage: str):
+    """Time a block as one stage of a component"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(component, stage, time.perf_counter() - started)
+
+
+def timed_iter(iterator: Iterable, component: str, stage: str) -> Iterator:
+    """Yield from an iterator, recording only the time spent producing its items as one stage"""
+    iterator = iter(iterator)
+    elapsed = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - started
+                return
+            elapsed += time.perf_counter() - started
+            yield item
+    finally:
+        record_stage(component, stage, elapsed)
+
+
+def start_profile() -> contextvars.Token:
+    """Collect the stages of the current request; returns a token for stop_profile"""
+    return _profile.set([])
+
+
+def current_profile() -> Optional[List[Tuple[str, float]]]:
+    return _profile.get()
+
+
+def stop_profile(token: contextvars.Token):
+    _profile.reset(token)
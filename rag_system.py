@@ -1,21 +1,193 @@
 import os
+import time
+import hashlib
 import logging
-from typing import List, Dict, Optional
-from langchain_groq import ChatGroq
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import threading
+import queue
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from typing import List, Optional, Iterator, Tuple, Iterable, Callable
 from langchain_community.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.documents import Document
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from embedding_scheduler import EmbeddingScheduler
+from index_persistence import IndexPersistence
+from session_store import SessionStore, is_dirty
+from summarizer import MapReduceSummarizer, CHARS_PER_TOKEN
+from answer_cache import AnswerCache
+from lexical_index import BM25Index, query_terms
+from embedding_backends import create_embedding_backend, GOOGLE_EMBEDDING_MODEL
+from ann_index import is_flat, is_quantized, read_vectors, configure_search, rebuild_with_recall
+from shared_corpora import CorpusRegistry, corpus_key, corpus_name, is_corpus_key
+from rw_lock import ReadWriteLock
+import metrics
 from dotenv import load_dotenv 
 load_dotenv()
+
+# 'google' (Gemini, over the network) or 'local' (hashed n-grams computed on the CPU)
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'google')
+LOCAL_EMBEDDING_DIMENSION = int(os.environ.get('LOCAL_EMBEDDING_DIMENSION', 768))
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get('EMBEDDING_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 64))
+EMBEDDING_MAX_WORKERS = int(os.environ.get('EMBEDDING_MAX_WORKERS', 4))
+EMBEDDING_REQUESTS_PER_SECOND = float(os.environ.get('EMBEDDING_REQUESTS_PER_SECOND', 5))
+VECTOR_STORE_MMAP_THRESHOLD = int(os.environ.get('VECTOR_STORE_MMAP_THRESHOLD', 16 * 1024 * 1024))
+SESSION_MEMORY_BUDGET = int(os.environ.get('SESSION_MEMORY_BUDGET', 1024 * 1024 * 1024))
+SESSION_IDLE_TTL = float(os.environ.get('SESSION_IDLE_TTL', 3600))
+# Sessions with at least this many chunks get their flat index rebuilt in the background
+# into an approximate one ('ivf' or 'hnsw', quantization 'none', 'sq8' or 'pq'); 0 disables
+ANN_MIN_VECTORS = int(os.environ.get('ANN_MIN_VECTORS', 20000))
+ANN_INDEX_TYPE = os.environ.get('ANN_INDEX_TYPE', 'ivf')
+ANN_QUANTIZATION = os.environ.get('ANN_QUANTIZATION', 'none')
+ANN_HNSW_M = int(os.environ.get('ANN_HNSW_M', 32))
+ANN_NPROBE = int(os.environ.get('ANN_NPROBE', 16))
+ANN_EF_SEARCH = int(os.environ.get('ANN_EF_SEARCH', 64))
+# An approximate index is rebuilt again once the session has grown by this factor
+ANN_REBUILD_GROWTH = 4
+ANN_RECALL_K = 10
+ANN_RECALL_SAMPLE = 200
+CHUNK_SIZE = 1500
+CHUNK_OVERLAP = 300
+# Segments are buffered up to this many chunk sizes before being split
+INGEST_SPLIT_FACTOR = 8
+# Chunk batches allowed to wait for embedding during streaming ingestion
+INGEST_QUEUE_BATCHES = 2
+SUMMARY_WINDOW_TOKENS = int(os.environ.get('SUMMARY_WINDOW_TOKENS', 3000))
+SUMMARY_MAX_WORKERS = int(os.environ.get('SUMMARY_MAX_WORKERS', 4))
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', 1024))
+ANSWER_CACHE_TTL = float(os.environ.get('ANSWER_CACHE_TTL', 3600))
+# Cosine similarity above which a differently worded question reuses a cached answer; 0 disables
+ANSWER_CACHE_SIMILARITY = float(os.environ.get('ANSWER_CACHE_SIMILARITY', 0))
+# 'hybrid' fuses BM25 and vector rankings, 'vector' or 'lexical' use one of them alone
+RETRIEVAL_MODE = os.environ.get('RETRIEVAL_MODE', 'hybrid')
+RETRIEVAL_K = 4
+# Candidates taken from each ranking before fusion
+RETRIEVAL_CANDIDATES = 20
+RRF_K = 60
+# Hybrid retrieval skips the question embedding when the best BM25 hit contains every
+# query term, scores at least LEXICAL_FAST_PATH_MIN_SCORE per term and outscores the
+# runner-up (if any) by this factor; 0 disables the fast path
+LEXICAL_FAST_PATH_MARGIN = float(os.environ.get('LEXICAL_FAST_PATH_MARGIN', 1.5))
+LEXICAL_FAST_PATH_MIN_SCORE = float(os.environ.get('LEXICAL_FAST_PATH_MIN_SCORE', 1.0))
+
+SUMMARY_PROMPT = PromptTemplate.from_template(
+    """You are a professional summarizer. Please provide a comprehensive summary of the following text. 
+
+    **Formatting guidelines:**
+    - Structure your summary with clear paragraphs
+    - Use bullet points (•) for key highlights  
+    - Use **bold text** for important concepts
+    - Use proper line breaks between topics
+    - Keep the summary well-organized and easy to read
+
+    Focus on the main points, key findings, and important details:
+
+    Text: {text}
+
+    Summary:"""
+)
+
+INSTRUCTION_SUMMARY_PROMPT = PromptTemplate.from_template(
+    """You are a professional summarizer. {instruction}
+
+    Text: {text}
+
+    Summary:"""
+)
+
+ANSWER_PROMPT = PromptTemplate(
+    input_variables=["context", "question"],
+    template="""You are a helpful assistant. Use the context provided below to answer the question accurately and comprehensively. 
+
+    **Important formatting guidelines:**
+    - Structure your response with clear paragraphs
+    - Use bullet points (•) for lists when appropriate
+    - Use numbered lists (1., 2., 3.) for sequential information
+    - Use **bold text** for important terms or concepts
+    - Use proper line breaks between different topics
+    - Keep paragraphs concise and well-organized
+    
+    If the answer cannot be found in the context, say "I don't have enough information in the provided documents to answer this question."
+
+    Context:
+    {context}
+
+    Question:
+    {question}
+
+    Answer:"""
+)
+
+GENERATION_ERROR_MESSAGE = '''Sorry for the inconvenience. We are currently experiencing high demand on our AI services. 
+            Please try again in a few moments. If the issue persists, our rate limits may have been exceeded.'''
+
+
+class GenerationError(Exception):
+    """A streamed LLM response failed; the message is meant for the user"""
+
+
+class SessionClearedError(Exception):
+    """The session was cleared while a document was being added to it"""
+
+
+class _SessionLock(ReadWriteLock):
+    """Queries read a session's index under the read lock; adds, saves and index swaps take the write lock"""
+    
+    def __init__(self):
+        super().__init__()
+        # Set by clear_session; writers that took the lock before then stop instead of recreating the index
+        self.cleared = False
+
+
+def _place_chunks(text: str, chunks: List[str], previous_end: Optional[int]) -> List[Tuple[int, dict]]:
+    """
+    Locate split chunks in the text they were split from, as LangChain's add_start_index does
+    
+    Args:
+        text: The text that was split
+        chunks: Its chunks, in order
+        previous_end: End of the chunk before the first one, relative to the text, or None
+                      at the start of a document
+        
+    Returns:
+        (start, placement) per chunk; the placement holds the number of leading characters
+        repeated from the chunk before ('overlap') and any text the splitter stripped
+        between the two ('gap')
+    """
+    placed = []
+    for chunk in chunks:
+        start = text.find(chunk, max(0, previous_end - CHUNK_OVERLAP) if previous_end is not None else 0)
+        if start < 0:
+            start = max(text.find(chunk), 0)
+        placement = {'overlap': 0}
+        if previous_end is not None:
+            if start < previous_end:
+                placement['overlap'] = min(previous_end - start, len(chunk))
+            elif start > previous_end:
+                placement['gap'] = text[previous_end:start]
+        placed.append((start, placement))
+        previous_end = start + len(chunk)
+    return placed
+
+
+def _chunk_overlap(previous: str, current: str) -> int:
+    """Length of the prefix of a chunk repeated from the end of the chunk before it (chunks without a recorded overlap)"""
+    for length in range(min(len(previous), len(current), CHUNK_OVERLAP), 0, -1):
+        if previous.endswith(current[:length]):
+            return length
+    return 0
+
 class RAGSystem:
     """
     RAG (Retrieval-Augmented Generation) system for question answering
-    Uses Groq for LLM and Google Gemini for embeddings
+    Uses Groq for LLM and Google Gemini or local hashed n-gram embeddings
     """
     
-    def __init__(self):
+    def __init__(self, storage_dir: str = 'vector_store'):
         self.logger = logging.getLogger(__name__)
         
         # Initialize Groq client for LLM
@@ -23,26 +195,78 @@ class RAGSystem:
         if not groq_api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
         
-        # Initialize Google Gemini embeddings
-        gemini_api_key = os.environ['GOOGLE_API_KEY']
-        if not gemini_api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is required")
-        
-        # Set environment variable for Google API key
-        os.environ["GOOGLE_API_KEY"] = gemini_api_key
-        
         try:
+            # Imported here: the Groq client is the slowest import of the module
+            from langchain_groq import ChatGroq
             self.llm = ChatGroq(model='llama3-70b-8192', api_key=groq_api_key)
-            self.embedding_model = GoogleGenerativeAIEmbeddings(model='models/embedding-001')
-            self.logger.info("Successfully initialized RAG system with Groq and Google Gemini")
+            self.embedding_backend = create_embedding_backend(EMBEDDING_BACKEND, LOCAL_EMBEDDING_DIMENSION)
+            self.embedding_model = self.embedding_backend.embeddings
+            self.logger.info(f"Successfully initialized RAG system with Groq and {self.embedding_backend.model_id} embeddings")
         except Exception as e:
             self.logger.error(f"Error initializing RAG system: {str(e)}")
             raise
         
-        self.document_store: Dict[str, FAISS] = {}  # session_id -> FAISS vectorstore
+        # Chunks are embedded through a persistent cache so repeated uploads skip the API
+        self.embedding_cache = EmbeddingCache(
+            os.path.join(storage_dir, 'embedding_cache.sqlite3'),
+            max_bytes=EMBEDDING_CACHE_MAX_BYTES
+        )
+        
+        if self.embedding_backend.remote:
+            # Cache misses are embedded in concurrent, rate-limited batches
+            self.embedding_scheduler = EmbeddingScheduler(
+                self.embedding_model,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                max_workers=EMBEDDING_MAX_WORKERS,
+                requests_per_second=EMBEDDING_REQUESTS_PER_SECOND,
+                burst=EMBEDDING_MAX_WORKERS
+            )
+            self.embeddings = CachedEmbeddings(self.embedding_scheduler, self.embedding_cache,
+                                               self.embedding_backend.model_id)
+        else:
+            # Local vectors are cheaper to recompute than to look up
+            self.embedding_scheduler = None
+            self.embeddings = self.embedding_model
+        
+        # Session indexes are saved on every change and loaded lazily on first access
+        self.persistence = IndexPersistence(storage_dir, mmap_threshold=VECTOR_STORE_MMAP_THRESHOLD,
+                                            embedding_model=self.embedding_backend.model_id)
+        self.corpora = CorpusRegistry(storage_dir)
+        # session_id -> FAISS vectorstore, bounded by memory budget and idle TTL
+        # Shared corpora are indexed once under a reserved key and stay resident
+        self.document_store = SessionStore(
+            max_bytes=SESSION_MEMORY_BUDGET,
+            idle_ttl=SESSION_IDLE_TTL,
+            resident=self._is_resident
+        )
+        # Long texts are summarized hierarchically instead of being cut off
+        self.summarizer = MapReduceSummarizer(
+            self.llm,
+            window_tokens=SUMMARY_WINDOW_TOKENS,
+            max_workers=SUMMARY_MAX_WORKERS
+        )
+        # Answers are cached per document set and invalidated when a session's documents change
+        self.answer_cache = AnswerCache(
+            max_entries=ANSWER_CACHE_SIZE,
+            ttl=ANSWER_CACHE_TTL,
+            similarity_threshold=ANSWER_CACHE_SIMILARITY or None
+        )
+        
+        # Time-to-first-token of streamed responses, per endpoint
+        self.ttft_stats = {}
+        # Retrieval latency per path taken (lexical fast path, hybrid, vector, lexical)
+        self.retrieval_stats = {}
+        self._stats_lock = threading.Lock()
+        # session_id -> _SessionLock, kept while anything holds on to it
+        self._session_locks = weakref.WeakValueDictionary()
+        
+        # Large sessions are moved to approximate indexes one at a time, off the request path
+        self.index_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ann-build')
+        self.ann_reports = {}  # session_id -> last rebuild report, including recall@k
+        self._ann_pending = set()
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1500,
-            chunk_overlap=300,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
             length_function=len,
             separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""]
         )
@@ -56,37 +280,397 @@ class RAGSystem:
             content: Document text content
             filename: Original filename
         """
+        if not content or not content.strip():
+            self.logger.warning(f"Empty content for document: {filename}")
+            return
+        
+        self.add_document_stream(session_id, [content], filename)
+    
+    def add_document_stream(self, session_id: str, segments: Iterable[str], filename: str,
+                            progress: Optional[Callable[[int, int, bool], None]] = None,
+                            on_embedded: Optional[Callable[[List[str], List[List[float]], List[dict]], None]] = None) -> int:
+        """
+        Add a document to a session from a stream of text segments (pages or paragraphs)
+        
+        Segments are chunked incrementally with overlap carried across segment
+        boundaries, and chunk batches are embedded on a background thread while
+        the caller keeps extracting, so the whole document is never held in memory
+        
+        Args:
+            session_id: Session identifier
+            segments: Text segments in document order
+            filename: Original filename
+            progress: Optional callback(chunks_created, chunks_embedded, chunking_done)
+            on_embedded: Optional callback(chunks, vectors, placements) called for each batch, in order
+            
+        Returns:
+            Number of chunks added
+        """
+        batches = ((chunks, None, placements) for chunks, placements in self._iter_chunk_batches(segments))
+        return self._ingest(session_id, batches, filename, progress, on_embedded)
+    
+    def add_embedded_document(self, session_id: str, batches: Iterable[Tuple[List[str], List[List[float]], List[dict]]],
+                              filename: str, progress: Optional[Callable[[int, int, bool], None]] = None) -> int:
+        """
+        Add a document whose chunks were already embedded (e.g. a deduplicated re-upload)
+        
+        Args:
+            session_id: Session identifier
+            batches: (chunks, vectors, placements) batches in document order; placements are
+                     the chunks' overlap metadata, empty dicts where it was not recorded
+            filename: Original filename
+            progress: Optional callback(chunks_created, chunks_embedded, chunking_done)
+            
+        Returns:
+            Number of chunks added
+        """
+        return self._ingest(session_id, batches, filename, progress)
+    
+    def _ingest(self, session_id: str, chunk_batches: Iterable[Tuple[List[str], Optional[List[List[float]]], List[dict]]],
+                filename: str, progress=None, on_embedded=None) -> int:
+        """Feed chunk batches through a background embedding worker into the session's index"""
         try:
-            if not content or not content.strip():
-                self.logger.warning(f"Empty content for document: {filename}")
-                return
+            # Bounded queue: extraction blocks instead of buffering when embedding falls behind
+            batches = queue.Queue(maxsize=INGEST_QUEUE_BATCHES)
+            # Taken once, so a clear_session during the ingest is seen instead of starting a new index;
+            # the saved version tells a deletion by another worker apart from one before the ingest
+            state = {'error': None, 'created': 0, 'embedded': 0, 'lock': self._session_lock(session_id),
+                     'version': self.persistence.version(session_id),
+                     'chunking_done': False, 'progress': progress, 'on_embedded': on_embedded}
+            worker = threading.Thread(target=self._embed_batches, args=(session_id, batches, state),
+                                      name=f"ingest-{session_id}", daemon=True)
+            worker.start()
             
-            # Split content into chunks for better retrieval
-            chunks = self.text_splitter.split_text(content)
+            chunk_count = 0
+            # Tells apart uploads with the same filename, in upload order
+            document_id = time.time_ns()
+            try:
+                for chunks, vectors, placements in chunk_batches:
+                    if state['error'] is not None:
+                        break
+                    # Add metadata to chunks
+                    metadatas = [{"source": filename, "document_id": document_id, "chunk_id": chunk_count + i, **placement}
+                                 for i, placement in enumerate(placements)]
+                    chunk_count += len(chunks)
+                    state['created'] = chunk_count
+                    self._report_progress(state)
+                    batches.put((chunks, metadatas, vectors, placements))
+                state['chunking_done'] = True
+                self._report_progress(state)
+            finally:
+                batches.put(None)
+                worker.join()
+                # Chunks added before a failure stay searchable, so they are saved as well
+                with state['lock'].write():
+                    vectorstore = self.document_store.get(session_id)
+                    if not state['lock'].cleared and vectorstore is not None and is_dirty(vectorstore):
+                        vectorstore = self._commit(session_id, vectorstore)
+                    if is_corpus_key(session_id) and state['embedded'] and not state['lock'].cleared:
+                        # Other workers reload their resident copy when they see the new version
+                        version = self.corpora.bump(corpus_name(session_id))
+                        if vectorstore is not None:
+                            vectorstore.corpus_version = version
             
-            if not chunks:
-                self.logger.warning(f"No chunks created from document: {filename}")
-                return
+            if state['error'] is not None:
+                raise state['error']
             
-            # Add metadata to chunks
-            metadatas = [{"source": filename, "chunk_id": i} for i in range(len(chunks))]
+            if not chunk_count:
+                self.logger.warning(f"No chunks created from document: {filename}")
+                return 0
             
-            if session_id not in self.document_store:
-                # Create new FAISS vectorstore for this session
-                vectorstore = FAISS.from_texts(chunks, self.embedding_model, metadatas=metadatas)
-                self.document_store[session_id] = vectorstore
-                self.logger.info(f"Created new vectorstore for session {session_id}")
-            else:
-                # Add to existing vectorstore
-                self.document_store[session_id].add_texts(chunks, metadatas=metadatas)
-                self.logger.info(f"Added to existing vectorstore for session {session_id}")
+            vectorstore = self.document_store.get(session_id)
+            if vectorstore is not None:
+                self._schedule_index_rebuild(session_id, vectorstore)
             
-            self.logger.info(f"Added {len(chunks)} chunks from {filename} to session {session_id}")
+            self.logger.info(f"Added {chunk_count} chunks from {filename} to session {session_id}")
+            return chunk_count
             
         except Exception as e:
             self.logger.error(f"Error adding document to RAG system: {str(e)}")
             raise
     
+    def _iter_chunk_batches(self, segments: Iterable[str]) -> Iterator[Tuple[List[str], List[dict]]]:
+        """
+        Split a stream of segments into chunks, yielding (chunks, placements) in embedding-sized batches
+        
+        Each chunk's placement (see _place_chunks) is measured where it was split, so the
+        document text can be rebuilt from the chunks exactly
+        """
+        batch_size = max(1, EMBEDDING_BATCH_SIZE * EMBEDDING_MAX_WORKERS)
+        flush_size = CHUNK_SIZE * INGEST_SPLIT_FACTOR
+        buffer = ''
+        # Stripped text between the last chunk taken and the buffer, and that chunk's end
+        # relative to lead + buffer (None before the first chunk)
+        lead = ''
+        previous_end = None
+        pending: List[Tuple[str, dict]] = []
+        
+        for segment in segments:
+            segment = segment.strip()
+            if not segment:
+                continue
+            buffer = f"{buffer}\n\n{segment}" if buffer else segment
+            
+            if len(buffer) >= flush_size:
+                with metrics.span('rag_system', 'split'):
+                    chunks = self.text_splitter.split_text(buffer)
+                if not chunks:
+                    buffer = ''
+                    continue
+                text = lead + buffer
+                placed = _place_chunks(text, chunks, previous_end)
+                # The last chunk may continue into the next segment, so it is carried over
+                # and re-split with it; it also supplies the overlap for the next chunk
+                pending.extend((chunk, placement) for chunk, (_, placement) in zip(chunks[:-1], placed))
+                if len(chunks) > 1:
+                    previous_end = placed[-2][0] + len(chunks[-2])
+                carried_start = placed[-1][0]
+                if previous_end is None or previous_end >= carried_start:
+                    lead = ''
+                    previous_end = None if previous_end is None else previous_end - carried_start
+                else:
+                    lead = text[previous_end:carried_start]
+                    previous_end = 0
+                buffer = chunks[-1]
+                
+                while len(pending) >= batch_size:
+                    yield [chunk for chunk, _ in pending[:batch_size]], [placement for _, placement in pending[:batch_size]]
+                    pending = pending[batch_size:]
+        
+        if buffer:
+            with metrics.span('rag_system', 'split'):
+                chunks = self.text_splitter.split_text(buffer)
+            pending.extend((chunk, placement) for chunk, (_, placement) in
+                           zip(chunks, _place_chunks(lead + buffer, chunks, previous_end)))
+        
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            yield [chunk for chunk, _ in batch], [placement for _, placement in batch]
+    
+    def _embed_batches(self, session_id: str, batches: queue.Queue, state: dict):
+        """Ingest worker: embed chunk batches (unless already embedded) in order and add them to the session's index"""
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            if state['error'] is not None:
+                continue  # keep draining so the producer never blocks
+            
+            chunks, metadatas, vectors, placements = item
+            try:
+                if vectors is None:
+                    with metrics.span('rag_system', 'embed'):
+                        vectors = self.embeddings.embed_documents(chunks)
+                    metrics.inc('chunks_embedded_total', len(chunks))
+                if state['on_embedded'] is not None:
+                    state['on_embedded'](chunks, vectors, placements)
+                text_embeddings = list(zip(chunks, vectors))
+                
+                # Several uploads may ingest into the same session concurrently
+                with state['lock'].write(), metrics.span('rag_system', 'index_add'):
+                    if state['lock'].cleared or self.persistence.deleted_since(session_id, state['version']):
+                        raise SessionClearedError(f"Session {session_id} was cleared during ingestion")
+                    vectorstore = self._get_vectorstore(session_id, writable=True)
+                    if vectorstore is None:
+                        # Create new FAISS vectorstore for this session
+                        vectorstore = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas)
+                        # Based on whatever is on disk now: nothing, or an index deleted since
+                        vectorstore.version = self.persistence.version(session_id)
+                        vectorstore.unsaved = [(0, np.asarray(vectors, dtype=np.float32))]
+                        self.document_store[session_id] = vectorstore
+                        self.logger.info(f"Created new vectorstore for session {session_id}")
+                        self._get_lexical_index(vectorstore)
+                    else:
+                        # Add to existing vectorstore
+                        self._add_embeddings(vectorstore, text_embeddings, metadatas)
+                
+                state['embedded'] += len(chunks)
+                self._report_progress(state)
+                
+            except Exception as e:
+                state['error'] = e
+    
+    def _add_embeddings(self, vectorstore: FAISS, text_embeddings: List[Tuple[str, List[float]]],
+                        metadatas: List[dict], ids: Optional[List[str]] = None):
+        """Add embedded chunks to a vectorstore, its BM25 index and its unsaved changes"""
+        start = vectorstore.index.ntotal
+        # Answers cached for the previous document set no longer apply
+        self._invalidate_answers(vectorstore)
+        ids = vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        if not hasattr(vectorstore, 'unsaved'):
+            vectorstore.unsaved = []
+        vectorstore.unsaved.append((start, np.asarray([vector for _, vector in text_embeddings], dtype=np.float32)))
+        lexical_index = getattr(vectorstore, 'lexical_index', None)
+        if lexical_index is not None:
+            lexical_index.add(ids, [text for text, _ in text_embeddings])
+        else:
+            self._get_lexical_index(vectorstore)
+    
+    def _commit(self, session_id: str, vectorstore: FAISS, force: bool = False) -> Optional[FAISS]:
+        """
+        Save a session's index, merging it with what other workers saved since it was loaded
+        
+        Called with the session lock held. Chunks added since the last save are replayed
+        onto a newer copy on disk under the cross-process lock, so concurrent writers in
+        different workers never overwrite each other.
+        
+        Args:
+            session_id: Session identifier
+            vectorstore: The session's vectorstore in this process
+            force: Save even without unsaved chunks (e.g. after replacing the index)
+            
+        Returns:
+            The vectorstore now current, or None if another worker deleted the index
+        """
+        with self.persistence.lock(session_id):
+            current = vectorstore
+            if self.persistence.version(session_id) != getattr(vectorstore, 'version', None):
+                current = self.persistence.load(session_id, self.embeddings, writable=True)
+                if current is not None:
+                    self._replay_unsaved(vectorstore, current)
+            elif not force and not is_dirty(vectorstore):
+                return vectorstore
+            
+            if current is not None and (current is vectorstore or current.unsaved):
+                self._get_fingerprint(current)
+                with metrics.span('rag_system', 'index_save'):
+                    self.persistence.save(session_id, current)
+                current.unsaved = []
+        
+        if current is None:
+            self.logger.warning(f"Index of session {session_id} was deleted by another worker; "
+                                f"dropping its unsaved chunks")
+            self.document_store.discard(session_id, vectorstore)
+            return None
+        configure_search(current.index, ANN_NPROBE, ANN_EF_SEARCH)
+        self.document_store[session_id] = current  # (re-)account the grown index
+        return current
+    
+    def _replay_unsaved(self, source: FAISS, target: FAISS):
+        """Add the chunks a vectorstore has not saved yet to a newer copy of the same index"""
+        target.unsaved = []
+        for start, vectors in getattr(source, 'unsaved', None) or []:
+            ids = [source.index_to_docstore_id[start + offset] for offset in range(len(vectors))]
+            documents = [source.docstore.search(doc_id) for doc_id in ids]
+            self._add_embeddings(target, [(document.page_content, vector) for document, vector in zip(documents, vectors.tolist())],
+                                 [document.metadata for document in documents], ids=ids)
+    
+    def _is_current(self, session_id: str, vectorstore: FAISS) -> bool:
+        """Whether an in-memory index still matches the saved one; unsaved chunks are merged when saved instead"""
+        version = getattr(vectorstore, 'version', None)
+        if self.persistence.version(session_id) == version:
+            return True
+        # Not merged into a deleted index though: the deletion applies to every worker's copy
+        return is_dirty(vectorstore) and not self.persistence.deleted_since(session_id, version)
+    
+    def _report_progress(self, state: dict):
+        if state['progress'] is None:
+            return
+        try:
+            state['progress'](state['created'], state['embedded'], state['chunking_done'])
+        except Exception as e:
+            self.logger.warning(f"Error reporting ingestion progress: {str(e)}")
+    
+    def _schedule_index_rebuild(self, session_id: str, vectorstore: FAISS):
+        """Queue a background rebuild once a session outgrows its flat (or last approximate) index"""
+        count = vectorstore.index.ntotal
+        if not ANN_MIN_VECTORS or count < ANN_MIN_VECTORS:
+            return
+        if not is_flat(vectorstore.index):
+            built = self.ann_reports.get(session_id, {}).get('vectors')
+            if not built or count < built * ANN_REBUILD_GROWTH:
+                return
+        
+        with self._stats_lock:
+            if session_id in self._ann_pending:
+                return
+            self._ann_pending.add(session_id)
+        self.index_builder.submit(self._rebuild_index, session_id)
+    
+    def _rebuild_index(self, session_id: str):
+        """Replace a session's index with an approximate one built from its current vectors"""
+        try:
+            lock = self._session_lock(session_id)
+            with lock.write():
+                vectorstore = self._get_vectorstore(session_id, writable=True)
+                if vectorstore is None:
+                    return
+                # Quantized reconstructions would compound the loss at every rebuild
+                vectors = self._exact_vectors(session_id, vectorstore)
+                first_id = vectorstore.index_to_docstore_id.get(0)
+            
+            # Training and adding run without the lock; queries keep using the old index
+            index, report = rebuild_with_recall(vectors, ANN_INDEX_TYPE, ANN_QUANTIZATION, ANN_HNSW_M,
+                                                ANN_NPROBE, ANN_EF_SEARCH, ANN_RECALL_K, ANN_RECALL_SAMPLE)
+            
+            with lock.write():
+                vectorstore = None if lock.cleared else self._get_vectorstore(session_id, writable=True)
+                # The session was cleared (and possibly refilled) during the build
+                if (vectorstore is None or vectorstore.index.ntotal < len(vectors) or
+                        vectorstore.index_to_docstore_id.get(0) != first_id):
+                    return
+                # Chunks added during the build
+                if vectorstore.index.ntotal > len(vectors):
+                    added = self._exact_vectors(session_id, vectorstore, len(vectors))
+                    index.add(added)
+                    vectors = np.concatenate([vectors, added])
+                vectorstore.index = index
+                if is_quantized(index):
+                    vectorstore.raw_vectors = vectors  # written next to the index when it is saved
+                vectorstore.is_mmap_backed = False
+                if self._commit(session_id, vectorstore, force=True) is not vectorstore:
+                    return  # another worker changed the index during the build
+            
+            report['vectors'] = index.ntotal
+            with self._stats_lock:
+                self.ann_reports[session_id] = report
+            self.logger.info(f"Rebuilt index of session {session_id} as {report['type']}")
+        
+        except Exception as e:
+            self.logger.error(f"Error rebuilding index for session {session_id}: {str(e)}")
+        finally:
+            with self._stats_lock:
+                self._ann_pending.discard(session_id)
+    
+    def _exact_vectors(self, session_id: str, vectorstore: FAISS, start: int = 0) -> np.ndarray:
+        """
+        Full-precision vectors of a session's index from a position on
+        
+        Quantized indexes only reconstruct approximations, so their vectors come from the
+        copy saved alongside the index plus the chunks not saved yet. Called with the
+        session lock held.
+        """
+        index = vectorstore.index
+        if not is_quantized(index):
+            return read_vectors(index, start)
+        
+        total = index.ntotal
+        vectors = np.empty((total - start, index.d), dtype=np.float32)
+        covered = start
+        saved = self.persistence.read_raw_vectors(session_id, index.d, start)
+        if saved is not None:
+            count = min(len(saved), total - start)
+            vectors[:count] = saved[:count]
+            covered = start + count
+        for position, rows in sorted(getattr(vectorstore, 'unsaved', None) or [], key=lambda change: change[0]):
+            end = position + len(rows)
+            if end > start:
+                vectors[max(position, start) - start:end - start] = rows[max(start - position, 0):]
+            if position <= covered:
+                covered = max(covered, end)
+        if covered < total:
+            self.logger.warning(f"No full-precision copy of {total - covered} vectors of session {session_id}; "
+                                f"using their quantized reconstructions")
+            vectors[covered - start:] = read_vectors(index, covered)
+        return vectors
+    
+    def _session_lock(self, session_id: str) -> _SessionLock:
+        with self._stats_lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = self._session_locks[session_id] = _SessionLock()
+            return lock
+    
     def ask_question(self, session_id: str, question: str) -> Optional[str]:
         """
         Ask a question and get an answer based on the documents
@@ -99,55 +683,360 @@ class RAGSystem:
             Answer string or None if no documents available
         """
         try:
-            if session_id not in self.document_store:
+            # Get relevant context from the session's index and its attached corpora
+            stores = self._get_search_stores(session_id)
+            if not stores:
                 self.logger.warning(f"No documents found for session {session_id}")
                 return None
             
-            # Get relevant context from vector store
-            vectorstore = self.document_store[session_id]
-            
-            try:
-                relevant_docs = vectorstore.similarity_search(question, k=4)
-            except Exception as e:
-                self.logger.error(f"Error in similarity search: {str(e)}")
-                return "Error searching through documents. Please try again."
-            
-            if not relevant_docs:
-                return "I couldn't find relevant information in the uploaded documents to answer your question."
+            fingerprint = self._get_stores_fingerprint(stores)
+            question_vector = self._embed_question_for_cache(question)
             
-            # Create context from relevant documents
-            context_parts = []
-            for doc in relevant_docs:
-                source = doc.metadata.get('source', 'Unknown')
-                content = doc.page_content
-                context_parts.append(f"From {source}: {content}")
+            cached_answer = self.answer_cache.get(fingerprint, question, question_vector)
+            if cached_answer is not None:
+                self.logger.info(f"Answer cache hit for session {session_id}")
+                return cached_answer
             
-            context = "\n\n".join(context_parts)
+            context, fallback = self._retrieve_context(stores, question, question_vector)
+            if fallback:
+                return fallback
             
             # Generate answer using Groq
             answer = self._generate_answer(question, context)
             
+            if answer != GENERATION_ERROR_MESSAGE:
+                self.answer_cache.put(fingerprint, question, answer, question_vector)
+            
             return answer
             
         except Exception as e:
             self.logger.error(f"Error answering question: {str(e)}")
             return f"Error processing your question: {str(e)}"
     
-    def get_documents(self, session_id: str) -> List[str]:
-        """Get all document contents for a session"""
-        if session_id not in self.document_store:
-            return []
+    def ask_question_stream(self, session_id: str, question: str) -> Optional[Iterator[str]]:
+        """
+        Streaming variant of ask_question
+        
+        Args:
+            session_id: Session identifier
+            question: User's question
+            
+        Returns:
+            Iterator of answer tokens or None if no documents available
+        """
+        stores = self._get_search_stores(session_id)
+        if not stores:
+            self.logger.warning(f"No documents found for session {session_id}")
+            return None
+        
+        fingerprint = self._get_stores_fingerprint(stores)
+        question_vector = self._embed_question_for_cache(question)
+        
+        cached_answer = self.answer_cache.get(fingerprint, question, question_vector)
+        if cached_answer is not None:
+            self.logger.info(f"Answer cache hit for session {session_id}")
+            return iter([cached_answer])
+        
+        context, fallback = self._retrieve_context(stores, question, question_vector)
+        if fallback:
+            return iter([fallback])
         
+        tokens = self._stream_chain(ANSWER_PROMPT, {"context": context, "question": question}, 'ask',
+                                    GENERATION_ERROR_MESSAGE)
+        return self._cache_streamed_answer(tokens, fingerprint, question, question_vector)
+    
+    def _cache_streamed_answer(self, tokens: Iterator[str], fingerprint: str, question: str,
+                               question_vector: Optional[List[float]]) -> Iterator[str]:
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            yield token
+        
+        # Reached only when the stream completed; a failed one raised GenerationError
+        answer = ''.join(parts)
+        if answer:
+            self.answer_cache.put(fingerprint, question, answer, question_vector)
+    
+    def _embed_question_for_cache(self, question: str) -> Optional[List[float]]:
+        """Embed the question up front when near-duplicate answer caching is enabled"""
+        if not self.answer_cache.near_duplicate_enabled:
+            return None
         try:
-            # Get all documents from the vectorstore
-            vectorstore = self.document_store[session_id]
-            # Get all texts by doing a broad similarity search
-            all_docs = vectorstore.similarity_search("", k=200)  # Get many docs
+            with metrics.span('rag_system', 'embed_question'):
+                return self.embeddings.embed_query(question)
+        except Exception as e:
+            self.logger.error(f"Error embedding question: {str(e)}")
+            return None
+    
+    def _get_search_stores(self, session_id: str) -> List[Tuple[str, FAISS]]:
+        """(index key, vectorstore) of the session's own documents and of each attached corpus"""
+        stores = []
+        vectorstore = self._get_vectorstore(session_id)
+        if vectorstore is not None:
+            stores.append((session_id, vectorstore))
+        for name, version in self.corpora.attached_versions(session_id):
+            key = corpus_key(name)
+            corpus = self.document_store.get(key)
+            if corpus is not None and getattr(corpus, 'corpus_version', None) not in (None, version):
+                # Documents were added to the corpus, or it was deleted and recreated, since it was loaded
+                self.document_store.discard(key, corpus)
+            corpus = self._get_vectorstore(key)
+            if corpus is not None:
+                if getattr(corpus, 'corpus_version', None) is None:
+                    # Read before loading, so a newer index is at worst reloaded once more
+                    corpus.corpus_version = version
+                stores.append((key, corpus))
+        return stores
+    
+    def _is_resident(self, key: str) -> bool:
+        """Shared corpora stay in memory while they exist; a deleted one is evicted like a session"""
+        return is_corpus_key(key) and self.corpora.exists(corpus_name(key))
+    
+    def _get_stores_fingerprint(self, stores: List[Tuple[str, FAISS]]) -> str:
+        """Fingerprint of the documents searched together; a change to any store changes it"""
+        fingerprints = []
+        for key, vectorstore in stores:
+            with self._session_lock(key).read():
+                fingerprints.append(self._get_fingerprint(vectorstore))
+        if len(fingerprints) == 1:
+            return fingerprints[0]
+        digest = hashlib.sha256()
+        for fingerprint in fingerprints:
+            digest.update(fingerprint.encode('ascii'))
+        return digest.hexdigest()
+    
+    def _get_fingerprint(self, vectorstore: FAISS) -> str:
+        """
+        Get a content fingerprint of a session's document set
+        
+        Kept on the vectorstore and saved in its metadata, so a copy loaded by any
+        worker carries the fingerprint of exactly what it contains. Called with the
+        session's read or write lock held.
+        """
+        fingerprint = getattr(vectorstore, 'fingerprint', None)
+        if fingerprint is None:
+            digest = hashlib.sha256()
+            for position in sorted(vectorstore.index_to_docstore_id):
+                document = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+                if isinstance(document, Document):
+                    digest.update(document.page_content.encode('utf-8'))
+                    digest.update(b'\x00')
+            fingerprint = digest.hexdigest()
+            vectorstore.fingerprint = fingerprint
+        return fingerprint
+    
+    def _invalidate_answers(self, vectorstore: FAISS):
+        """Forget a changed vectorstore's fingerprint and the answers cached under it"""
+        fingerprint = getattr(vectorstore, 'fingerprint', None)
+        vectorstore.fingerprint = None
+        if fingerprint is not None:
+            self.answer_cache.invalidate(fingerprint)
+    
+    def _retrieve_context(self, stores: List[Tuple[str, FAISS]], question: str,
+                          question_vector: Optional[List[float]] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Build the prompt context for a question
+        
+        Returns:
+            (context, None) on success or (None, message) with a reply for the user
+        """
+        try:
+            relevant_docs = self._retrieve(stores, question, question_vector)
+        except Exception as e:
+            self.logger.error(f"Error in similarity search: {str(e)}")
+            return None, "Error searching through documents. Please try again."
+        
+        if not relevant_docs:
+            return None, "I couldn't find relevant information in the uploaded documents to answer your question."
+        
+        # Create context from relevant documents
+        with metrics.span('rag_system', 'build_prompt'):
+            context_parts = []
+            for doc in relevant_docs:
+                source = doc.metadata.get('source', 'Unknown')
+                content = doc.page_content
+                context_parts.append(f"From {source}: {content}")
+            
+            return "\n\n".join(context_parts), None
+    
+    def _retrieve(self, stores: List[Tuple[str, FAISS]], question: str,
+                  question_vector: Optional[List[float]] = None) -> List[Document]:
+        """
+        Find the chunks most relevant to a question with the configured retrieval mode
+        
+        Rankings hold (store number, docstore id) pairs so that the session's index and
+        attached corpora are ranked together: vector hits are merged by distance, and
+        BM25 rankings (whose scores are not comparable across indexes) by rank fusion.
+        Each index is read under its session's read lock, one index at a time.
+        """
+        started = time.monotonic()
+        
+        if RETRIEVAL_MODE == 'vector':
+            ranked = self._vector_ranking(stores, question, question_vector, RETRIEVAL_K)
+            path = 'vector'
+        else:
+            lexical_rankings, confident = [], []
+            term_count = len(query_terms(question))
+            for number, (key, vectorstore) in enumerate(stores):
+                # Built (under the write lock) before reading; a read lock cannot be upgraded
+                lexical_index = self._get_lexical_index(vectorstore, key)
+                with self._session_lock(key).read(), metrics.span('rag_system', 'lexical_search'):
+                    lexical, coverage = lexical_index.search(question, RETRIEVAL_CANDIDATES)
+                ranking = [(number, doc_id) for doc_id, _ in lexical]
+                lexical_rankings.append(ranking)
+                if self._lexical_confident(lexical, coverage, term_count):
+                    confident.append(ranking)
+            
+            if RETRIEVAL_MODE == 'lexical':
+                ranked = self._fuse_rankings(*lexical_rankings)[:RETRIEVAL_K]
+                path = 'lexical'
+            elif confident:
+                ranked = self._fuse_rankings(*confident)[:RETRIEVAL_K]
+                path = 'lexical_fast_path'
+            else:
+                vector = self._vector_ranking(stores, question, question_vector, RETRIEVAL_CANDIDATES)
+                ranked = self._fuse_rankings(*lexical_rankings, vector)[:RETRIEVAL_K]
+                path = 'hybrid'
+        
+        documents = []
+        for number, doc_id in ranked:
+            key, vectorstore = stores[number]
+            with self._session_lock(key).read():
+                documents.append(vectorstore.docstore.search(doc_id))
+        self._record_latency(self.retrieval_stats, path, time.monotonic() - started)
+        return [document for document in documents if isinstance(document, Document)]
+    
+    def _lexical_confident(self, lexical: List[Tuple[str, float]], coverage: float, term_count: int) -> bool:
+        if not LEXICAL_FAST_PATH_MARGIN or not lexical or coverage < 1.0:
+            return False
+        # A lone hit has no runner-up to beat, so the score alone has to make it distinctive
+        if lexical[0][1] < LEXICAL_FAST_PATH_MIN_SCORE * term_count:
+            return False
+        return len(lexical) == 1 or lexical[0][1] >= LEXICAL_FAST_PATH_MARGIN * lexical[1][1]
+    
+    def _vector_ranking(self, stores: List[Tuple[str, FAISS]], question: str,
+                        question_vector: Optional[List[float]], k: int) -> List[Tuple[int, str]]:
+        """(store number, docstore id) of the nearest chunks to the question embedding across stores"""
+        if question_vector is None:
+            with metrics.span('rag_system', 'embed_question'):
+                question_vector = self.embeddings.embed_query(question)
+        query = np.asarray([question_vector], dtype=np.float32)
+        
+        hits = []
+        with metrics.span('rag_system', 'vector_search'):
+            for number, (key, vectorstore) in enumerate(stores):
+                with self._session_lock(key).read():
+                    distances, positions = vectorstore.index.search(query, min(k, vectorstore.index.ntotal))
+                    hits.extend((distance, number, vectorstore.index_to_docstore_id[position])
+                                for distance, position in zip(distances[0], positions[0]) if position != -1)
+        hits.sort(key=lambda hit: hit[0])
+        return [(number, doc_id) for _, number, doc_id in hits[:k]]
+    
+    @staticmethod
+    def _fuse_rankings(*rankings: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        """Reciprocal rank fusion of several rankings of (store number, docstore id)"""
+        scores = {}
+        for ranking in rankings:
+            for rank, doc_id in enumerate(ranking):
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        return sorted(scores, key=scores.get, reverse=True)
+    
+    def _get_lexical_index(self, vectorstore: FAISS, session_id: Optional[str] = None) -> BM25Index:
+        """Get the BM25 index kept alongside a vectorstore, building it from the docstore if needed"""
+        lexical_index = getattr(vectorstore, 'lexical_index', None)
+        if lexical_index is not None:
+            return lexical_index
+        
+        if session_id is not None:
+            # Build under the write lock so a concurrent ingest cannot be left out of the index
+            with self._session_lock(session_id).write():
+                lexical_index = self._get_lexical_index(vectorstore)
+                if self.document_store.get(session_id) is vectorstore:
+                    self.document_store[session_id] = vectorstore  # account for the index's memory
+            return lexical_index
+        
+        lexical_index = BM25Index()
+        doc_ids = [vectorstore.index_to_docstore_id[position] for position in sorted(vectorstore.index_to_docstore_id)]
+        documents = [vectorstore.docstore.search(doc_id) for doc_id in doc_ids]
+        lexical_index.add(
+            (doc_id for doc_id, document in zip(doc_ids, documents) if isinstance(document, Document)),
+            (document.page_content for document in documents if isinstance(document, Document))
+        )
+        vectorstore.lexical_index = lexical_index
+        return lexical_index
+    
+    def iter_chunks(self, session_id: str, filename: Optional[str] = None) -> Iterator[Document]:
+        """
+        Enumerate a session's chunks straight from the docstore, without any embedding call
+        
+        Args:
+            session_id: Session identifier
+            filename: Only yield chunks from this source document
             
-            # Extract unique content
-            contents = list(set([doc.page_content for doc in all_docs]))
-            return contents
+        Yields:
+            Chunk documents in (source, upload, chunk_id) order
+        """
+        vectorstore = self._get_vectorstore(session_id)
+        if vectorstore is None:
+            return
+        
+        # Sort lightweight keys first; chunks saved before uploads had an id fall back to insertion order.
+        # The lock is released before yielding, so a slow consumer never holds up an ingest
+        keys = []
+        with self._session_lock(session_id).read():
+            for position, doc_id in vectorstore.index_to_docstore_id.items():
+                document = vectorstore.docstore.search(doc_id)
+                if not isinstance(document, Document):
+                    continue
+                source = document.metadata.get('source', '')
+                if filename is not None and source != filename:
+                    continue
+                keys.append((source, document.metadata.get('document_id', 0), document.metadata.get('chunk_id', 0),
+                             position, document))
+        keys.sort(key=lambda key: key[:4])
+        
+        for *_, document in keys:
+            yield document
+    
+    def iter_document_text(self, session_id: str, filename: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Rebuild a session's document text from its chunks, dropping the chunk overlap
+        
+        Args:
+            session_id: Session identifier
+            filename: Only yield text from this source document
             
+        Yields:
+            (source, text piece) in document order; the pieces of one source join into its text
+        """
+        previous = None
+        previous_source = previous_upload = None
+        for document in self.iter_chunks(session_id, filename):
+            source = document.metadata.get('source', '')
+            upload = document.metadata.get('document_id')
+            text = document.page_content
+            if source != previous_source:
+                yield source, text
+            elif upload != previous_upload:
+                # Another upload with the same filename starts
+                yield source, '\n\n' + text
+            elif 'overlap' in document.metadata:
+                yield source, document.metadata.get('gap', '') + text[document.metadata['overlap']:]
+            else:
+                # Chunks ingested before overlaps were recorded
+                overlap = _chunk_overlap(previous, text)
+                # Without overlap the chunks were cut at a separator the splitter stripped
+                yield source, text[overlap:] if overlap else '\n\n' + text
+            previous, previous_source, previous_upload = text, source, upload
+    
+    def get_sources(self, session_id: str) -> List[str]:
+        """Get the distinct source filenames of a session's documents"""
+        return sorted({document.metadata.get('source', '') for document in self.iter_chunks(session_id)})
+    
+    def get_documents(self, session_id: str, filename: Optional[str] = None) -> List[str]:
+        """Get all chunk contents for a session in document order"""
+        try:
+            return [document.page_content for document in self.iter_chunks(session_id, filename)]
         except Exception as e:
             self.logger.error(f"Error getting documents: {str(e)}")
             return []
@@ -163,30 +1052,7 @@ class RAGSystem:
             Summary text
         """
         try:
-            # Limit text length to avoid token limits
-            limited_text = text[:12000] if len(text) > 12000 else text
-            
-            prompt_template = PromptTemplate.from_template(
-                """You are a professional summarizer. Please provide a comprehensive summary of the following text. 
-
-                **Formatting guidelines:**
-                - Structure your summary with clear paragraphs
-                - Use bullet points (•) for key highlights  
-                - Use **bold text** for important concepts
-                - Use proper line breaks between topics
-                - Keep the summary well-organized and easy to read
-
-                Focus on the main points, key findings, and important details:
-
-                Text: {text}
-
-                Summary:"""
-            )
-            
-            chain = prompt_template | self.llm | StrOutputParser()
-            summary = chain.invoke({"text": limited_text})
-            
-            return summary
+            return self.summarizer.summarize(self._split_for_summary(text), SUMMARY_PROMPT)
             
         except Exception as e:
             self.logger.error(f"Error generating summary: {str(e)}")
@@ -204,64 +1070,310 @@ class RAGSystem:
             Summary text
         """
         try:
-            # Limit text length to avoid token limits
-            limited_text = text[:12000] if len(text) > 12000 else text
-            
-            prompt_template = PromptTemplate.from_template(
-                """You are a professional summarizer. {instruction}
-
-                Text: {text}
-
-                Summary:"""
+            return self.summarizer.summarize(
+                self._split_for_summary(text), INSTRUCTION_SUMMARY_PROMPT, {"instruction": instruction}
             )
             
-            chain = prompt_template | self.llm | StrOutputParser()
-            summary = chain.invoke({"text": limited_text, "instruction": instruction})
+        except Exception as e:
+            self.logger.error(f"Error generating summary with instruction: {str(e)}")
+            return f"Error generating summary: {str(e)}"
+    
+    def summarize_chunks(self, documents: List[Document]) -> str:
+        """
+        Generate a summary of a session's chunks
+        
+        Windows are built per source document, so after adding a file only the
+        new file's partial summaries are generated; the rest come from cache
+        
+        Args:
+            documents: Chunks in document order (see iter_chunks)
             
-            return summary
+        Returns:
+            Summary text
+        """
+        try:
+            chunks = [document.page_content for document in documents]
+            groups = [document.metadata.get('source', '') for document in documents]
+            return self.summarizer.summarize(chunks, SUMMARY_PROMPT, groups=groups)
             
         except Exception as e:
-            self.logger.error(f"Error generating summary with instruction: {str(e)}")
+            self.logger.error(f"Error generating summary: {str(e)}")
             return f"Error generating summary: {str(e)}"
     
+    def summarize_chunks_stream(self, documents: List[Document]) -> Iterator[str]:
+        """Streaming variant of summarize_chunks; tokens of the final summary are yielded as they arrive"""
+        try:
+            chunks = [document.page_content for document in documents]
+            groups = [document.metadata.get('source', '') for document in documents]
+            partials = self.summarizer.reduce_to_fit(chunks, groups)
+        except Exception as e:
+            self.logger.error(f"Error generating summary: {str(e)}")
+            return iter([f"Error generating summary: {str(e)}"])
+        
+        return self._stream_chain(SUMMARY_PROMPT, {"text": "\n\n".join(partials)}, 'summarize',
+                                  "Error generating summary. Please try again.")
+    
+    def summarize_text_stream(self, text: str, instruction: Optional[str] = None) -> Iterator[str]:
+        """Streaming variant of summarize_text / summarize_text_with_instruction"""
+        try:
+            partials = self.summarizer.reduce_to_fit(self._split_for_summary(text))
+        except Exception as e:
+            self.logger.error(f"Error generating summary: {str(e)}")
+            return iter([f"Error generating summary: {str(e)}"])
+        
+        inputs = {"text": "\n\n".join(partials)}
+        prompt = SUMMARY_PROMPT
+        if instruction:
+            inputs["instruction"] = instruction
+            prompt = INSTRUCTION_SUMMARY_PROMPT
+        return self._stream_chain(prompt, inputs, 'summarize_text', "Error generating summary. Please try again.")
+    
+    def _stream_chain(self, prompt: PromptTemplate, inputs: dict, label: str, error_message: str) -> Iterator[str]:
+        """
+        Stream a prompt through the LLM, recording time-to-first-token
+        
+        Raises:
+            GenerationError: with error_message if the LLM fails, possibly after some tokens
+        """
+        started = time.monotonic()
+        first_token = True
+        try:
+            chain = prompt | self.llm | StrOutputParser()
+            # Time spent by the consumer between tokens is not charged to the LLM
+            for token in metrics.timed_iter(chain.stream(inputs), 'rag_system', f'llm_{label}'):
+                if not token:
+                    continue
+                if first_token:
+                    first_token = False
+                    self._record_ttft(label, time.monotonic() - started)
+                yield token
+        except Exception as e:
+            self.logger.error(f"Error streaming {label} response: {str(e)}")
+            # Raised rather than yielded so the partial response is not taken for a complete one
+            raise GenerationError(error_message) from e
+    
+    def _record_ttft(self, label: str, seconds: float):
+        self.logger.info(f"Time to first token for {label}: {seconds * 1000:.0f}ms")
+        self._record_latency(self.ttft_stats, label, seconds)
+    
+    def _record_latency(self, table: dict, label: str, seconds: float):
+        with self._stats_lock:
+            stats = table.setdefault(label, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stats['count'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+    
+    def _split_for_summary(self, text: str) -> List[str]:
+        """Split text into chunks only when it does not fit into a single prompt"""
+        if len(text) <= SUMMARY_WINDOW_TOKENS * CHARS_PER_TOKEN:
+            return [text]
+        return self.text_splitter.split_text(text)
+    
+    @property
+    def ingest_profile(self) -> str:
+        """Identifies how chunks and vectors are produced; artifacts are only reusable within a profile"""
+        return f"{self.embedding_backend.model_id}|{CHUNK_SIZE}|{CHUNK_OVERLAP}"
+    
+    def get_stats(self) -> dict:
+        """Get runtime statistics for the RAG system"""
+        return {
+            'sessions': len(self.document_store),
+            'session_store': self.document_store.stats(),
+            'embedding_cache': self.embedding_cache.stats(),
+            'embedding_backend': self.embedding_backend.model_id,
+            'embedding_retries': self.embedding_scheduler.retries if self.embedding_scheduler else 0,
+            'summarizer': self.summarizer.stats(),
+            'answer_cache': self.answer_cache.stats(),
+            'time_to_first_token': self._latency_summary(self.ttft_stats),
+            'retrieval_latency': self._latency_summary(self.retrieval_stats),
+            'ann_indexes': self._ann_summary()
+        }
+    
+    def metric_samples(self) -> List[tuple]:
+        """Cache and per-session index metrics, read at scrape time (see metrics.register_collector)"""
+        embedding = self.embedding_cache.stats()
+        answers = self.answer_cache.stats()
+        summaries = self.summarizer.stats()
+        sizes = self.document_store.sizes()
+        return [
+            ('cache_hits_total', 'counter', 'Cache lookups answered from the cache', [
+                ({'cache': 'embedding'}, embedding['hits']),
+                ({'cache': 'answer'}, answers['hits']),
+                ({'cache': 'answer_near_duplicate'}, answers['near_duplicate_hits']),
+                ({'cache': 'summary'}, summaries['cache_hits'])
+            ]),
+            ('cache_misses_total', 'counter', 'Cache lookups that fell through', [
+                ({'cache': 'embedding'}, embedding['misses']),
+                ({'cache': 'answer'}, answers['misses']),
+                ({'cache': 'summary'}, summaries['cache_misses'])
+            ]),
+            ('embedding_cache_bytes', 'gauge', 'Bytes held by the embedding cache', [({}, embedding['bytes'])]),
+            ('session_index_vectors', 'gauge', 'Vectors in each in-memory session index',
+             [({'session': self._metric_label(key)}, size['vectors']) for key, size in sizes.items()]),
+            ('session_index_bytes', 'gauge', 'Estimated bytes of each in-memory session index',
+             [({'session': self._metric_label(key)}, size['bytes']) for key, size in sizes.items()])
+        ]
+    
+    @staticmethod
+    def _metric_label(key: str) -> str:
+        """Session ids are bearer secrets (they are the cookie), so metrics only carry a digest"""
+        if is_corpus_key(key):
+            return key
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]
+    
+    def _ann_summary(self) -> dict:
+        with self._stats_lock:
+            return {session_id: dict(report) for session_id, report in self.ann_reports.items()}
+    
+    def _latency_summary(self, table: dict) -> dict:
+        with self._stats_lock:
+            return {
+                label: {
+                    'count': stats['count'],
+                    'avg_ms': stats['total_seconds'] * 1000 / stats['count'],
+                    'max_ms': stats['max_seconds'] * 1000
+                }
+                for label, stats in table.items()
+            }
+    
     def clear_session(self, session_id: str):
         """Clear all documents for a session"""
-        if session_id in self.document_store:
-            del self.document_store[session_id]
-            self.logger.info(f"Cleared session {session_id}")
+        lock = self._session_lock(session_id)
+        with lock.write():
+            lock.cleared = True
+            with self._stats_lock:
+                # Later uploads start over with a new lock
+                if self._session_locks.get(session_id) is lock:
+                    del self._session_locks[session_id]
+            vectorstore = self.document_store.get(session_id)
+            if vectorstore is not None:
+                self._invalidate_answers(vectorstore)
+                self.document_store.discard(session_id)
+                self.logger.info(f"Cleared session {session_id}")
+            self.persistence.delete(session_id)
+        self.corpora.detach_session(session_id)
+        with self._stats_lock:
+            self.ann_reports.pop(session_id, None)
+    
+    def create_corpus(self, name: str, description: str = '') -> str:
+        """
+        Register a shared corpus; its documents are added with the returned index key
+        
+        Args:
+            name: Corpus name (letters, digits, '-' and '_')
+            description: Shown to users choosing corpora
+            
+        Returns:
+            Index key to pass as the session id when adding documents
+        """
+        key = corpus_key(name)
+        self.corpora.create(name, description)
+        return key
+    
+    def attach_corpus(self, session_id: str, name: str):
+        """Make a session's questions also search a shared corpus"""
+        self.corpora.attach(session_id, name)
+        self.logger.info(f"Attached corpus {name} to session {session_id}")
+    
+    def detach_corpus(self, session_id: str, name: str):
+        self.corpora.detach(session_id, name)
+    
+    def list_corpora(self, session_id: Optional[str] = None) -> List[dict]:
+        """Shared corpora, flagged when attached to the session"""
+        attached = set(self.corpora.attached(session_id)) if session_id else set()
+        corpora = self.corpora.list_corpora()
+        for corpus in corpora:
+            corpus['attached'] = corpus['name'] in attached
+        return corpora
+    
+    def delete_corpus(self, name: str):
+        """Delete a shared corpus and its index, detaching it from every session"""
+        self.clear_session(corpus_key(name))
+        self.corpora.delete(name)
+    
+    def _get_vectorstore(self, session_id: str, writable: bool = False) -> Optional[FAISS]:
+        """
+        Get a session's vectorstore, loading it from disk on first access
+        
+        Args:
+            session_id: Session identifier
+            writable: Whether the caller is going to add to the index
+            
+        Returns:
+            FAISS vectorstore or None if the session has no documents
+        """
+        vectorstore = self.document_store.get(session_id)
+        if vectorstore is not None and not self._is_current(session_id, vectorstore):
+            # Another worker saved a newer index, or deleted it
+            self.document_store.discard(session_id, vectorstore)
+            vectorstore = None
+        
+        # Memory-mapped indexes are read-only, so swap in a private copy before writing
+        if vectorstore is not None and writable and getattr(vectorstore, 'is_mmap_backed', False):
+            vectorstore = None
+        
+        if vectorstore is None:
+            vectorstore = self.persistence.load(session_id, self.embeddings, writable=writable)
+            if vectorstore is not None and not self._same_embedding_model(vectorstore):
+                if writable:
+                    # Writers already hold the session lock
+                    vectorstore = self._reembed(session_id, vectorstore)
+                else:
+                    with self._session_lock(session_id).write():
+                        # Another request may have rebuilt it while this one waited
+                        vectorstore = self.persistence.load(session_id, self.embeddings)
+                        if vectorstore is not None and not self._same_embedding_model(vectorstore):
+                            vectorstore = self._reembed(session_id, vectorstore)
+            if vectorstore is not None:
+                configure_search(vectorstore.index, ANN_NPROBE, ANN_EF_SEARCH)
+                self.document_store[session_id] = vectorstore
+        
+        return vectorstore
+    
+    def _same_embedding_model(self, vectorstore: FAISS) -> bool:
+        """Whether a loaded index lives in the current embedding space (unrecorded means the original Gemini model)"""
+        built_with = getattr(vectorstore, 'embedding_model', None) or GOOGLE_EMBEDDING_MODEL
+        return built_with == self.embedding_backend.model_id
+    
+    def _reembed(self, session_id: str, stale: FAISS) -> Optional[FAISS]:
+        """Rebuild an index made with another embedding model from its stored chunks"""
+        self.logger.warning(f"Re-embedding session {session_id} with {self.embedding_backend.model_id}")
+        doc_ids = [stale.index_to_docstore_id[position] for position in sorted(stale.index_to_docstore_id)]
+        entries = [(doc_id, stale.docstore.search(doc_id)) for doc_id in doc_ids]
+        entries = [(doc_id, document) for doc_id, document in entries if isinstance(document, Document)]
+        
+        vectorstore = None
+        batch_size = max(1, EMBEDDING_BATCH_SIZE * EMBEDDING_MAX_WORKERS)
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start:start + batch_size]
+            texts = [document.page_content for _, document in batch]
+            text_embeddings = list(zip(texts, self.embeddings.embed_documents(texts)))
+            metadatas = [document.metadata for _, document in batch]
+            ids = [doc_id for doc_id, _ in batch]
+            if vectorstore is None:
+                vectorstore = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+            else:
+                vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        
+        if vectorstore is None:
+            return None
+        vectorstore.version = stale.version
+        vectorstore = self._commit(session_id, vectorstore, force=True)
+        if vectorstore is None:
+            return None
+        # The rebuilt index is flat again
+        self._schedule_index_rebuild(session_id, vectorstore)
+        return vectorstore
     
     def _generate_answer(self, question: str, context: str) -> str:
         """Generate answer using Groq with context"""
         try:
-            prompt_template = PromptTemplate(
-                input_variables=["context", "question"],
-                template="""You are a helpful assistant. Use the context provided below to answer the question accurately and comprehensively. 
-
-                **Important formatting guidelines:**
-                - Structure your response with clear paragraphs
-                - Use bullet points (•) for lists when appropriate
-                - Use numbered lists (1., 2., 3.) for sequential information
-                - Use **bold text** for important terms or concepts
-                - Use proper line breaks between different topics
-                - Keep paragraphs concise and well-organized
-                
-                If the answer cannot be found in the context, say "I don't have enough information in the provided documents to answer this question."
-
-                Context:
-                {context}
-
-                Question:
-                {question}
-
-                Answer:"""
-            )
-            
-            chain = prompt_template | self.llm | StrOutputParser()
-            answer = chain.invoke({"context": context, "question": question})
+            chain = ANSWER_PROMPT | self.llm | StrOutputParser()
+            with metrics.span('rag_system', 'llm_ask'):
+                answer = chain.invoke({"context": context, "question": question})
             
             return answer
             
         except Exception as e:
             self.logger.error(f"Error generating answer: {str(e)}")
-            return '''Sorry for the inconvenience. We are currently experiencing high demand on our AI services. 
-            Please try again in a few moments. If the issue persists, our rate limits may have been exceeded.'''
+            return GENERATION_ERROR_MESSAGE
@@ -0,0 +1,166 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Callable, Dict
+from langchain_community.vectorstores import FAISS
+from ann_index import estimate_index_bytes
+
+# Rough per-chunk overhead of a Document object and its docstore entry
+DOCUMENT_OVERHEAD_BYTES = 600
+
+
+def estimate_vectorstore_bytes(vectorstore: FAISS) -> int:
+    """Approximate resident size of a FAISS vectorstore (vectors, docstore text and lexical index)"""
+    total = estimate_index_bytes(vectorstore.index)
+    documents = getattr(vectorstore.docstore, '_dict', {})
+    for document in documents.values():
+        total += len(document.page_content) + DOCUMENT_OVERHEAD_BYTES
+    lexical_index = getattr(vectorstore, 'lexical_index', None)
+    if lexical_index is not None:
+        total += lexical_index.estimated_bytes()
+    return total
+
+
+def is_dirty(vectorstore: FAISS) -> bool:
+    """Whether a vectorstore holds chunks that have not been saved yet"""
+    return bool(getattr(vectorstore, 'unsaved', None))
+
+
+class SessionStore:
+    """
+    Bounded in-memory store of per-session vectorstores
+    Enforces a global memory budget and an idle TTL, evicting least-recently-used
+    sessions first. Evicted sessions are only dropped from memory: every index is
+    saved by its writer, and is loaded back lazily on its next access. Entries with
+    unsaved chunks (an ingest still writing them) and entries for which
+    `resident(key)` is true (indexes shared by many sessions) are never evicted,
+    but still count against the budget.
+    """
+
+    def __init__(self, max_bytes: int = 1024 * 1024 * 1024, idle_ttl: float = 3600,
+                 resident: Optional[Callable[[str], bool]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.resident = resident or (lambda session_id: False)
+        self.total_bytes = 0
+        self.evictions = {'memory': 0, 'ttl': 0}
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, session_id: str, default=None) -> Optional[FAISS]:
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return default
+            entry['last_access'] = time.monotonic()
+            self._entries.move_to_end(session_id)
+            return entry['vectorstore']
+
+    def __getitem__(self, session_id: str) -> FAISS:
+        vectorstore = self.get(session_id)
+        if vectorstore is None:
+            raise KeyError(session_id)
+        return vectorstore
+
+    def __setitem__(self, session_id: str, vectorstore: FAISS):
+        """Insert or re-account a session's vectorstore, then enforce the memory budget"""
+        size = estimate_vectorstore_bytes(vectorstore)
+        with self._lock:
+            previous = self._entries.pop(session_id, None)
+            if previous is not None:
+                self.total_bytes -= previous['bytes']
+            self._entries[session_id] = {
+                'vectorstore': vectorstore,
+                'bytes': size,
+                'last_access': time.monotonic()
+            }
+            self.total_bytes += size
+            self._expire()
+            self._enforce_budget(keep=session_id)
+
+    def __delitem__(self, session_id: str):
+        with self._lock:
+            entry = self._entries.pop(session_id)
+            self.total_bytes -= entry['bytes']
+
+    def discard(self, session_id: str, vectorstore: Optional[FAISS] = None):
+        """Drop a session without spilling it; with vectorstore, only if the entry still holds that one"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or (vectorstore is not None and entry['vectorstore'] is not vectorstore):
+                return
+            del self._entries[session_id]
+            self.total_bytes -= entry['bytes']
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            self._expire()
+            return session_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def _expire(self):
+        """Evict sessions idle for longer than the TTL (oldest entries come first)"""
+        if not self.idle_ttl:
+            return
+        now = time.monotonic()
+        cutoff = now - self.idle_ttl
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if entry['last_access'] > cutoff:
+                break
+            if self._pinned(session_id, entry):
+                entry['last_access'] = now
+                self._entries.move_to_end(session_id)
+                continue
+            self._evict(session_id, 'ttl')
+
+    def _enforce_budget(self, keep: str):
+        while self.total_bytes > self.max_bytes:
+            session_id = next((key for key, entry in self._entries.items()
+                               if key != keep and not self._pinned(key, entry)), None)
+            if session_id is None:
+                break
+            self._evict(session_id, 'memory')
+        if self.total_bytes > self.max_bytes:
+            self.logger.warning(f"Session {keep} and resident or unsaved indexes exceed the memory budget "
+                                f"({self.total_bytes} > {self.max_bytes} bytes)")
+
+    def _pinned(self, session_id: str, entry: dict) -> bool:
+        return self.resident(session_id) or is_dirty(entry['vectorstore'])
+
+    def _evict(self, session_id: str, reason: str):
+        entry = self._entries.pop(session_id)
+        self.total_bytes -= entry['bytes']
+        self.evictions[reason] += 1
+        self.logger.info(f"Evicted session {session_id} from memory ({reason}, {entry['bytes']} bytes)")
+
+    def sizes(self) -> Dict[str, dict]:
+        """Get the vector count and accounted bytes of every in-memory session"""
+        with self._lock:
+            return {
+                session_id: {'vectors': entry['vectorstore'].index.ntotal, 'bytes': entry['bytes']}
+                for session_id, entry in self._entries.items()
+            }
+
+    def stats(self) -> dict:
+        """Get occupancy and eviction metrics"""
+        with self._lock:
+            return {
+                'sessions': len(self._entries),
+                'resident': sum(1 for key in self._entries if self.resident(key)),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'idle_ttl': self.idle_ttl,
+                'unsaved': sum(1 for entry in self._entries.values() if is_dirty(entry['vectorstore'])),
+                'evictions': dict(self.evictions)
+            }
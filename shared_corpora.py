@@ -0,0 +1,157 @@
+import os
+import re
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+# Corpus indexes are stored and cached like session indexes under this reserved prefix;
+# session ids are UUIDs, so the two can never collide
+CORPUS_PREFIX = 'corpus.'
+
+_CORPUS_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def corpus_key(name: str) -> str:
+    """Index key of a corpus"""
+    if not _CORPUS_NAME_PATTERN.match(name or ''):
+        raise ValueError(f"Invalid corpus name: {name}")
+    return CORPUS_PREFIX + name
+
+
+def is_corpus_key(key: str) -> bool:
+    return key.startswith(CORPUS_PREFIX)
+
+
+def corpus_name(key: str) -> str:
+    """Name of the corpus indexed under a corpus key"""
+    return key[len(CORPUS_PREFIX):]
+
+
+class CorpusRegistry:
+    """
+    Registry of shared document corpora and the sessions attached to them
+    A corpus is indexed once, under corpus_key(name), and searched by every session
+    attached to it instead of being copied into each session. Names and attachments
+    are kept in SQLite so that every worker process sees the same state, along
+    with a version per corpus that changes whenever documents are added to it or it
+    is recreated, so workers know when their resident copy of its index is stale.
+    """
+
+    def __init__(self, root: str):
+        self.logger = logging.getLogger(__name__)
+        self.root = os.path.join(root, 'corpora')
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(self.root, 'corpora.sqlite3'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS corpora (
+                name TEXT PRIMARY KEY,
+                description TEXT NOT NULL,
+                created REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS attachments (
+                session_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                PRIMARY KEY (session_id, name)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_attachments_name ON attachments(name)")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(corpora)").fetchall()]
+        if 'version' not in columns:
+            # Registries created before corpora were versioned
+            self._conn.execute("ALTER TABLE corpora ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+
+    def create(self, name: str, description: str = '') -> bool:
+        """
+        Register a corpus
+
+        Returns:
+            True if the corpus is new, False if it already existed
+        """
+        corpus_key(name)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO corpora (name, description, created, version) VALUES (?, ?, ?, ?)",
+                (name, description, time.time(), uuid.uuid4().hex)
+            )
+            self._conn.commit()
+        if cursor.rowcount:
+            self.logger.info(f"Created shared corpus {name}")
+        return bool(cursor.rowcount)
+
+    def exists(self, name: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM corpora WHERE name = ?", (name,)).fetchone() is not None
+
+    def bump(self, name: str) -> Optional[str]:
+        """
+        Give a corpus a new version after documents were added to it
+
+        Returns:
+            The new version, or None if the corpus no longer exists
+        """
+        version = uuid.uuid4().hex
+        with self._lock:
+            cursor = self._conn.execute("UPDATE corpora SET version = ? WHERE name = ?", (version, name))
+            self._conn.commit()
+        return version if cursor.rowcount else None
+
+    def list_corpora(self) -> List[dict]:
+        """Get every corpus with its number of attached sessions"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT c.name, c.description, c.created, COUNT(a.session_id)
+                   FROM corpora c LEFT JOIN attachments a ON a.name = c.name
+                   GROUP BY c.name ORDER BY c.name"""
+            ).fetchall()
+        return [{'name': name, 'description': description, 'created': created, 'sessions': sessions}
+                for name, description, created, sessions in rows]
+
+    def delete(self, name: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM attachments WHERE name = ?", (name,))
+            self._conn.execute("DELETE FROM corpora WHERE name = ?", (name,))
+            self._conn.commit()
+        self.logger.info(f"Deleted shared corpus {name}")
+
+    def attach(self, session_id: str, name: str):
+        if not self.exists(name):
+            raise ValueError(f"Unknown corpus: {name}")
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO attachments (session_id, name) VALUES (?, ?)",
+                               (session_id, name))
+            self._conn.commit()
+
+    def detach(self, session_id: str, name: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM attachments WHERE session_id = ? AND name = ?", (session_id, name))
+            self._conn.commit()
+
+    def detach_session(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM attachments WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def attached(self, session_id: str) -> List[str]:
+        """Names of the corpora a session searches, in name order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM attachments WHERE session_id = ? ORDER BY name", (session_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def attached_versions(self, session_id: str) -> List[Tuple[str, str]]:
+        """(name, version) of the corpora a session searches, in name order"""
+        with self._lock:
+            return self._conn.execute(
+                """SELECT c.name, c.version FROM attachments a JOIN corpora c ON c.name = a.name
+                   WHERE a.session_id = ? ORDER BY c.name""", (session_id,)
+            ).fetchall()
@@ -132,15 +132,20 @@ class InsightGenie {
                 body: formData
             });
 
-            const result = await response.json();
+            let result = await response.json();
 
-            if (response.ok) {
-                this.displayUploadResults(result);
-                this.enableChatInterface(result.success_count > 0);
-                this.showToast(result.message, result.success_count > 0 ? 'success' : 'warning');
-            } else {
+            if (!response.ok) {
                 throw new Error(result.error || 'Upload failed');
             }
+
+            // Files are processed in the background; poll until the job is done
+            if (result.job_id) {
+                result = await this.waitForUploadJob(result);
+            }
+
+            this.displayUploadResults(result);
+            this.enableChatInterface(result.success_count > 0);
+            this.showToast(result.message, result.success_count > 0 ? 'success' : 'warning');
         } catch (error) {
             console.error('Upload error:', error);
             this.showToast(`Upload failed: ${error.message}`, 'error');
@@ -149,6 +154,32 @@ class InsightGenie {
         }
     }
 
+    // Poll an upload job until all of its files are processed
+    async waitForUploadJob(job) {
+        const progressBar = document.querySelector('#uploadProgress .progress-bar');
+
+        while (!job.done) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+
+            const response = await fetch(`/upload_status/${job.job_id}`);
+            const status = await response.json();
+            if (!response.ok) {
+                throw new Error(status.error || 'Could not get upload status');
+            }
+            job = status;
+
+            // Replace the simulated progress with the real one
+            if (this.uploadInterval) {
+                clearInterval(this.uploadInterval);
+                this.uploadInterval = null;
+            }
+            const progress = job.files.reduce((sum, file) => sum + (file.progress || 0), 0) / Math.max(job.files.length, 1);
+            progressBar.style.width = Math.min(progress * 100, 99) + '%';
+        }
+
+        return job;
+    }
+
     // Display upload progress
     showUploadProgress() {
         const progressContainer = document.getElementById('uploadProgress');
@@ -0,0 +1,247 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from shared_corpora import is_corpus_key
+from index_tombstone import read_tombstone
+from upload_store import UploadStore, directory_size
+from upload_spool import SPOOL_SUFFIX
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; every worker then sweeps on its own
+    fcntl = None
+
+LOCK_FILE = '.janitor.lock'
+
+
+class StorageJanitor:
+    """
+    Background expiry of abandoned sessions' uploads and saved indexes
+    A session is abandoned once its last activity (an upload, a request touching
+    its upload directory or a save of its index) is older than max_age. While the
+    sessions' files together exceed quota_bytes, the least recently active
+    sessions idle for at least min_idle are expired as well, oldest first.
+    Shared corpora are never expired. A lock file lets one worker process sweep
+    at a time. Expired indexes leave a tombstone that tells the other workers to
+    drop their copies; tombstones older than tombstone_ttl are purged.
+    """
+
+    def __init__(self, upload_store: UploadStore, index_root: str, expire: Callable[[str], None],
+                 max_age: float = 7 * 24 * 3600, quota_bytes: int = 0, min_idle: float = 3600,
+                 interval: float = 3600, purge: Optional[Callable[[str, float], bool]] = None,
+                 tombstone_ttl: float = 24 * 3600):
+        """
+        Args:
+            upload_store: Per-session upload directories
+            index_root: Folder holding the saved index of each session
+            expire: Deletes everything stored for a session
+            max_age: Seconds of inactivity after which a session is expired (0 disables)
+            quota_bytes: Disk budget of all sessions' uploads and indexes (0 disables)
+            min_idle: Seconds of inactivity before a session may be expired for the quota
+            interval: Seconds between sweeps of the background thread
+            purge: Removes a deleted index's tombstone older than the given seconds
+            tombstone_ttl: Seconds a deleted index's tombstone is kept
+        """
+        self.logger = logging.getLogger(__name__)
+        self.upload_store = upload_store
+        self.index_root = index_root
+        self.expire = expire
+        self.max_age = max_age
+        self.quota_bytes = quota_bytes
+        self.min_idle = min_idle
+        self.interval = interval
+        self.purge = purge
+        self.tombstone_ttl = tombstone_ttl
+        self.runs = 0
+        self.expired_sessions = 0
+        self.reclaimed = {'age': 0, 'quota': 0, 'stray': 0}
+        self.last_report: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Sweep every interval on a daemon thread; the first sweep waits one interval"""
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run_forever, name='storage-janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_forever(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run()
+            except Exception as e:
+                self.logger.error(f"Error sweeping storage: {str(e)}")
+
+    def run(self) -> dict:
+        """
+        Sweep once
+
+        Returns:
+            Report with the sessions expired, bytes reclaimed per reason and the usage left
+        """
+        lock_file = self._acquire()
+        if lock_file is False:
+            return {'skipped': True, 'reason': 'another worker is sweeping'}
+        try:
+            with self._lock:
+                return self._sweep()
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    def _acquire(self):
+        """Lock file held for the sweep, None without fcntl, or False when another process holds it"""
+        if fcntl is None:
+            return None
+        lock_file = open(os.path.join(self.upload_store.root, LOCK_FILE), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except OSError:
+            lock_file.close()
+            return False
+
+    def _sweep(self) -> dict:
+        started = time.monotonic()
+        now = time.time()
+        reclaimed = {'age': 0, 'quota': 0, 'stray': 0}
+        expired = 0
+
+        sessions, tombstones = self._scan()
+        for session_id, info in sorted(sessions.items(), key=lambda item: item[1]['last_activity']):
+            if self.max_age and now - info['last_activity'] > self.max_age:
+                reclaimed['age'] += self._expire(session_id, info['bytes'])
+                expired += 1
+                info['expired'] = True
+
+        usage = sum(info['bytes'] for info in sessions.values() if not info.get('expired'))
+        if self.quota_bytes and usage > self.quota_bytes:
+            for session_id, info in sorted(sessions.items(), key=lambda item: item[1]['last_activity']):
+                if usage <= self.quota_bytes:
+                    break
+                if info.get('expired') or now - info['last_activity'] < self.min_idle:
+                    continue
+                freed = self._expire(session_id, info['bytes'])
+                reclaimed['quota'] += freed
+                usage -= info['bytes']
+                expired += 1
+            if usage > self.quota_bytes:
+                self.logger.warning(f"Session storage ({usage} bytes) exceeds the quota ({self.quota_bytes} bytes) "
+                                    f"with only recently active sessions left")
+
+        reclaimed['stray'] = self._sweep_stray_files(now)
+        purged = self._purge_tombstones(tombstones, now)
+
+        report = {
+            'expired_sessions': expired,
+            'reclaimed_bytes': sum(reclaimed.values()),
+            'reclaimed_by_reason': reclaimed,
+            'usage_bytes': usage,
+            'sessions': len(sessions) - expired,
+            'purged_tombstones': purged,
+            'seconds': round(time.monotonic() - started, 3),
+            'time': now
+        }
+        self.runs += 1
+        self.expired_sessions += expired
+        for reason, size in reclaimed.items():
+            self.reclaimed[reason] += size
+        self.last_report = report
+        if expired or reclaimed['stray']:
+            self.logger.info(f"Storage sweep expired {expired} sessions and reclaimed {report['reclaimed_bytes']} bytes")
+        return report
+
+    def _scan(self) -> Tuple[Dict[str, dict], Dict[str, float]]:
+        """Last activity and bytes on disk of every session with uploads or a saved index, and deletion times of expired indexes"""
+        try:
+            indexed = [name for name in os.listdir(self.index_root)
+                       if os.path.isdir(os.path.join(self.index_root, name))]
+        except OSError:
+            indexed = []
+
+        sessions = {}
+        tombstones = {}
+        for session_id in set(self.upload_store.owners()) | set(indexed):
+            if is_corpus_key(session_id):
+                continue
+            index_dir = os.path.join(self.index_root, session_id)
+            activity = [self.upload_store.last_activity(session_id)]
+            size = 0
+            if os.path.isdir(index_dir):
+                tombstone = read_tombstone(index_dir)
+                if tombstone is not None:
+                    # Deleted already; the tombstone is not activity
+                    tombstones[session_id] = tombstone['time']
+                else:
+                    activity.append(os.path.getmtime(index_dir))
+                size += directory_size(index_dir)
+            upload_dir = self.upload_store.owner_dir(session_id)
+            if os.path.isdir(upload_dir):
+                size += directory_size(upload_dir)
+            activity = [moment for moment in activity if moment is not None]
+            if activity:
+                sessions[session_id] = {'last_activity': max(activity), 'bytes': size}
+        return sessions, tombstones
+
+    def _expire(self, session_id: str, size: int) -> int:
+        try:
+            self.expire(session_id)
+        except Exception as e:
+            self.logger.error(f"Error expiring session {session_id}: {str(e)}")
+        remaining = directory_size(os.path.join(self.index_root, session_id))
+        remaining += directory_size(self.upload_store.owner_dir(session_id))
+        self.logger.info(f"Expired stored files of session {session_id} ({size - remaining} bytes)")
+        return max(0, size - remaining)
+
+    def _purge_tombstones(self, tombstones: Dict[str, float], now: float) -> int:
+        """Remove tombstones old enough that no worker can still save an index they deleted"""
+        if self.purge is None:
+            return 0
+        purged = 0
+        for session_id, deleted in tombstones.items():
+            if now - deleted < self.tombstone_ttl:
+                continue
+            try:
+                purged += bool(self.purge(session_id, self.tombstone_ttl))
+            except Exception as e:
+                self.logger.error(f"Error purging tombstone of session {session_id}: {str(e)}")
+        return purged
+
+    def _sweep_stray_files(self, now: float) -> int:
+        """Delete loose files in the upload root: spools of interrupted requests and pre-directory uploads"""
+        reclaimed = 0
+        try:
+            names = os.listdir(self.upload_store.root)
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.upload_store.root, name)
+            if name == LOCK_FILE or not os.path.isfile(path):
+                continue
+            try:
+                age = now - os.path.getmtime(path)
+                limit = self.min_idle if name.endswith(SPOOL_SUFFIX) else self.max_age
+                if limit and age > limit:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    reclaimed += size
+            except OSError:
+                continue
+        return reclaimed
+
+    def stats(self) -> dict:
+        return {
+            'runs': self.runs,
+            'expired_sessions': self.expired_sessions,
+            'reclaimed_bytes': dict(self.reclaimed),
+            'max_age': self.max_age,
+            'quota_bytes': self.quota_bytes,
+            'last_run': self.last_report
+        }
@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+import metrics
+
+# Rough characters-per-token ratio for English text
+CHARS_PER_TOKEN = 4
+
+MAP_PROMPT = PromptTemplate.from_template(
+    """You are summarizing one section of a larger document. Write a concise summary of this section
+    that keeps every key fact, figure, name, date and conclusion. Do not add information.
+
+    Section: {text}
+
+    Section summary:"""
+)
+
+REDUCE_PROMPT = PromptTemplate.from_template(
+    """The following are summaries of consecutive sections of a larger document. Combine them into a
+    single concise summary that keeps every key fact, figure, name, date and conclusion, in order.
+
+    Section summaries: {text}
+
+    Combined summary:"""
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class MapReduceSummarizer:
+    """
+    Hierarchical map-reduce summarization for texts larger than one LLM context window
+    Chunks are grouped into token-budgeted windows and summarized in parallel, then the
+    partial summaries are reduced recursively until they fit into a single final prompt.
+    Partial summaries are cached by content hash so unchanged windows are never redone.
+    """
+
+    def __init__(self, llm, window_tokens: int = 3000, max_workers: int = 4,
+                 cache_size: int = 2048, max_depth: int = 6):
+        self.logger = logging.getLogger(__name__)
+        self.llm = llm
+        self.window_tokens = window_tokens
+        self.max_workers = max(1, max_workers)
+        self.cache_size = cache_size
+        self.max_depth = max_depth
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='summarize')
+
+    def summarize(self, chunks: List[str], final_prompt: PromptTemplate, final_inputs: Optional[dict] = None,
+                  groups: Optional[List[str]] = None) -> str:
+        """
+        Summarize a sequence of chunks
+
+        Args:
+            chunks: Text chunks in document order
+            final_prompt: Prompt with a {text} variable used for the last, user-facing summary
+            final_inputs: Extra variables for the final prompt
+            groups: Optional group key per chunk (e.g. source file); windows never span groups,
+                    so adding a document leaves the cached windows of the others intact
+
+        Returns:
+            Summary text
+        """
+        partials = self.reduce_to_fit(chunks, groups)
+        with metrics.span('summarizer', 'final'):
+            return self.final_chain(final_prompt).invoke({**(final_inputs or {}), 'text': "\n\n".join(partials)})
+
+    def reduce_to_fit(self, chunks: List[str], groups: Optional[List[str]] = None) -> List[str]:
+        """Map and reduce chunks until their combined text fits within one window"""
+        texts = [chunk for chunk in chunks if chunk and chunk.strip()]
+        if groups is not None:
+            groups = [group for chunk, group in zip(chunks, groups) if chunk and chunk.strip()]
+
+        depth = 0
+        prompt = MAP_PROMPT
+        while estimate_tokens("\n\n".join(texts)) > self.window_tokens:
+            if depth >= self.max_depth:
+                self.logger.warning(f"Summary reduction stopped at depth {depth}; truncating input")
+                return ["\n\n".join(texts)[:self.window_tokens * CHARS_PER_TOKEN]]
+
+            windows = self._build_windows(texts, groups)
+            self.logger.info(f"Summarizing {len(texts)} parts in {len(windows)} windows (depth {depth})")
+            texts = list(self.executor.map(lambda window: self._summarize_cached(prompt, window), windows))
+            groups = None
+            prompt = REDUCE_PROMPT
+            depth += 1
+
+        return texts
+
+    def final_chain(self, final_prompt: PromptTemplate):
+        return final_prompt | self.llm | StrOutputParser()
+
+    def _build_windows(self, texts: List[str], groups: Optional[List[str]]) -> List[str]:
+        """Greedily pack consecutive texts into windows of at most window_tokens"""
+        budget = self.window_tokens * CHARS_PER_TOKEN
+        windows: List[str] = []
+        current: List[str] = []
+        current_size = 0
+        current_group = None
+
+        for position, text in enumerate(texts):
+            group = groups[position] if groups is not None else None
+            # A single oversize text is hard-split so every window fits the budget
+            pieces = [text[i:i + budget] for i in range(0, len(text), budget)] or [text]
+            for piece in pieces:
+                if current and (current_size + len(piece) + 2 > budget or group != current_group):
+                    windows.append("\n\n".join(current))
+                    current, current_size = [], 0
+                current.append(piece)
+                current_size += len(piece) + 2
+                current_group = group
+
+        if current:
+            windows.append("\n\n".join(current))
+        return windows
+
+    def _summarize_cached(self, prompt: PromptTemplate, text: str) -> str:
+        key = hashlib.sha256(f"{prompt.template}\x00{text}".encode('utf-8')).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return self._cache[key]
+            self.cache_misses += 1
+
+        with metrics.span('summarizer', 'map' if prompt is MAP_PROMPT else 'reduce'):
+            summary = (prompt | self.llm | StrOutputParser()).invoke({'text': text})
+
+        with self._lock:
+            self._cache[key] = summary
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return summary
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'cached_partials': len(self._cache),
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses
+            }
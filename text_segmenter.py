@@ -0,0 +1,162 @@
+"""
+Sentence-aware segmentation of text for translation
+Text is cut at line breaks and sentence boundaries, and sentences are packed into
+segments up to a byte limit. The whitespace between segments is kept aside so the
+translated segments can be put back together with the original layout.
+"""
+import re
+from typing import Iterator, Iterable, Tuple, List, Optional
+
+# Line breaks, sentence-final punctuation (optionally followed by a closing quote or
+# bracket) with the whitespace after it, and CJK full stops, which need no space after
+# them. The pattern starts with a single character class so the scan stays fast.
+BOUNDARY = re.compile(
+    r'[.!?…।॥؟۔。！？\n]'
+    r'(?:(?<=\n)(\s*)'
+    r'|(?<=[.!?…।॥؟۔])["\'”’»)\]]?(\s+)'
+    r'|(?<=[。！？])[」』”’）]?(\s*))'
+)
+WORD = re.compile(r'(\S+)(\s*)')
+
+
+def _byte_length(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def _split_oversize(sentence: str, max_bytes: int) -> Iterator[Tuple[str, int, str]]:
+    """Break a sentence longer than the limit into words, and words into byte-limited pieces"""
+    for match in WORD.finditer(sentence):
+        word, separator = match.groups()
+        data = word.encode('utf-8')
+        if len(data) <= max_bytes:
+            yield word, len(data), separator
+            continue
+        start = 0
+        while start < len(data):
+            end = min(len(data), start + max_bytes)
+            # Back off to the start of a UTF-8 character
+            while end < len(data) and (data[end] & 0xC0) == 0x80:
+                end -= 1
+            yield data[start:end].decode('utf-8'), end - start, separator if end == len(data) else ''
+            start = end
+
+
+def _iter_units(text: str, start: int, max_bytes: int) -> Iterator[Tuple[str, int, str]]:
+    """Yield (sentence, byte length, following whitespace) for each sentence of the text"""
+    position = start
+    for match in BOUNDARY.finditer(text, start):
+        # The line break itself is part of the separator, punctuation ends the sentence
+        boundary = match.start() if match.lastindex == 1 else match.start(match.lastindex)
+        # Whitespace before a line break belongs to the separator
+        sentence = text[position:boundary].rstrip()
+        separator = text[position + len(sentence):match.end()]
+        position = match.end()
+        if not sentence:
+            if separator:
+                yield '', 0, separator
+            continue
+        size = _byte_length(sentence)
+        if size > max_bytes:
+            yield from _split_oversize(sentence, max_bytes)
+            yield '', 0, separator
+        else:
+            yield sentence, size, separator
+
+    if position < len(text):
+        sentence = text[position:].rstrip()
+        trailing = text[position + len(sentence):]
+        size = _byte_length(sentence)
+        if size > max_bytes:
+            yield from _split_oversize(sentence, max_bytes)
+            yield '', 0, trailing
+        else:
+            yield sentence, size, trailing
+
+
+def iter_segments(text: str, max_bytes: int) -> Iterator[Tuple[str, str]]:
+    """
+    Split text into translatable segments
+
+    Segments never contain a line break and never exceed max_bytes of UTF-8.
+    Joining every prefix and segment in order gives back the original text.
+
+    Args:
+        text: Text to split
+        max_bytes: Maximum UTF-8 size of one segment
+
+    Returns:
+        Iterator of (whitespace before the segment, segment); the last pair may
+        carry only trailing whitespace with an empty segment
+    """
+    leading = len(text) - len(text.lstrip())
+    prefix = text[:leading]
+    gap = ''
+    parts: List[str] = []
+    total = 0
+
+    for sentence, size, separator in _iter_units(text, leading, max_bytes):
+        if not sentence:
+            gap += separator
+            continue
+        if parts:
+            gap_size = _byte_length(gap)
+            if '\n' in gap or total + gap_size + size > max_bytes:
+                yield prefix, ''.join(parts)
+                prefix, parts, total = gap, [], 0
+            else:
+                parts.append(gap)
+                total += gap_size
+        else:
+            prefix += gap
+        parts.append(sentence)
+        total += size
+        gap = separator
+
+    if parts:
+        yield prefix, ''.join(parts)
+        prefix = gap
+    if prefix:
+        yield prefix, ''
+
+
+def iter_stream_segments(pieces: Iterable[str], max_bytes: int,
+                         buffer_chars: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Segment text that arrives in pieces, holding at most about buffer_chars at a time
+
+    The pieces are treated as one continuous text: the last segment of each buffer is
+    carried over, so sentences that straddle two pieces are not cut at the seam.
+
+    Args:
+        pieces: Consecutive pieces of the text
+        max_bytes: Maximum UTF-8 size of one segment
+        buffer_chars: Characters gathered before segmenting (defaults to 8 segments' worth)
+
+    Returns:
+        Iterator of (whitespace before the segment, segment), as from iter_segments
+    """
+    buffer_chars = buffer_chars or max_bytes * 8
+    buffer: List[str] = []
+    buffered = 0
+
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered < buffer_chars:
+            continue
+
+        last = None
+        for pair in iter_segments(''.join(buffer), max_bytes):
+            if last is not None:
+                yield last
+            last = pair
+        buffer = [last[0] + last[1]] if last else []
+        buffered = len(buffer[0]) if buffer else 0
+
+    if buffer:
+        yield from iter_segments(''.join(buffer), max_bytes)
+
+
+def reassemble(prefixes: List[str], segments: List[str]) -> str:
+    """Join translated segments back with the whitespace that surrounded the originals"""
+    return ''.join(prefix + segment for prefix, segment in zip(prefixes, segments))
@@ -0,0 +1,70 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class TranslationCache:
+    """
+    Bounded LRU cache of translated segments keyed by (source, target, segment hash)
+    Size is bounded both by entry count and by the total characters held
+    """
+
+    def __init__(self, max_entries: int = 20000, max_chars: int = 20 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.total_chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(source: str, target: str, segment: str) -> tuple:
+        return source, target, hashlib.sha256(segment.encode('utf-8')).hexdigest()
+
+    def get_many(self, source: str, target: str, segments: List[str]) -> Dict[str, str]:
+        """Look up translations; returns segment -> translation for every hit"""
+        found: Dict[str, str] = {}
+        with self._lock:
+            for segment in dict.fromkeys(segments):
+                key = self.make_key(source, target, segment)
+                translation = self._entries.get(key)
+                if translation is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[segment] = translation
+                self.hits += 1
+        return found
+
+    def get(self, source: str, target: str, segment: str) -> Optional[str]:
+        return self.get_many(source, target, [segment]).get(segment)
+
+    def put_many(self, source: str, target: str, translations: Dict[str, str]):
+        with self._lock:
+            for segment, translation in translations.items():
+                key = self.make_key(source, target, segment)
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self.total_chars -= len(previous)
+                self._entries[key] = translation
+                self.total_chars += len(translation)
+
+            while self._entries and (len(self._entries) > self.max_entries or self.total_chars > self.max_chars):
+                _, evicted = self._entries.popitem(last=False)
+                self.total_chars -= len(evicted)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'chars': self.total_chars,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions
+            }
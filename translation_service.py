@@ -1,14 +1,49 @@
+import os
 import logging
-from deep_translator import GoogleTranslator
-from typing import Optional
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Callable, Iterable, Iterator, Tuple
+from translation_cache import TranslationCache
+from text_segmenter import iter_segments, iter_stream_segments, reassemble
+import metrics
+
+TRANSLATION_MAX_BYTES = 4000  # Stays under the Google Translate request limit
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.environ.get('TRANSLATION_CACHE_MAX_ENTRIES', 20000))
+TRANSLATION_CACHE_MAX_CHARS = int(os.environ.get('TRANSLATION_CACHE_MAX_CHARS', 20 * 1024 * 1024))
+TRANSLATION_MAX_WORKERS = int(os.environ.get('TRANSLATION_MAX_WORKERS', 4))
+# Separator used to pack several short segments into one request
+BATCH_SEPARATOR = '\n'
+# Windows of segments in flight per streamed document translation, per worker
+STREAM_WINDOWS_PER_WORKER = 2
+
+def google_translator(**kwargs):
+    """Default translator factory; deep-translator is imported on the first translation"""
+    from deep_translator import GoogleTranslator
+    return GoogleTranslator(**kwargs)
+
 
 class TranslationService:
     """
     Translation service using Google Translator (free)
+    Translated segments are cached per language pair, and cache misses are packed
+    into batched requests sent concurrently on a bounded pool.
     """
     
-    def __init__(self):
+    def __init__(self, translator_factory: Optional[Callable] = None, max_workers: int = TRANSLATION_MAX_WORKERS,
+                 max_bytes: int = TRANSLATION_MAX_BYTES, cache: Optional[TranslationCache] = None):
         self.logger = logging.getLogger(__name__)
+        self.translator_factory = translator_factory or google_translator
+        self.max_bytes = max_bytes
+        self.cache = cache or TranslationCache(TRANSLATION_CACHE_MAX_ENTRIES, TRANSLATION_CACHE_MAX_CHARS)
+        self.max_workers = max(1, max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='translate')
+        self.requests_sent = 0
+        self.batch_fallbacks = 0
+        # Translator instances per pool thread (see _get_translator)
+        self._local = threading.local()
+        self._language_pairs = set()
+        self._lock = threading.Lock()
         
         # Language mappings (Google Translate language codes) - Extended support
         self.languages = {
@@ -69,31 +104,15 @@ class TranslationService:
             if source_code == target_code:
                 return text
             
-            # Use Google Translator (free)
-            translator = GoogleTranslator(source=source_code, target=target_code)
-            
-            # Split long text into chunks if necessary
-            max_length = 4000  # Google Translate API limit
-            if len(text) <= max_length:
-                translated_text = translator.translate(text)
-            else:
-                # Split text into sentences and translate in chunks
-                sentences = text.split('. ')
-                translated_chunks = []
-                current_chunk = ""
-                
-                for sentence in sentences:
-                    if len(current_chunk + sentence) <= max_length:
-                        current_chunk += sentence + ". "
-                    else:
-                        if current_chunk:
-                            translated_chunks.append(translator.translate(current_chunk.strip()))
-                        current_chunk = sentence + ". "
-                
-                if current_chunk:
-                    translated_chunks.append(translator.translate(current_chunk.strip()))
-                
-                translated_text = " ".join(translated_chunks)
+            # Split at paragraphs and sentences, keeping the whitespace between segments
+            prefixes = []
+            segments = []
+            with metrics.span('translation_service', 'segment'):
+                for prefix, segment in iter_segments(text, self.max_bytes):
+                    prefixes.append(prefix)
+                    segments.append(segment)
+
+            translated_text = reassemble(prefixes, self.translate_segments(segments, source_code, target_code))
             
             self.logger.info(f"Successfully translated text from {source_language} to {target_language}")
             return translated_text
@@ -102,6 +121,195 @@ class TranslationService:
             self.logger.error(f"Translation error: {str(e)}")
             return f"Translation error: {str(e)}"
     
+    def translate_segments(self, segments: List[str], source_code: str, target_code: str) -> List[str]:
+        """
+        Translate segments between language codes, reusing cached translations
+
+        Args:
+            segments: Text segments, each within the request byte limit
+            source_code: Source language code
+            target_code: Target language code
+
+        Returns:
+            Translated segments in input order
+        """
+        return self._collect(segments, *self._submit(segments, source_code, target_code), source_code, target_code)
+
+    def resolve_languages(self, source_language: str, target_language: str) -> Tuple[str, str]:
+        """
+        Map language names to codes
+
+        Raises:
+            ValueError: If either language is not supported
+        """
+        if source_language not in self.languages:
+            raise ValueError(f"Unsupported source language: {source_language}")
+        if target_language not in self.languages:
+            raise ValueError(f"Unsupported target language: {target_language}")
+        return self.languages[source_language], self.languages[target_language]
+
+    def translate_stream(self, pieces: Iterable[str], source_language: str, target_language: str) -> Iterator[dict]:
+        """
+        Translate a long text that arrives in pieces, yielding translated text in order
+
+        Segments are translated concurrently in windows of about one request each, and
+        only a bounded number of windows is held at a time, so memory does not grow
+        with the document.
+
+        Args:
+            pieces: Consecutive pieces of the text; joined they form the full text
+            source_language: Source language name
+            target_language: Target language name
+
+        Yields:
+            Dicts with the next translated 'text' (original whitespace included) and the
+            running 'segments' and source 'chars' counts
+        """
+        source_code, target_code = self.resolve_languages(source_language, target_language)
+        max_pending = self.max_workers * STREAM_WINDOWS_PER_WORKER
+        pending = deque()
+        progress = {'segments': 0, 'chars': 0}
+
+        def submit(window):
+            segments = [segment for _, segment in window]
+            if source_code == target_code:
+                pending.append((window, {segment: segment for segment in segments}, []))
+            else:
+                pending.append((window, *self._submit(segments, source_code, target_code)))
+
+        def complete():
+            window, translations, futures = pending.popleft()
+            segments = [segment for _, segment in window]
+            translated = self._collect(segments, translations, futures, source_code, target_code)
+            progress['segments'] += sum(1 for segment in segments if segment)
+            progress['chars'] += sum(len(prefix) + len(segment) for prefix, segment in window)
+            return {'text': reassemble([prefix for prefix, _ in window], translated), **progress}
+
+        window = []
+        window_bytes = 0
+        for prefix, segment in iter_stream_segments(pieces, self.max_bytes):
+            window.append((prefix, segment))
+            window_bytes += len(segment.encode('utf-8')) + len(BATCH_SEPARATOR)
+            if window_bytes < self.max_bytes:
+                continue
+            submit(window)
+            window = []
+            window_bytes = 0
+            if len(pending) >= max_pending:
+                yield complete()
+
+        if window:
+            submit(window)
+        while pending:
+            yield complete()
+
+    def _submit(self, segments: List[str], source_code: str, target_code: str):
+        """Look segments up in the cache and start translating the misses"""
+        with metrics.span('translation_service', 'cache_lookup'):
+            translations = self.cache.get_many(source_code, target_code, segments)
+        misses = [segment for segment in dict.fromkeys(segments)
+                  if segment not in translations and segment.strip()]
+
+        futures = []
+        if misses:
+            futures = [self.executor.submit(self._translate_batch, source_code, target_code, batch)
+                       for batch in self._pack_batches(misses)]
+        return translations, futures
+
+    def _collect(self, segments: List[str], translations: Dict[str, str], futures: list,
+                 source_code: str, target_code: str) -> List[str]:
+        """Wait for submitted batches, cache their results and order the translations"""
+        new_translations = {}
+        with metrics.span('translation_service', 'wait'):
+            for future in futures:
+                new_translations.update(future.result())
+        if new_translations:
+            self.cache.put_many(source_code, target_code, new_translations)
+            translations.update(new_translations)
+
+        return [translations.get(segment, segment) for segment in segments]
+
+    def _get_translator(self, source_code: str, target_code: str):
+        """
+        Reuse one translator instance per language pair and thread
+        deep-translator keeps each request's text in the instance's URL parameters,
+        so an instance shared by pool threads can send one batch with another's text
+        """
+        translators = getattr(self._local, 'translators', None)
+        if translators is None:
+            translators = self._local.translators = {}
+        translator = translators.get((source_code, target_code))
+        if translator is None:
+            translator = translators[(source_code, target_code)] = self.translator_factory(source=source_code, target=target_code)
+            with self._lock:
+                self._language_pairs.add((source_code, target_code))
+        return translator
+
+    def _pack_batches(self, segments: List[str]) -> List[List[str]]:
+        """Pack short single-line segments together up to the request byte limit"""
+        batches = []
+        current = []
+        current_bytes = 0
+        for segment in segments:
+            packable = BATCH_SEPARATOR not in segment
+            size = len(segment.encode('utf-8'))
+            if current and (not packable or current_bytes + len(BATCH_SEPARATOR) + size > self.max_bytes):
+                batches.append(current)
+                current = []
+                current_bytes = 0
+            if not packable:
+                batches.append([segment])
+                continue
+            current.append(segment)
+            current_bytes += size + (len(BATCH_SEPARATOR) if current_bytes else 0)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _translate_batch(self, source_code: str, target_code: str, batch: List[str]) -> Dict[str, str]:
+        translator = self._get_translator(source_code, target_code)
+        with metrics.span('translation_service', 'translate_request'):
+            return self._send_batch(translator, batch)
+
+    def _send_batch(self, translator, batch: List[str]) -> Dict[str, str]:
+        with self._lock:
+            self.requests_sent += 1
+        if len(batch) == 1:
+            return {batch[0]: translator.translate(batch[0])}
+
+        translated = translator.translate(BATCH_SEPARATOR.join(batch))
+        parts = translated.split(BATCH_SEPARATOR) if translated else []
+        if len(parts) == len(batch):
+            return dict(zip(batch, parts))
+
+        # The service merged or split lines, so the segments go one request each
+        with self._lock:
+            self.batch_fallbacks += 1
+            self.requests_sent += len(batch)
+        return {segment: translator.translate(segment) for segment in batch}
+
+    def get_stats(self) -> dict:
+        """Get translation cache and request metrics"""
+        with self._lock:
+            return {
+                'cache': self.cache.stats(),
+                'requests_sent': self.requests_sent,
+                'batch_fallbacks': self.batch_fallbacks,
+                'language_pairs': len(self._language_pairs)
+            }
+
+    def metric_samples(self) -> List[tuple]:
+        """Cache and request metrics, read at scrape time (see metrics.register_collector)"""
+        stats = self.get_stats()
+        return [
+            ('cache_hits_total', 'counter', 'Cache lookups answered from the cache',
+             [({'cache': 'translation'}, stats['cache']['hits'])]),
+            ('cache_misses_total', 'counter', 'Cache lookups that fell through',
+             [({'cache': 'translation'}, stats['cache']['misses'])]),
+            ('translation_requests_total', 'counter', 'Requests sent to the translation service',
+             [({}, stats['requests_sent'])])
+        ]
+
     def get_supported_languages(self) -> dict:
         """Get dictionary of supported language codes and names"""
         return self.languages.copy()
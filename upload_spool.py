@@ -0,0 +1,203 @@
+import os
+import uuid
+import hashlib
+import threading
+from io import BytesIO
+from typing import Optional
+from flask import Request
+
+# Uploads up to this size stay in memory from the request parser to the document processor
+UPLOAD_MEMORY_LIMIT = int(os.environ.get('UPLOAD_MEMORY_LIMIT', 8 * 1024 * 1024))
+# Total bytes of uploads a worker holds in memory at once; uploads arriving past it go to disk
+UPLOAD_MEMORY_BUDGET = int(os.environ.get('UPLOAD_MEMORY_BUDGET', 64 * 1024 * 1024))
+SPOOL_SUFFIX = '.spool'
+
+
+class MemoryBudget:
+    """Bytes of uploads held in memory, shared by every request and ingestion thread of a worker"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size: int) -> bool:
+        with self._lock:
+            if self.used + size > self.limit:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size: int):
+        with self._lock:
+            self.used -= size
+
+
+memory_budget = MemoryBudget(UPLOAD_MEMORY_BUDGET)
+
+
+class SpooledUpload:
+    """
+    An uploaded file after the request has been parsed
+    Small files carry their bytes in data; larger ones were written once, to path.
+    Size and SHA-256 were computed while the request body was spooled, so neither
+    needs another read of the file. In-memory bytes count against a MemoryBudget
+    until they are released.
+    """
+
+    def __init__(self, filename: str, size: int, sha256: str, data: Optional[bytes] = None,
+                 path: Optional[str] = None, budget: Optional[MemoryBudget] = None, reserved: int = 0):
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.data = data
+        self.path = path
+        self.on_discard = None  # called once the file on disk has been deleted
+        self._budget = budget
+        self._reserved = reserved
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    def release(self):
+        """Drop the in-memory copy once it has been processed"""
+        self.data = None
+        self._release_memory()
+
+    def discard(self):
+        """Drop the in-memory copy and delete the file on disk, if any"""
+        self.data = None
+        self._release_memory()
+        if self.path is not None and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                return  # Ignore cleanup errors
+            if self.on_discard is not None:
+                self.on_discard()
+
+    def _release_memory(self):
+        if self._reserved:
+            self._budget.release(self._reserved)
+            self._reserved = 0
+
+
+class UploadSpool:
+    """
+    File object the request parser writes an uploaded file into
+    Every write updates the size and SHA-256; the bytes are kept in memory until
+    they exceed memory_limit, or the worker's memory budget is used up by other
+    uploads, and are then moved to a file in spool_dir, which claim() renames
+    into place instead of copying.
+    """
+
+    def __init__(self, spool_dir: str, memory_limit: int = UPLOAD_MEMORY_LIMIT,
+                 budget: Optional[MemoryBudget] = None):
+        self.spool_dir = spool_dir
+        self.memory_limit = memory_limit
+        self.budget = budget or memory_budget
+        self.size = 0
+        self.path = None
+        self._digest = hashlib.sha256()
+        self._file = BytesIO()
+        self._claimed = False
+        self._reserved = 0  # bytes counted against the budget while in memory
+
+    def write(self, data) -> int:
+        self._digest.update(data)
+        self.size += len(data)
+        if self.path is None:
+            if self.size <= self.memory_limit and self.budget.reserve(len(data)):
+                self._reserved += len(data)
+            else:
+                self._roll_over()
+        return self._file.write(data)
+
+    def _roll_over(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}{SPOOL_SUFFIX}")
+        disk_file = open(path, 'w+b')
+        disk_file.write(self._file.getbuffer())
+        self._file.close()
+        self._file = disk_file
+        self.path = path
+        self.budget.release(self._reserved)
+        self._reserved = 0
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def claim(self, filename: str, path: str) -> SpooledUpload:
+        """
+        Take ownership of the spooled bytes
+
+        Args:
+            filename: Original name of the uploaded file
+            path: Where a file that was spooled to disk is moved
+
+        Returns:
+            SpooledUpload holding the bytes or the path
+        """
+        self._claimed = True
+        if self.path is None:
+            # The reservation moves to the upload, which releases it once processed
+            reserved, self._reserved = self._reserved, 0
+            return SpooledUpload(filename, self.size, self.sha256, data=self._file.getvalue(),
+                                 budget=self.budget, reserved=reserved)
+        self._file.flush()
+        os.replace(self.path, path)
+        return SpooledUpload(filename, self.size, self.sha256, path=path)
+
+    def close(self):
+        self._file.close()
+        if self._reserved:
+            self.budget.release(self._reserved)
+            self._reserved = 0
+        # Spooled files nobody claimed (rejected or unused uploads) are not left behind
+        if self.path is not None and not self._claimed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __getattr__(self, attribute: str):
+        # read, seek, tell, readline... of the current backing file
+        return getattr(self._file, attribute)
+
+
+class SpoolingRequest(Request):
+    """Flask request whose uploaded files are parsed into UploadSpool objects"""
+
+    spool_dir = 'uploads'
+    memory_limit = UPLOAD_MEMORY_LIMIT
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(self.spool_dir, self.memory_limit)
+
+
+def spool_upload(file, path: str) -> SpooledUpload:
+    """
+    Claim an uploaded file (a werkzeug FileStorage)
+
+    Files parsed by SpoolingRequest are already spooled; any other stream is
+    spooled here in one pass.
+
+    Args:
+        file: Uploaded file
+        path: Where the file is kept if it is too large to stay in memory
+
+    Returns:
+        SpooledUpload
+    """
+    if isinstance(file.stream, UploadSpool):
+        return file.stream.claim(file.filename, path)
+
+    spool = UploadSpool(os.path.dirname(path) or '.')
+    try:
+        for block in iter(lambda: file.stream.read(1024 * 1024), b''):
+            spool.write(block)
+        return spool.claim(file.filename, path)
+    finally:
+        spool.close()
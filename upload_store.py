@@ -0,0 +1,164 @@
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import threading
+from typing import List, Optional
+from werkzeug.utils import secure_filename
+
+MANIFEST_FILE = 'manifest.jsonl'
+
+_OWNER_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+class UploadStore:
+    """
+    Uploaded files kept on disk, one directory per owner (session or corpus)
+    Each directory has an append-only manifest with one JSON line per file added
+    or removed, so an owner's files and bytes are known without listing other
+    owners' files. Appends are single writes, which keeps the manifest consistent
+    across worker processes. The manifest's modification time doubles as the
+    owner's last activity for the storage janitor.
+    """
+
+    def __init__(self, root: str, touch_interval: float = 300):
+        self.logger = logging.getLogger(__name__)
+        self.root = root
+        self.touch_interval = touch_interval
+        self._touched = {}  # owner_id -> monotonic time of the last touch by this process
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def owner_dir(self, owner_id: str) -> str:
+        if not _OWNER_ID_PATTERN.match(owner_id or '') or owner_id in ('.', '..'):
+            raise ValueError(f"Invalid upload owner: {owner_id}")
+        return os.path.join(self.root, owner_id)
+
+    def new_path(self, owner_id: str, filename: str) -> str:
+        """Unique path for a new upload of an owner; the directory is created"""
+        directory = self.owner_dir(owner_id)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{int(time.time() * 1000)}_{secure_filename(filename) or 'upload'}")
+
+    def record(self, owner_id: str, upload):
+        """Add a SpooledUpload kept on disk to its owner's manifest"""
+        if upload.path is None:
+            return
+        name = os.path.basename(upload.path)
+        self._append(owner_id, {'event': 'add', 'name': name, 'filename': upload.filename,
+                                'size': upload.size, 'sha256': upload.sha256, 'time': time.time()})
+        # Ingestion deletes failed and deduplicated uploads through discard()
+        upload.on_discard = lambda: self._append(owner_id, {'event': 'remove', 'name': name, 'time': time.time()})
+
+    def files(self, owner_id: str) -> List[dict]:
+        """Manifest entries of an owner's files that are still present, oldest first"""
+        entries = {}
+        for entry in self._read(owner_id):
+            if entry.get('event') == 'add':
+                entries[entry['name']] = entry
+            elif entry.get('event') == 'remove':
+                entries.pop(entry.get('name'), None)
+        return list(entries.values())
+
+    def usage(self, owner_id: str) -> int:
+        """Bytes of an owner's uploads according to the manifest"""
+        return sum(entry.get('size', 0) for entry in self.files(owner_id))
+
+    def owners(self) -> List[str]:
+        try:
+            return [name for name in os.listdir(self.root)
+                    if _OWNER_ID_PATTERN.match(name) and os.path.isdir(os.path.join(self.root, name))]
+        except OSError:
+            return []
+
+    def last_activity(self, owner_id: str) -> Optional[float]:
+        """Time of the owner's last upload or touch, or None if it has no directory"""
+        directory = self.owner_dir(owner_id)
+        for path in (os.path.join(directory, MANIFEST_FILE), directory):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                continue
+        return None
+
+    def touch(self, owner_id: str):
+        """Record activity of an owner, at most once per touch_interval per process"""
+        now = time.monotonic()
+        with self._lock:
+            last = self._touched.get(owner_id)
+            if last is not None and now - last < self.touch_interval:
+                return
+            if len(self._touched) > 10000:
+                self._touched.clear()
+            self._touched[owner_id] = now
+        try:
+            directory = self.owner_dir(owner_id)
+            os.makedirs(directory, exist_ok=True)
+            manifest = os.path.join(directory, MANIFEST_FILE)
+            with open(manifest, 'a', encoding='utf-8'):
+                pass
+            os.utime(manifest)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not record activity of {owner_id}: {str(e)}")
+
+    def clear(self, owner_id: str) -> int:
+        """
+        Delete an owner's uploads and directory
+
+        Returns:
+            Bytes reclaimed
+        """
+        directory = self.owner_dir(owner_id)
+        with self._lock:
+            self._touched.pop(owner_id, None)
+        if not os.path.isdir(directory):
+            return 0
+
+        reclaimed = 0
+        for entry in self.files(owner_id):
+            path = os.path.join(directory, os.path.basename(entry['name']))
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                reclaimed += size
+            except OSError:
+                pass
+        # Files outside the manifest (e.g. documents being translated) go with the directory
+        reclaimed += directory_size(directory)
+        shutil.rmtree(directory, ignore_errors=True)
+        self.logger.info(f"Cleared uploads of {owner_id} ({reclaimed} bytes)")
+        return reclaimed
+
+    def _append(self, owner_id: str, entry: dict):
+        directory = self.owner_dir(owner_id)
+        os.makedirs(directory, exist_ok=True)
+        line = json.dumps(entry) + '\n'
+        with open(os.path.join(directory, MANIFEST_FILE), 'a', encoding='utf-8') as file:
+            file.write(line)
+
+    def _read(self, owner_id: str) -> List[dict]:
+        entries = []
+        try:
+            with open(os.path.join(self.owner_dir(owner_id), MANIFEST_FILE), 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue  # a line cut short by a crash
+        except OSError:
+            pass
+        return entries
+
+
+def directory_size(directory: str) -> int:
+    """Total bytes of the files under a directory"""
+    total = 0
+    for path, _, filenames in os.walk(directory):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(path, filename))
+            except OSError:
+                continue
+    return total